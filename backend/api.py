@@ -68,6 +68,12 @@ async def lifespan(app: FastAPI):
         
         # Start background tasks
         # asyncio.create_task(core_api.restore_running_agent_runs())
+        from core.services.active_runs import run_reconciler
+        active_run_reconciler = asyncio.create_task(run_reconciler(db, instance_id))
+        from core.services.run_index import run_backfill
+        run_index_backfill = asyncio.create_task(run_backfill(instance_id))
+        from core.composio_integration.toolkit_catalog import toolkit_catalog
+        toolkit_catalog_warmup = asyncio.create_task(toolkit_catalog.warm())
         
         triggers_api.initialize(db)
         credentials_api.initialize(db)
@@ -76,6 +82,10 @@ async def lifespan(app: FastAPI):
         
         yield
         
+        active_run_reconciler.cancel()
+        run_index_backfill.cancel()
+        toolkit_catalog_warmup.cancel()
+
         logger.debug("Cleaning up agent resources")
         await core_api.cleanup()
         
@@ -200,10 +210,12 @@ api_router.include_router(google_docs_router)
 @api_router.get("/health", summary="Health Check", operation_id="health_check", tags=["system"])
 async def health_check():
     logger.debug("Health check endpoint called")
+    from core.utils.cache import Cache
     return {
         "status": "ok", 
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "instance_id": instance_id
+        "instance_id": instance_id,
+        "cache": Cache.stats()
     }
 
 @api_router.get("/health-docker", summary="Docker Health Check", operation_id="health_check_docker", tags=["system"])
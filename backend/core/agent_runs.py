@@ -5,13 +5,16 @@ import uuid
 import os
 from datetime import datetime, timezone
 from typing import Optional, List, Tuple, Dict
-from fastapi import APIRouter, HTTPException, Depends, Request, Body, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, Depends, Request, Body, File, UploadFile, Form, Query
 from fastapi.responses import StreamingResponse
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, get_user_id_from_stream_auth, verify_and_authorize_thread_access
 from core.utils.logger import logger, structlog
 from core.billing.billing_integration import billing_integration
 from core.utils.config import config, EnvMode
 from core.services import redis
+from core.services.run_stream_hub import run_stream_hub, RESPONSES, OVERFLOW, CONTROL, ERROR
+from core.services.active_runs import register_active_run
+from core.services.run_index import mark_run_active
 from core.sandbox.sandbox import create_sandbox, delete_sandbox, get_or_start_sandbox
 from core.utils.sandbox_utils import generate_unique_filename, get_uploads_directory
 from run_agent_background import run_agent_background
@@ -29,6 +32,9 @@ from .core_utils import (
 
 router = APIRouter(tags=["agent-runs"])
 
+# Responses are read from the Redis list in windows of this many entries
+STREAM_READ_WINDOW = 500
+
 async def _get_agent_run_with_access_check(client, agent_run_id: str, user_id: str):
     """
     Get an agent run and verify the user has access to it.
@@ -200,7 +206,7 @@ async def _get_effective_model(model_name: Optional[str], agent_config: Optional
         return effective_model
 
 
-async def _create_agent_run_record(client, thread_id: str, agent_config: Optional[dict], effective_model: str) -> str:
+async def _create_agent_run_record(client, thread_id: str, agent_config: Optional[dict], effective_model: str, account_id: Optional[str] = None) -> str:
     """
     Create an agent run record in the database.
     
@@ -209,6 +215,7 @@ async def _create_agent_run_record(client, thread_id: str, agent_config: Optiona
         thread_id: Thread ID to associate with
         agent_config: Agent configuration dict
         effective_model: Model name to use
+        account_id: Account that owns the thread; counted against its parallel run limit
     
     Returns:
         agent_run_id: The created agent run ID
@@ -229,11 +236,13 @@ async def _create_agent_run_record(client, thread_id: str, agent_config: Optiona
     logger.debug(f"Created new agent run: {agent_run_id}")
 
     # Register run in Redis
-    instance_key = f"active_run:{utils.instance_id}:{agent_run_id}"
     try:
-        await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+        await mark_run_active(utils.instance_id, agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+        logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
+
+    if account_id:
+        await register_active_run(account_id, agent_run_id, thread_id)
 
     return agent_run_id
 
@@ -540,7 +549,7 @@ async def unified_agent_start(
                 logger.debug(f"Created user message for thread {thread_id}")
             
             # Create agent run
-            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model)
+            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model, thread_account_id)
             
             # Trigger background execution
             await _trigger_agent_background(agent_run_id, thread_id, project_id, effective_model, agent_config)
@@ -639,7 +648,7 @@ async def unified_agent_start(
             }).execute()
             
             # Create agent run
-            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model)
+            agent_run_id = await _create_agent_run_record(client, thread_id, agent_config, effective_model, account_id)
             
             # Trigger background execution
             await _trigger_agent_background(agent_run_id, thread_id, project_id, effective_model, agent_config)
@@ -866,9 +875,14 @@ async def get_thread_agent(thread_id: str, user_id: str = Depends(verify_and_get
 async def stream_agent_run(
     agent_run_id: str,
     token: Optional[str] = None,
-    request: Request = None
+    request: Request = None,
+    from_index: Optional[int] = Query(None, alias="from", ge=0, description="Index of the first response to send")
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run using Redis Lists and Pub/Sub.
+
+    Each response is sent as an SSE event whose id is its index in the Redis list,
+    so clients can resume with the Last-Event-ID header or the ?from= parameter.
+    """
     logger.debug(f"Starting stream for agent run: {agent_run_id}")
     client = await utils.db.client
 
@@ -881,27 +895,46 @@ async def stream_agent_run(
     )
 
     response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
-    control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
+
+    # Resume after the last event the client saw, or from an explicit index
+    start_index = from_index or 0
+    last_event_id = request.headers.get("last-event-id") if request else None
+    if last_event_id and last_event_id.strip().isdigit():
+        start_index = max(start_index, int(last_event_id) + 1)
+
+    def is_terminal_response(response_json: str) -> bool:
+        # Only status messages need parsing; everything else passes through as stored
+        if '"status"' not in response_json:
+            return False
+        try:
+            response = json.loads(response_json)
+        except json.JSONDecodeError:
+            return False
+        return response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']
+
+    async def read_responses(start: int):
+        """Yield (index, raw JSON) from start to the current end of the list, one window at a time."""
+        while True:
+            window = await redis.lrange(response_list_key, start, start + STREAM_READ_WINDOW - 1)
+            for offset, response_json in enumerate(window):
+                yield start + offset, response_json
+            if len(window) < STREAM_READ_WINDOW:
+                return
+            start += STREAM_READ_WINDOW
 
     async def stream_generator(agent_run_data):
-        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
-        last_processed_index = -1
-        # Single pubsub used for response + control
-        listener_task = None
+        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} from index {start_index}")
+        last_processed_index = start_index - 1
+        subscription = None
         terminate_stream = False
         initial_yield_complete = False
 
         try:
             # 1. Fetch and yield initial responses from Redis list
-            initial_responses_json = await redis.lrange(response_list_key, 0, -1)
-            initial_responses = []
-            if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
-                logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
-                last_processed_index = len(initial_responses) - 1
+            async for index, response_json in read_responses(last_processed_index + 1):
+                yield f"id: {index}\ndata: {response_json}\n\n"
+                last_processed_index = index
+            logger.debug(f"Sent {last_processed_index - start_index + 1} initial responses for {agent_run_id}")
             initial_yield_complete = True
 
             # 2. Check run status
@@ -916,87 +949,54 @@ async def stream_agent_run(
                 thread_id=agent_run_data.get('thread_id'),
             )
 
-            # 3. Use a single Pub/Sub connection subscribed to both channels
-            pubsub = await redis.create_pubsub()
-            await pubsub.subscribe(response_channel, control_channel)
-            logger.debug(f"Subscribed to channels: {response_channel}, {control_channel}")
-
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                listener = pubsub.listen()
-                task = asyncio.create_task(listener.__anext__())
-
-                while not terminate_stream:
-                    done, _ = await asyncio.wait([task], return_when=asyncio.FIRST_COMPLETED)
-                    for finished in done:
-                        try:
-                            message = finished.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes):
-                                    data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.debug(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return  # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener stopped for {agent_run_id}.")
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Resubscribe to the next message if continuing
-                            if not terminate_stream:
-                                task = asyncio.create_task(listener.__anext__())
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
+            # 3. Share this worker's subscription to the run with any other local viewers
+            subscription = await run_stream_hub.subscribe(agent_run_id)
+            logger.debug(f"Subscribed to run stream hub for {agent_run_id}")
+
+            # 4. Main loop: catch up on anything pushed before the subscription
+            # started, then consume broadcast slices, skipping indices already sent
+            needs_catch_up = True
             while not terminate_stream:
                 try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
-                        # Fetch new responses from Redis list starting after the last processed index
-                        new_start_index = last_processed_index + 1
-                        new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
-
-                        if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
-                            # logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
-                                # Check if this response signals completion
-                                if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
-                                    logger.debug(f"Detected run completion via status message in stream: {response.get('status')}")
-                                    terminate_stream = True
-                                    break # Stop processing further new responses
-                            last_processed_index += num_new
-                        if terminate_stream: break
-
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
+                    if needs_catch_up:
+                        needs_catch_up = False
+                        async for index, response_json in read_responses(last_processed_index + 1):
+                            yield f"id: {index}\ndata: {response_json}\n\n"
+                            last_processed_index = index
+                            if is_terminal_response(response_json):
+                                logger.debug(f"Detected run completion via status message in stream at index {index}")
+                                terminate_stream = True
+                                break
+                        continue
+
+                    event_type, event_data = await subscription.get()
+
+                    if event_type == RESPONSES:
+                        for index, response_json in event_data:
+                            if index <= last_processed_index:
+                                continue
+                            yield f"id: {index}\ndata: {response_json}\n\n"
+                            last_processed_index = index
+                            # Check if this response signals completion
+                            if is_terminal_response(response_json):
+                                logger.debug(f"Detected run completion via status message in stream at index {index}")
+                                terminate_stream = True
+                                break # Stop processing further new responses
+
+                    elif event_type == OVERFLOW:
+                        # Fell too far behind the broadcast: rejoin it and catch up from Redis
+                        logger.debug(f"Stream viewer for {agent_run_id} overflowed, catching up from index {last_processed_index + 1}")
+                        subscription.resync()
+                        needs_catch_up = True
+
+                    elif event_type == CONTROL:
                         terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
+                        yield f"data: {json.dumps({'type': 'status', 'status': event_data})}\n\n"
 
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
+                    elif event_type == ERROR:
+                        logger.error(f"Listener error for {agent_run_id}: {event_data}")
                         terminate_stream = True
                         yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
-                        break
 
                 except asyncio.CancelledError:
                      logger.debug(f"Stream generator main loop cancelled for {agent_run_id}")
@@ -1015,24 +1015,12 @@ async def stream_agent_run(
                  yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
         finally:
             terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            try:
-                if 'pubsub' in locals() and pubsub:
-                    await pubsub.unsubscribe(response_channel, control_channel)
-                    await pubsub.close()
-            except Exception as e:
-                logger.debug(f"Error during pubsub cleanup for {agent_run_id}: {e}")
-
-            if listener_task:
-                listener_task.cancel()
+            # Leave the hub; the shared subscription closes with its last viewer
+            if subscription:
                 try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
+                    await subscription.close()
                 except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
+                    logger.debug(f"Error leaving run stream hub for {agent_run_id}: {e}")
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
     return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers={
@@ -6,15 +6,14 @@ reaching the context window limitations of LLM models.
 """
 
 import json
-import os
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 from litellm.utils import token_counter
-from anthropic import Anthropic
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
 from core.ai_models import model_manager
-from core.agentpress.prompt_caching import apply_anthropic_caching_strategy
+from core.agentpress.thread_metadata import ThreadMetadata
+from core.agentpress.token_counting import token_count_cache, tokenizer_family, count_message_tokens, anthropic_token_counter
 
 DEFAULT_TOKEN_THRESHOLD = 120000
 
@@ -35,16 +34,8 @@ class ContextManager:
         self.compression_target_ratio = 0.6  # Compress to 60% of max tokens (hysteresis)
         self.keep_recent_user_messages = 10  # Number of recent user messages to keep uncompressed
         self.keep_recent_assistant_messages = 10  # Number of recent assistant messages to keep uncompressed
-        # Initialize Anthropic client for accurate token counting
-        self._anthropic_client = None
-
-    def _get_anthropic_client(self):
-        """Lazy initialization of Anthropic client."""
-        if self._anthropic_client is None:
-            api_key = os.environ.get("ANTHROPIC_API_KEY")
-            if api_key:
-                self._anthropic_client = Anthropic(api_key=api_key)
-        return self._anthropic_client
+        # IDs of messages whose compressed_content was written to the database
+        self.compressed_message_ids: List[str] = []
 
     async def count_tokens(self, model: str, messages: List[Dict[str, Any]], system_prompt: Optional[Dict[str, Any]] = None, apply_caching: bool = True) -> int:
         """Count tokens using the correct tokenizer for the model.
@@ -52,79 +43,126 @@ class ContextManager:
         For Anthropic/Claude models: Uses Anthropic's official tokenizer
         For other models: Uses LiteLLM's token_counter
         
-        IMPORTANT: By default, applies caching transformation before counting to match
-        the actual token count that will be sent to the API.
+        Counts are memoized per message in the shared token count cache, keyed by
+        tokenizer family and content hash, so the total is a sum over cached counts
+        and only messages not seen before are tokenized (remotely for Anthropic).
         
         Args:
             model: Model name
             messages: List of messages
             system_prompt: Optional system prompt
-            apply_caching: If True, temporarily apply caching transformation before counting
+            apply_caching: Kept for compatibility. Cache-control markers do not change
+                the token count, so the caching transformation is no longer applied here.
             
         Returns:
-            Token count (with caching overhead if apply_caching=True)
+            Token count
         """
-        # Apply caching transformation if requested (to match API reality)
-        messages_to_count = messages
-        system_to_count = system_prompt
-        
-        if apply_caching and ('claude' in model.lower() or 'anthropic' in model.lower()):
-            try:
-                # Temporarily apply caching transformation
-                prepared = await apply_anthropic_caching_strategy(
-                    system_prompt, messages, model, thread_id=None, force_recalc=False
-                )
-                # Separate system from messages
-                system_to_count = None
-                messages_to_count = []
-                for msg in prepared:
-                    if msg.get('role') == 'system':
-                        system_to_count = msg
-                    else:
-                        messages_to_count.append(msg)
-            except Exception as e:
-                logger.debug(f"Failed to apply caching for counting: {e}")
-                # Continue with uncached messages
-        
-        # Check if this is an Anthropic model
-        if 'claude' in model.lower() or 'anthropic' in model.lower():
-            # Use Anthropic's official tokenizer
-            try:
-                client = self._get_anthropic_client()
-                if client:
-                    # Strip provider prefix
-                    clean_model = model.split('/')[-1] if '/' in model else model
-                    
-                    # Clean messages - only role and content
-                    clean_messages = []
-                    for msg in messages_to_count:
-                        if msg.get('role') == 'system':
-                            continue  # System passed separately
-                        clean_messages.append({
-                            'role': msg.get('role'),
-                            'content': msg.get('content')
-                        })
-                    
-                    # Extract system content
-                    system_content = None
-                    if system_to_count and isinstance(system_to_count, dict):
-                        system_content = system_to_count.get('content')
-                    
-                    # Build parameters
-                    count_params = {'model': clean_model, 'messages': clean_messages}
-                    if system_content:
-                        count_params['system'] = system_content
-                    
-                    result = client.messages.count_tokens(**count_params)
-                    return result.input_tokens
-            except Exception as e:
-                logger.debug(f"Anthropic token counting failed, falling back to LiteLLM: {e}")
-        
-        # Fallback to LiteLLM token_counter
-        if system_to_count:
-            return token_counter(model=model, messages=[system_to_count] + messages_to_count)
-        else:
-            return token_counter(model=model, messages=messages_to_count)
+        all_messages = [system_prompt] + list(messages) if system_prompt else list(messages)
+        return sum(await self.count_tokens_per_message(model, all_messages))
+
+    async def count_tokens_per_message(self, model: str, messages: List[Dict[str, Any]]) -> List[int]:
+        """Count tokens for each message individually, using the shared token count cache.
+
+        For Anthropic models a message without a remote count falls back to a cached
+        local estimate, so passes while remote counting is unavailable (no API key,
+        timeouts) tokenize each message once instead of on every pass.
+
+        Args:
+            model: Model name
+            messages: List of messages (a system prompt may be included)
+
+        Returns:
+            Token count per message, in the same order as messages
+        """
+        is_anthropic = tokenizer_family(model) == "anthropic"
+        counts: List[Optional[int]] = []
+        missing: List[int] = []
+        keys = []
+        for i, msg in enumerate(messages):
+            key = token_count_cache.key(model, msg)
+            keys.append(key)
+            count = token_count_cache.get(key)
+            if count is None and is_anthropic:
+                count = token_count_cache.get(token_count_cache.estimate_key(key))
+            counts.append(count)
+            if count is None:
+                missing.append(i)
+
+        if missing:
+            local_counts = {i: token_counter(model=model, messages=[messages[i]]) for i in missing}
+            new_counts = local_counts
+            cache_keys = {i: keys[i] for i in missing}
+
+            if is_anthropic:
+                remote_counts = await self._count_anthropic_tokens(model, [messages[i] for i in missing], [local_counts[i] for i in missing])
+                if remote_counts is not None:
+                    new_counts = dict(zip(missing, remote_counts))
+                else:
+                    # Local estimates go under their own key so they never hide an accurate count
+                    cache_keys = {i: token_count_cache.estimate_key(keys[i]) for i in missing}
+
+            for i, count in new_counts.items():
+                counts[i] = count
+                token_count_cache.set(cache_keys[i], count)
+
+        return counts
+
+    @staticmethod
+    def _to_anthropic_count_message(msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Reduce a message to the user/assistant turn count_tokens accepts.
+
+        Tool results become user text and tool calls are appended to the assistant
+        text, which keeps their tokens in the total. Returns None for empty messages.
+        """
+        role = msg.get('role')
+        content = msg.get('content')
+        if content is not None and not isinstance(content, (str, list)):
+            content = json.dumps(content, default=str)
+        role = 'assistant' if role == 'assistant' else 'user'
+        tool_calls = msg.get('tool_calls')
+        if tool_calls:
+            tool_calls_text = json.dumps(tool_calls, default=str)
+            if isinstance(content, list):
+                content = content + [{'type': 'text', 'text': tool_calls_text}]
+            else:
+                content = f"{content}\n{tool_calls_text}" if content else tool_calls_text
+        if not content:
+            return None
+        return {'role': role, 'content': content}
+
+    async def _count_anthropic_tokens(self, model: str, new_messages: List[Dict[str, Any]], local_counts: List[int]) -> Optional[List[int]]:
+        """Count a batch of uncached messages with Anthropic's tokenizer in one request.
+
+        The request total is split across the messages in proportion to their
+        local estimates so each message can be cached individually.
+
+        Returns:
+            Per-message counts, or None if remote counting is unavailable
+        """
+        # System passed separately, everything else as user/assistant turns
+        system_content = None
+        clean_messages = []
+        for msg in new_messages:
+            if msg.get('role') == 'system':
+                system_content = msg.get('content')
+                continue
+            clean_message = self._to_anthropic_count_message(msg)
+            if clean_message:
+                clean_messages.append(clean_message)
+        if not clean_messages:
+            return None
+
+        total = await anthropic_token_counter.count(model, clean_messages, system_content)
+        if total is None:
+            return None
+
+        local_total = sum(local_counts)
+        if local_total <= 0:
+            return local_counts
+        counts = [int(total * count / local_total) for count in local_counts]
+        # Give the rounding remainder to the largest message so the batch sums exactly
+        counts[local_counts.index(max(local_counts))] += total - sum(counts)
+        return counts
 
     def is_tool_result_message(self, msg: Dict[str, Any]) -> bool:
         """Check if a message is a tool result message."""
@@ -224,6 +262,7 @@ class ContextManager:
                     'metadata': existing_metadata  # Preserve all existing fields!
                 }).eq('message_id', message_id).execute()
                 updated_count += 1
+                self.compressed_message_ids.append(message_id)
             except Exception as e:
                 logger.error(f"Failed to update message {message_id}: {str(e)}")
         
@@ -312,6 +351,7 @@ class ContextManager:
                     'metadata': existing_metadata  # Preserve all existing fields!
                 }).eq('message_id', message_id).execute()
                 updated_count += 1
+                self.compressed_message_ids.append(message_id)
             except Exception as e:
                 logger.error(f"Failed to compress user message {message_id}: {str(e)}")
         
@@ -400,6 +440,7 @@ class ContextManager:
                     'metadata': existing_metadata  # Preserve all existing fields!
                 }).eq('message_id', message_id).execute()
                 updated_count += 1
+                self.compressed_message_ids.append(message_id)
             except Exception as e:
                 logger.error(f"Failed to compress assistant message {message_id}: {str(e)}")
         
@@ -620,7 +661,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if self.is_tool_result_message(msg):  # Only compress ToolResult messages
                     _i += 1  # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = count_message_tokens(msg)  # Count the number of tokens in the message
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_tool_outputs:  # If this is not one of the most recent N ToolResult messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -650,7 +691,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if msg.get('role') == 'user':  # Only compress User messages
                     _i += 1  # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = count_message_tokens(msg)  # Count the number of tokens in the message
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_user_messages:  # If this is not one of the most recent N User messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -680,7 +721,7 @@ class ContextManager:
                     continue  # Skip non-dict messages
                 if msg.get('role') == 'assistant':  # Only compress Assistant messages
                     _i += 1  # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
+                    msg_token_count = count_message_tokens(msg)  # Count the number of tokens in the message
                     if msg_token_count > token_threshold:  # If the message is too long
                         if _i > self.keep_recent_assistant_messages:  # If this is not one of the most recent N Assistant messages
                             message_id = msg.get('message_id')  # Get the message_id
@@ -720,10 +761,12 @@ class ContextManager:
                 result.append(msg)
         return result
 
-    async def compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = 41000, token_threshold: int = 4096, max_iterations: int = 5, actual_total_tokens: Optional[int] = None, system_prompt: Optional[Dict[str, Any]] = None, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = 41000, token_threshold: int = 4096, max_iterations: int = 5, actual_total_tokens: Optional[int] = None, system_prompt: Optional[Dict[str, Any]] = None, thread_id: Optional[str] = None, thread_metadata: Optional[ThreadMetadata] = None) -> List[Dict[str, Any]]:
         """Compress the messages WITHOUT applying caching during iterations.
         
         Caching should be applied ONCE at the end by the caller, not during compression.
+        If thread_metadata is given, the cache rebuild flag is set on it and written
+        by the caller's flush instead of a separate read-modify-write.
         """
         # Get model-specific token limits from constants
         context_window = model_manager.get_context_window(llm_model)
@@ -813,7 +856,11 @@ class ContextManager:
             logger.info(f"Tiered compression complete: {uncompressed_total_token_count} -> {current_token_count} tokens (target: {target_tokens})")
             
             # Set flag for cache rebuild on next turn (primary compression modified DB)
-            if thread_id and updated_count > 0:
+            if thread_id and updated_count > 0 and thread_metadata is not None:
+                logger.info(f"✂️ Compressed {updated_count} messages - cache will rebuild on next turn")
+                thread_metadata.add_legacy_calls(2)
+                thread_metadata.cache_needs_rebuild = True
+            elif thread_id and updated_count > 0:
                 try:
                     logger.info(f"✂️ Compressed {updated_count} messages - cache will rebuild on next turn")
                     client = await self.db.client
@@ -860,7 +907,8 @@ class ContextManager:
             return await self.compress_messages(
                 result, llm_model, max_tokens, 
                 token_threshold // 2, max_iterations - 1, 
-                compressed_total, system_prompt, thread_id=thread_id
+                compressed_total, system_prompt, thread_id=thread_id,
+                thread_metadata=thread_metadata
             )
         elif compressed_total > target_tokens:
             # Still over target but under max_tokens - use omit_messages to reach target
@@ -872,6 +920,35 @@ class ContextManager:
         logger.info(f"✨ Final compression complete: {compressed_total} tokens (target: {target_tokens}, max: {max_tokens})")
         return self.middle_out_messages(result)
     
+    def group_tool_exchanges(self, messages: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """Split messages into units that must be kept or omitted together.
+
+        An assistant message with native tool_calls is grouped with the tool result
+        messages that follow it, so omission never leaves a call without its result
+        (or a result without its call).
+
+        Returns:
+            List of (start, end) index ranges covering messages in order
+        """
+        units: List[Tuple[int, int]] = []
+        i = 0
+        while i < len(messages):
+            end = i + 1
+            if messages[i].get('role') == 'assistant' and messages[i].get('tool_calls'):
+                while end < len(messages) and messages[end].get('role') == 'tool':
+                    end += 1
+            elif messages[i].get('role') == 'tool' and units:
+                # Orphaned tool result: attach it to the preceding unit
+                start, _ = units.pop()
+                while end < len(messages) and messages[end].get('role') == 'tool':
+                    end += 1
+                units.append((start, end))
+                i = end
+                continue
+            units.append((i, end))
+            i = end
+        return units
+
     async def compress_messages_by_omitting_messages(
             self, 
             messages: List[Dict[str, Any]], 
@@ -882,12 +959,16 @@ class ContextManager:
             system_prompt: Optional[Dict[str, Any]] = None
         ) -> List[Dict[str, Any]]:
         """Compress the messages by omitting messages from the middle.
+
+        Per-message token counts are computed once and prefix-summed; a binary search
+        then finds the smallest middle window to drop so the rest fits max_tokens.
+        Tool calls and their results are omitted together.
         
         Args:
             messages: List of messages to compress
             llm_model: Model name for token counting
             max_tokens: Maximum allowed tokens
-            removal_batch_size: Number of messages to remove per iteration
+            removal_batch_size: Unused, kept for compatibility with the iterative implementation
             min_messages_to_keep: Minimum number of messages to preserve
         """
         if not messages:
@@ -896,51 +977,67 @@ class ContextManager:
         result = messages
         result = self.remove_meta_messages(result)
 
-        # Early exit if no compression needed - WITH caching
-        initial_token_count = await self.count_tokens(llm_model, result, system_prompt, apply_caching=True)
-        
         max_allowed_tokens = max_tokens or (100 * 1000)
-        
+
+        system_tokens = (await self.count_tokens_per_message(llm_model, [system_prompt]))[0] if system_prompt else 0
+        message_tokens = await self.count_tokens_per_message(llm_model, result)
+        initial_token_count = system_tokens + sum(message_tokens)
+
+        # Early exit if no compression needed
         if initial_token_count <= max_allowed_tokens:
             return result
 
-        # Separate system message (assumed to be first) from conversation messages
-        system_message = system_prompt
-        conversation_messages = result
-        
-        safety_limit = 500
-        current_token_count = initial_token_count
-        
-        while current_token_count > max_allowed_tokens and safety_limit > 0:
-            safety_limit -= 1
-            
-            if len(conversation_messages) <= min_messages_to_keep:
-                logger.warning(f"Cannot compress further: only {len(conversation_messages)} messages remain (min: {min_messages_to_keep})")
-                break
-
-            # Calculate removal strategy based on current message count
-            if len(conversation_messages) > (removal_batch_size * 2):
-                # Remove from middle, keeping recent and early context
-                middle_start = len(conversation_messages) // 2 - (removal_batch_size // 2)
-                middle_end = middle_start + removal_batch_size
-                conversation_messages = conversation_messages[:middle_start] + conversation_messages[middle_end:]
+        units = self.group_tool_exchanges(result)
+        unit_count = len(units)
+        token_prefix = [0]
+        message_prefix = [0]
+        for start, end in units:
+            token_prefix.append(token_prefix[-1] + sum(message_tokens[start:end]))
+            message_prefix.append(message_prefix[-1] + (end - start))
+
+        def window(k: int) -> Tuple[int, int]:
+            # Dropping k units from the middle; window(k + 1) always contains window(k)
+            head = (unit_count - k) // 2
+            return head, head + k
+
+        def kept_messages(k: int) -> int:
+            head, tail = window(k)
+            return len(result) - (message_prefix[tail] - message_prefix[head])
+
+        def kept_tokens(k: int) -> int:
+            head, tail = window(k)
+            return initial_token_count - (token_prefix[tail] - token_prefix[head])
+
+        # Largest window that still keeps min_messages_to_keep messages
+        low, high = 0, unit_count
+        while low < high:
+            mid = (low + high + 1) // 2
+            if kept_messages(mid) >= min_messages_to_keep:
+                low = mid
             else:
-                # Remove from earlier messages, preserving recent context
-                messages_to_remove = min(removal_batch_size, len(conversation_messages) // 2)
-                if messages_to_remove > 0:
-                    conversation_messages = conversation_messages[messages_to_remove:]
-                else:
-                    # Can't remove any more messages
-                    break
+                high = mid - 1
+        max_window = low
 
-            # Recalculate token count WITH caching
-            current_token_count = await self.count_tokens(llm_model, conversation_messages, system_message, apply_caching=True)
+        # Smallest window that fits the budget
+        low, high = 0, max_window
+        while low < high:
+            mid = (low + high) // 2
+            if kept_tokens(mid) <= max_allowed_tokens:
+                high = mid
+            else:
+                low = mid + 1
+        if kept_tokens(low) > max_allowed_tokens:
+            logger.warning(f"Cannot compress further: only {kept_messages(low)} messages remain (min: {min_messages_to_keep})")
 
-        # Prepare final result - return only conversation messages (matches compress_messages pattern)
-        final_messages = conversation_messages
-        
-        # Log with system prompt included for accurate token reporting WITH caching
-        final_token_count = await self.count_tokens(llm_model, final_messages, system_message, apply_caching=True)
+        head, tail = window(low)
+        drop_start = units[head][0] if head < unit_count else len(result)
+        drop_end = units[tail][0] if tail < unit_count else len(result)
+        final_messages = result[:drop_start] + result[drop_end:]
+
+        # Verify with one count of the final list (system prompt included for accurate reporting)
+        final_token_count = await self.count_tokens(llm_model, final_messages, system_prompt)
+        if final_token_count != kept_tokens(low):
+            logger.warning(f"Omission plan estimated {kept_tokens(low)} tokens but final count is {final_token_count} (limit {max_allowed_tokens})")
         
         logger.info(f"Context compression (omit): {initial_token_count} -> {final_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
             
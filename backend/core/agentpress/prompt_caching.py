@@ -37,10 +37,16 @@ Based on Anthropic documentation and mathematical optimization (Sept 2025).
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 from core.utils.logger import logger
+from core.agentpress.thread_metadata import ThreadMetadata
 
 
-async def get_stored_threshold(thread_id: str, model: str) -> Optional[Dict[str, Any]]:
+async def get_stored_threshold(thread_id: str, model: str, thread_metadata: Optional[ThreadMetadata] = None) -> Optional[Dict[str, Any]]:
     """Get stored cache threshold from thread metadata."""
+    if thread_metadata is not None:
+        thread_metadata.add_legacy_calls(1)
+        cache_config = thread_metadata.cache_config or {}
+        return cache_config if cache_config.get('model') == model else None
+
     from core.services.supabase import DBConnection
     db = DBConnection()
     client = await db.client
@@ -60,8 +66,22 @@ async def get_stored_threshold(thread_id: str, model: str) -> Optional[Dict[str,
     return None
 
 
-async def store_threshold(thread_id: str, threshold: int, model: str, reason: str, turn: int):
+async def store_threshold(thread_id: str, threshold: int, model: str, reason: str, turn: int, thread_metadata: Optional[ThreadMetadata] = None):
     """Store cache threshold in thread metadata."""
+    cache_config = {
+        'threshold': threshold,
+        'model': model,
+        'last_calc_turn': turn,
+        'last_calc_reason': reason,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    if thread_metadata is not None:
+        thread_metadata.add_legacy_calls(2)
+        thread_metadata.cache_config = cache_config
+        logger.info(f"💾 Stored cache threshold: {threshold} tokens (reason: {reason})")
+        return
+
     from core.services.supabase import DBConnection
     db = DBConnection()
     client = await db.client
@@ -72,13 +92,7 @@ async def store_threshold(thread_id: str, threshold: int, model: str, reason: st
         metadata = result.data.get('metadata', {}) if result.data else {}
         
         # Update cache config
-        metadata['cache_config'] = {
-            'threshold': threshold,
-            'model': model,
-            'last_calc_turn': turn,
-            'last_calc_reason': reason,
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }
+        metadata['cache_config'] = cache_config
         
         # Write back
         await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
@@ -88,8 +102,24 @@ async def store_threshold(thread_id: str, threshold: int, model: str, reason: st
         logger.warning(f"Failed to store threshold: {e}")
 
 
-async def get_stored_cached_blocks(thread_id: str, model: str) -> Optional[Dict[str, Any]]:
+def _stored_blocks_from_metadata(cached_blocks: Optional[List[Dict[str, Any]]], cache_metadata: Optional[Dict[str, Any]], model: str) -> Optional[Dict[str, Any]]:
+    """Build the stored-blocks result if the blocks were created for the same model."""
+    cache_metadata = cache_metadata or {}
+    if cache_metadata.get('model') == model and cached_blocks:
+        return {
+            'blocks': cached_blocks,
+            'last_message_id': cache_metadata.get('last_message_id'),
+            'total_messages': cache_metadata.get('total_messages', 0)
+        }
+    return None
+
+
+async def get_stored_cached_blocks(thread_id: str, model: str, thread_metadata: Optional[ThreadMetadata] = None) -> Optional[Dict[str, Any]]:
     """Get stored cached blocks from thread metadata."""
+    if thread_metadata is not None:
+        thread_metadata.add_legacy_calls(1)
+        return _stored_blocks_from_metadata(thread_metadata.cached_blocks, thread_metadata.cache_metadata, model)
+
     from core.services.supabase import DBConnection
     db = DBConnection()
     client = await db.client
@@ -98,16 +128,7 @@ async def get_stored_cached_blocks(thread_id: str, model: str) -> Optional[Dict[
         result = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
         if result.data:
             metadata = result.data.get('metadata', {})
-            cached_blocks = metadata.get('cached_blocks')
-            cache_metadata = metadata.get('cache_metadata', {})
-            
-            # Validate model matches
-            if cache_metadata.get('model') == model and cached_blocks:
-                return {
-                    'blocks': cached_blocks,
-                    'last_message_id': cache_metadata.get('last_message_id'),
-                    'total_messages': cache_metadata.get('total_messages', 0)
-                }
+            return _stored_blocks_from_metadata(metadata.get('cached_blocks'), metadata.get('cache_metadata'), model)
     except Exception as e:
         logger.debug(f"No stored blocks found: {e}")
     
@@ -119,9 +140,25 @@ async def store_cached_blocks(
     blocks: List[Dict[str, Any]], 
     last_message_id: str,
     total_messages: int,
-    model: str
+    model: str,
+    thread_metadata: Optional[ThreadMetadata] = None
 ):
     """Store prepared cached blocks in thread metadata."""
+    cache_metadata = {
+        'last_message_id': last_message_id,
+        'model': model,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'total_messages': total_messages, 
+        'blocks_created': len(blocks)
+    }
+
+    if thread_metadata is not None:
+        thread_metadata.add_legacy_calls(2)
+        thread_metadata.cached_blocks = blocks
+        thread_metadata.cache_metadata = cache_metadata
+        logger.info(f"💾 Stored {len(blocks)} cached blocks covering {total_messages} messages")
+        return
+
     from core.services.supabase import DBConnection
     
     db = DBConnection()
@@ -132,13 +169,7 @@ async def store_cached_blocks(
         metadata = result.data.get('metadata', {}) if result.data else {}
         
         metadata['cached_blocks'] = blocks
-        metadata['cache_metadata'] = {
-            'last_message_id': last_message_id,
-            'model': model,
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'total_messages': total_messages, 
-            'blocks_created': len(blocks)
-        }
+        metadata['cache_metadata'] = cache_metadata
         
         await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
         logger.info(f"💾 Stored {len(blocks)} cached blocks covering {total_messages} messages")
@@ -146,8 +177,15 @@ async def store_cached_blocks(
         logger.warning(f"Failed to store cached blocks: {e}")
 
 
-async def invalidate_cached_blocks(thread_id: str):
+async def invalidate_cached_blocks(thread_id: str, thread_metadata: Optional[ThreadMetadata] = None):
     """Clear cached blocks (after compression or model change)."""
+    if thread_metadata is not None:
+        thread_metadata.add_legacy_calls(2)
+        thread_metadata.remove(ThreadMetadata.CACHED_BLOCKS_KEY)
+        thread_metadata.remove(ThreadMetadata.CACHE_METADATA_KEY)
+        logger.info(f"🗑️ Invalidated cached blocks for thread {thread_id}")
+        return
+
     from core.services.supabase import DBConnection
     
     db = DBConnection()
@@ -344,7 +382,8 @@ async def apply_anthropic_caching_strategy(
     turn_number: Optional[int] = None,  # NEW: for tracking
     force_recalc: bool = False,  # NEW: for compression triggers
     context_window_tokens: Optional[int] = None,  # Auto-detect from model registry
-    cache_threshold_tokens: Optional[int] = None  # Auto-calculate based on context window
+    cache_threshold_tokens: Optional[int] = None,  # Auto-calculate based on context window
+    thread_metadata: Optional[ThreadMetadata] = None  # Run-scoped metadata accessor (avoids per-call DB reads/writes)
 ) -> List[Dict[str, Any]]:
     """
     Apply mathematically optimized token-based caching strategy for Anthropic models.
@@ -385,7 +424,7 @@ async def apply_anthropic_caching_strategy(
     
     # Try to load stored blocks (unless force rebuild)
     if thread_id and not force_recalc:
-        stored = await get_stored_cached_blocks(thread_id, model_name)
+        stored = await get_stored_cached_blocks(thread_id, model_name, thread_metadata)
         
         if stored:
             cached_blocks = stored['blocks']
@@ -418,7 +457,7 @@ async def apply_anthropic_caching_strategy(
     should_recalculate = force_recalc
     
     if thread_id and not force_recalc:
-        stored_config = await get_stored_threshold(thread_id, model_name)
+        stored_config = await get_stored_threshold(thread_id, model_name, thread_metadata)
         
         if stored_config:
             cache_threshold_tokens = stored_config['threshold']
@@ -453,7 +492,7 @@ async def apply_anthropic_caching_strategy(
         # Store it if we have thread_id
         if thread_id and turn_number is not None:
             reason = "compression" if force_recalc else "initial"
-            await store_threshold(thread_id, cache_threshold_tokens, model_name, reason, turn_number)
+            await store_threshold(thread_id, cache_threshold_tokens, model_name, reason, turn_number, thread_metadata)
     
     logger.info(f"📊 Applying single cache breakpoint strategy for {len(conversation_messages)} messages")
     
@@ -562,7 +601,8 @@ async def apply_anthropic_caching_strategy(
                 cached_blocks_to_store,
                 last_message_id=last_cached_message_id,
                 total_messages=len(conversation_messages),
-                model=model_name
+                model=model_name,
+                thread_metadata=thread_metadata
             )
     
     return prepared_messages
@@ -18,7 +18,7 @@ from dataclasses import dataclass
 from core.utils.logger import logger
 from core.agentpress.tool import ToolResult
 from core.agentpress.tool_registry import ToolRegistry
-from core.agentpress.xml_tool_parser import XMLToolParser
+from core.agentpress.xml_tool_parser import XMLToolParser, XMLStreamScanner
 from core.agentpress.error_processor import ErrorProcessor
 from langfuse.client import StatefulTraceClient
 from core.services.langfuse import langfuse
@@ -258,8 +258,14 @@ class ResponseProcessor:
         continuous_state = continuous_state or {}
         accumulated_content = continuous_state.get('accumulated_content', "")
         tool_calls_buffer = {}
-        current_xml_content = accumulated_content   # equal to accumulated_content if auto-continuing, else blank
+        xml_scanner = XMLStreamScanner()
+        # Prime the scanner with content from the previous auto-continue cycle so a
+        # block split across cycles is still detected. Blocks completed in that cycle
+        # were already handled there, so they are discarded here.
+        xml_scanner.feed(accumulated_content)
         xml_chunks_buffer = []
+        # End offset in accumulated_content of the last buffered XML chunk
+        last_xml_chunk_end = 0
         pending_tool_executions = []
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
         tool_index = 0
@@ -372,8 +378,6 @@ class ResponseProcessor:
                         # print(chunk_content, end='', flush=True)
                         # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to accumulated_content (type={type(accumulated_content)})")
                         accumulated_content += chunk_content
-                        # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to current_xml_content (type={type(current_xml_content)})")
-                        current_xml_content += chunk_content
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -393,10 +397,13 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
-                            for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
+                            xml_chunks = xml_scanner.feed(chunk_content)
+                            # The scanner only sees content deltas; accumulated_content also holds
+                            # reasoning, so shift its offsets by the difference (both end here)
+                            offset_shift = len(accumulated_content) - xml_scanner.chars_scanned
+                            for xml_chunk, xml_chunk_end in zip(xml_chunks, xml_scanner.last_end_offsets):
                                 xml_chunks_buffer.append(xml_chunk)
+                                last_xml_chunk_end = xml_chunk_end + offset_shift
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
                                     tool_call, parsing_details = result
@@ -619,10 +626,14 @@ class ResponseProcessor:
             if accumulated_content and not should_auto_continue:
                 # ... (Truncate accumulated_content logic) ...
                 if config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls and xml_chunks_buffer:
-                    last_xml_chunk = xml_chunks_buffer[-1]
-                    last_chunk_end_pos = accumulated_content.find(last_xml_chunk) + len(last_xml_chunk)
-                    if last_chunk_end_pos > 0:
-                        accumulated_content = accumulated_content[:last_chunk_end_pos]
+                    # Cut at the scanner's recorded end of the last call; searching for its text
+                    # would stop at an earlier identical call
+                    if last_xml_chunk_end > 0:
+                        accumulated_content = accumulated_content[:last_xml_chunk_end]
+                        # Invokes are handed over as soon as they close, so the enclosing
+                        # <function_calls> block may still be open at the cut point.
+                        if accumulated_content.rfind('<function_calls>') > accumulated_content.rfind('</function_calls>'):
+                            accumulated_content += "\n</function_calls>"
 
                 # ... (Extract complete_native_tool_calls logic) ...
                 # Update complete_native_tool_calls from buffer (initialized earlier)
@@ -681,9 +692,7 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
+                    # The stream scanner has already collected every complete invoke block
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
@@ -1409,15 +1418,20 @@ class ResponseProcessor:
             - parsing_details: Dict with 'attributes', 'elements', 'text_content', 'root_content'
         """
         try:
-            # Check if this is the new format (contains <function_calls>)
-            if '<function_calls>' in xml_chunk and '<invoke' in xml_chunk:
+            # Check if this is the new format (contains <function_calls>), or a single
+            # <invoke> block handed over by the streaming scanner
+            if '<invoke' in xml_chunk:
                 # Use the new XML parser
-                parsed_calls = self.xml_parser.parse_content(xml_chunk)
-                
+                if '<function_calls>' in xml_chunk:
+                    parsed_calls = self.xml_parser.parse_content(xml_chunk)
+                else:
+                    parsed_call = self.xml_parser.parse_invoke(xml_chunk)
+                    parsed_calls = [parsed_call] if parsed_call else []
+
                 if not parsed_calls:
                     logger.error(f"No tool calls found in XML chunk: {xml_chunk}")
                     return None
-                
+
                 # Take the first tool call (should only be one per chunk)
                 xml_tool_call = parsed_calls[0]
                 
@@ -3,24 +3,60 @@ Simplified conversation thread management system for AgentPress.
 """
 
 import json
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, cast
+import asyncio
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple, Type, Union, AsyncGenerator, Literal, cast
 from core.services.llm import make_llm_api_call, LLMError
 from core.agentpress.prompt_caching import apply_anthropic_caching_strategy, validate_cache_blocks
 from core.agentpress.tool import Tool
 from core.agentpress.tool_registry import ToolRegistry
 from core.agentpress.context_manager import ContextManager
+from core.agentpress.token_counting import anthropic_token_counter, token_count_cache
+from core.agentpress.thread_metadata import ThreadMetadata
 from core.agentpress.response_processor import ResponseProcessor, ProcessorConfig
 from core.agentpress.error_processor import ErrorProcessor
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
+from core.utils.phase_timer import PhaseTimer
 from langfuse.client import StatefulGenerationClient, StatefulTraceClient
 from core.services.langfuse import langfuse
 from datetime import datetime, timezone
-from core.billing.billing_integration import billing_integration
+from decimal import Decimal
+from core.billing.billing_integration import billing_integration, RunCreditEstimate
 from litellm.utils import token_counter
 
 ToolChoice = Literal["auto", "required", "none"]
 
+
+@dataclass
+class ThreadMessageSnapshot:
+    """Parsed LLM messages of a thread, in created_at order, plus the newest-row watermark."""
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    seen_message_ids: Set[str] = field(default_factory=set)
+    stale_message_ids: Set[str] = field(default_factory=set)
+    last_created_at: Optional[str] = None
+    last_message_id: Optional[str] = None
+
+    def append(self, row: Dict[str, Any], message: Optional[Dict[str, Any]]):
+        """Record a newly fetched row and advance the watermark."""
+        self.seen_message_ids.add(row['message_id'])
+        if message is not None:
+            self.messages.append(message)
+        created_at = row.get('created_at')
+        if created_at and (self.last_created_at is None or created_at >= self.last_created_at):
+            self.last_created_at = created_at
+            self.last_message_id = row['message_id']
+
+    def replace(self, message_id: str, message: Optional[Dict[str, Any]]):
+        """Swap in a re-read version of an existing message, dropping it if it no longer parses."""
+        for index, existing in enumerate(self.messages):
+            if existing.get('message_id') == message_id:
+                if message is None:
+                    del self.messages[index]
+                else:
+                    self.messages[index] = message
+                return
+
 class ThreadManager:
     """Manages conversation threads with LLM models and tool execution."""
 
@@ -33,6 +69,12 @@ class ThreadManager:
             self.trace = langfuse.trace(name="anonymous:thread_manager")
             
         self.agent_config = agent_config
+        self._message_snapshots: Dict[str, ThreadMessageSnapshot] = {}
+        self.metadata_db_calls_saved = 0
+        # Set by the caller to break the time to first token of the next run down by phase
+        self.phase_timer: Optional[PhaseTimer] = None
+        # Set by the agent runner; updated with the balance returned by each deduction
+        self.credit_estimate: Optional[RunCreditEstimate] = None
         self.response_processor = ResponseProcessor(
             tool_registry=self.tool_registry,
             add_message_callback=self.add_message,
@@ -166,75 +208,133 @@ class ThreadManager:
                 
                 if deduct_result.get('success'):
                     logger.info(f"Successfully deducted ${deduct_result.get('cost', 0):.6f}")
+                    if self.credit_estimate and self.credit_estimate.account_id == user_id:
+                        new_balance = deduct_result.get('new_balance')
+                        self.credit_estimate.record_usage(
+                            Decimal(str(deduct_result.get('cost', 0))),
+                            Decimal(str(new_balance)) if new_balance is not None else None
+                        )
                 else:
                     logger.error(f"Failed to deduct credits: {deduct_result}")
         except Exception as e:
             logger.error(f"Error handling billing: {str(e)}", exc_info=True)
 
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a thread."""
+        """Get all messages for a thread.
+        
+        Parsed messages are kept in a per-thread snapshot for the lifetime of this
+        ThreadManager, so repeated calls during a run only fetch rows created since
+        the last call plus any rows invalidated by compression.
+        """
         logger.debug(f"Getting messages for thread {thread_id}")
         client = await self.db.client
 
         try:
-            all_messages = []
-            batch_size = 1000
-            offset = 0
-            
-            while True:
-                result = await client.table('messages').select('message_id, type, content, metadata').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
-                
-                if not result.data:
-                    break
-                    
-                all_messages.extend(result.data)
-                if len(result.data) < batch_size:
-                    break
-                offset += batch_size
-
-            if not all_messages:
-                return []
-
-            messages = []
-            for item in all_messages:
-                # Check if this message has a compressed version in metadata
-                content = item['content']
-                metadata = item.get('metadata', {})
-                is_compressed = False
-                
-                # If compressed, use compressed_content for LLM instead of full content
-                if isinstance(metadata, dict) and metadata.get('compressed'):
-                    compressed_content = metadata.get('compressed_content')
-                    if compressed_content:
-                        content = compressed_content
-                        is_compressed = True
-                        # logger.debug(f"Using compressed content for message {item['message_id']}")
-                
-                # Parse content and add message_id
-                if isinstance(content, str):
-                    try:
-                        parsed_item = json.loads(content)
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        # If compressed, content is a plain string (not JSON) - this is expected
-                        if is_compressed:
-                            messages.append({
-                                'role': 'user',
-                                'content': content,
-                                'message_id': item['message_id']
-                            })
-                        else:
-                            logger.error(f"Failed to parse message: {content[:100]}")
-                else:
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
-
-            return messages
+            snapshot = self._message_snapshots.get(thread_id)
+
+            if snapshot is None:
+                snapshot = ThreadMessageSnapshot()
+                rows = await self._fetch_llm_message_rows(client, thread_id)
+                for item in rows:
+                    snapshot.append(item, self._parse_llm_message_row(item))
+                self._message_snapshots[thread_id] = snapshot
+                logger.debug(f"Built message snapshot for thread {thread_id} with {len(rows)} rows")
+            else:
+                if snapshot.stale_message_ids:
+                    stale_ids = list(snapshot.stale_message_ids)
+                    result = await client.table('messages').select('message_id, type, content, metadata, created_at').in_('message_id', stale_ids).execute()
+                    for item in result.data or []:
+                        snapshot.replace(item['message_id'], self._parse_llm_message_row(item))
+                    snapshot.stale_message_ids.clear()
+
+                rows = await self._fetch_llm_message_rows(client, thread_id, since=snapshot.last_created_at)
+                new_rows = 0
+                for item in rows:
+                    if item['message_id'] in snapshot.seen_message_ids:
+                        continue
+                    snapshot.append(item, self._parse_llm_message_row(item))
+                    new_rows += 1
+                logger.debug(f"Updated message snapshot for thread {thread_id} with {new_rows} new rows")
+
+            # Callers mutate message dicts in place (compression, auto-continue), so hand out copies
+            return [dict(message) for message in snapshot.messages]
 
         except Exception as e:
+            self._message_snapshots.pop(thread_id, None)
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
+
+    def invalidate_llm_messages(self, thread_id: str, message_ids: Optional[List[str]] = None):
+        """Mark cached messages as stale so they are re-read on the next get_llm_messages call.
+        
+        Args:
+            thread_id: The thread whose snapshot should be invalidated
+            message_ids: Messages to re-read; if omitted the whole snapshot is dropped
+        """
+        snapshot = self._message_snapshots.get(thread_id)
+        if snapshot is None:
+            return
+        if message_ids is None:
+            del self._message_snapshots[thread_id]
+            return
+        snapshot.stale_message_ids.update(message_ids)
+
+    async def _fetch_llm_message_rows(self, client, thread_id: str, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Page through the LLM message rows of a thread, optionally only those created at or after `since`."""
+        all_messages = []
+        batch_size = 1000
+        offset = 0
+
+        while True:
+            query = client.table('messages').select('message_id, type, content, metadata, created_at').eq('thread_id', thread_id).eq('is_llm_message', True)
+            if since:
+                query = query.gte('created_at', since)
+            result = await query.order('created_at').range(offset, offset + batch_size - 1).execute()
+
+            if not result.data:
+                break
+
+            all_messages.extend(result.data)
+            if len(result.data) < batch_size:
+                break
+            offset += batch_size
+
+        return all_messages
+
+    def _parse_llm_message_row(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a messages row into an LLM message, preferring compressed content when present."""
+        # Check if this message has a compressed version in metadata
+        content = item['content']
+        metadata = item.get('metadata', {})
+        is_compressed = False
+
+        # If compressed, use compressed_content for LLM instead of full content
+        if isinstance(metadata, dict) and metadata.get('compressed'):
+            compressed_content = metadata.get('compressed_content')
+            if compressed_content:
+                content = compressed_content
+                is_compressed = True
+                # logger.debug(f"Using compressed content for message {item['message_id']}")
+
+        # Parse content and add message_id
+        if isinstance(content, str):
+            try:
+                parsed_item = json.loads(content)
+                parsed_item['message_id'] = item['message_id']
+                return parsed_item
+            except json.JSONDecodeError:
+                # If compressed, content is a plain string (not JSON) - this is expected
+                if is_compressed:
+                    return {
+                        'role': 'user',
+                        'content': content,
+                        'message_id': item['message_id']
+                    }
+                logger.error(f"Failed to parse message: {content[:100]}")
+                return None
+
+        content['message_id'] = item['message_id']
+        return content
     
     async def run_thread(
         self,
@@ -320,119 +420,24 @@ class ThreadManager:
             need_compression = False
             estimated_total_tokens = None  # Will be passed to response processor to avoid recalculation
             
-            # CRITICAL: Check if this is an auto-continue iteration FIRST (before any token counting)
-            is_auto_continue = auto_continue_state.get('count', 0) > 0
-            
-            if ENABLE_PROMPT_CACHING:
-                try:
-                    from core.ai_models import model_manager
-                    from litellm.utils import token_counter
-                    client = await self.db.client
-                    
-                    # Query last llm_response_end message from messages table (already stored there!)
-                    last_usage_result = await client.table('messages')\
-                        .select('content')\
-                        .eq('thread_id', thread_id)\
-                        .eq('type', 'llm_response_end')\
-                        .order('created_at', desc=True)\
-                        .limit(1)\
-                        .maybe_single()\
-                        .execute()
-                    
-                    if last_usage_result.data:
-                        llm_end_content = last_usage_result.data.get('content', {})
-                        if isinstance(llm_end_content, str):
-                            import json
-                            llm_end_content = json.loads(llm_end_content)
-                        
-                        usage = llm_end_content.get('usage', {})
-                        stored_model = llm_end_content.get('model', '')
-                        
-                        # Normalize model names for comparison (strip any provider prefix like anthropic/, openai/, google/, etc.)
-                        def normalize_model_name(model: str) -> str:
-                            """Strip provider prefix (e.g., 'anthropic/claude-3' -> 'claude-3')"""
-                            return model.split('/')[-1] if '/' in model else model
-                        
-                        normalized_stored = normalize_model_name(stored_model)
-                        normalized_current = normalize_model_name(llm_model)
-                        
-                        logger.debug(f"Fast check data - stored: {stored_model}, current: {llm_model}, match: {normalized_stored == normalized_current}")
-                        
-                        # Only use fast path if model matches and we have stored tokens
-                        if usage and normalized_stored == normalized_current:
-                            # Use total_tokens (includes prev completion) for better accuracy
-                            last_total_tokens = int(usage.get('total_tokens', 0))
-                            
-                            # Count tokens in new message (only for first turn, not auto-continue)
-                            new_msg_tokens = 0
-                            
-                            if is_auto_continue:
-                                # Auto-continue: No new user message, last_total already includes everything
-                                new_msg_tokens = 0
-                                logger.debug(f"✅ Auto-continue detected (count={auto_continue_state['count']}), skipping new message token count")
-                            elif latest_user_message_content:
-                                # First turn: Use passed content (avoids DB query)
-                                new_msg_tokens = token_counter(
-                                    model=llm_model, 
-                                    messages=[{"role": "user", "content": latest_user_message_content}]
-                                )
-                                logger.debug(f"First turn: counting {new_msg_tokens} tokens from latest_user_message_content")
-                            else:
-                                # First turn fallback: Query DB if content not provided
-                                latest_msg_result = await client.table('messages')\
-                                    .select('content')\
-                                    .eq('thread_id', thread_id)\
-                                    .eq('type', 'user')\
-                                    .order('created_at', desc=True)\
-                                    .limit(1)\
-                                    .single()\
-                                    .execute()
-                                
-                                if latest_msg_result.data:
-                                    new_msg_content = latest_msg_result.data.get('content', '')
-                                    if new_msg_content:
-                                        new_msg_tokens = token_counter(
-                                            model=llm_model, 
-                                            messages=[{"role": "user", "content": new_msg_content}]
-                                        )
-                                        logger.debug(f"First turn (DB fallback): counting {new_msg_tokens} tokens from DB query")
-                            
-                            estimated_total = last_total_tokens + new_msg_tokens
-                            estimated_total_tokens = estimated_total  # Store for response processor
-                            
-                            # Calculate threshold (same logic as context_manager.py)
-                            context_window = model_manager.get_context_window(llm_model)
-                            
-                            if context_window >= 1_000_000:
-                                max_tokens = context_window - 300_000
-                            elif context_window >= 400_000:
-                                max_tokens = context_window - 64_000
-                            elif context_window >= 200_000:
-                                max_tokens = context_window - 32_000
-                            elif context_window >= 100_000:
-                                max_tokens = context_window - 16_000
-                            else:
-                                max_tokens = int(context_window * 0.84)
-                            
-                            logger.info(f"⚡ Fast check: {last_total_tokens} + {new_msg_tokens} = {estimated_total} tokens (threshold: {max_tokens})")
-                            
-                            if estimated_total < max_tokens:
-                                logger.info(f"✅ Under threshold, skipping compression")
-                                skip_fetch = True
-                            else:
-                                logger.info(f"📊 Over threshold ({estimated_total} >= {max_tokens}), triggering compression")
-                                need_compression = True
-                                # Will fetch and compress below
-                        else:
-                            logger.debug(f"Fast check skipped - usage: {bool(usage)}, model_match: {normalized_stored == normalized_current}")
-                    else:
-                        logger.debug(f"Fast check skipped - no last llm_response_end message found")
-                except Exception as e:
-                    logger.debug(f"Fast path check failed, falling back to full fetch: {e}")
-            
+            phase_timer = self.phase_timer
+
             # Always fetch messages (needed for LLM call)
             # Fast path just skips compression, not fetching!
-            messages = await self.get_llm_messages(thread_id)
+            # The fast path check, the message fetch and the metadata load are
+            # independent reads, so they run concurrently
+            if ENABLE_PROMPT_CACHING:
+                (skip_fetch, need_compression, estimated_total_tokens), messages, thread_metadata = await asyncio.gather(
+                    self._check_context_fast_path(thread_id, llm_model, auto_continue_state, latest_user_message_content),
+                    self.get_llm_messages(thread_id),
+                    # Load thread metadata once; compression and caching read and write it in memory
+                    ThreadMetadata(thread_id, self.db).load()
+                )
+            else:
+                messages = await self.get_llm_messages(thread_id)
+                thread_metadata = None
+            if phase_timer:
+                phase_timer.mark("load_context")
             
             # Handle auto-continue context
             if auto_continue_state['count'] > 0 and auto_continue_state['continuous_state'].get('accumulated_content'):
@@ -452,9 +457,11 @@ class ThreadManager:
                         messages, llm_model, max_tokens=llm_max_tokens, 
                         actual_total_tokens=estimated_total_tokens,  # Use estimated from fast check!
                         system_prompt=system_prompt,
-                        thread_id=thread_id
+                        thread_id=thread_id,
+                        thread_metadata=thread_metadata
                     )
                     logger.debug(f"Context compression completed: {len(messages)} -> {len(compressed_messages)} messages")
+                    self.invalidate_llm_messages(thread_id, context_manager.compressed_message_ids)
                     messages = compressed_messages
                 else:
                     # First turn or no fast path data: Run compression check
@@ -464,26 +471,30 @@ class ThreadManager:
                         messages, llm_model, max_tokens=llm_max_tokens, 
                         actual_total_tokens=None,
                         system_prompt=system_prompt,
-                        thread_id=thread_id
+                        thread_id=thread_id,
+                        thread_metadata=thread_metadata
                     )
+                    self.invalidate_llm_messages(thread_id, context_manager.compressed_message_ids)
                     messages = compressed_messages
 
+                if not skip_fetch:
+                    counter_stats = anthropic_token_counter.stats()
+                    logger.debug(f"Token counting: cache hits={token_count_cache.hits}, misses={token_count_cache.misses}, "
+                                 f"remote wait={counter_stats['wait_latency']}, coalesced={counter_stats['coalesced']}, timeouts={counter_stats['timeouts']}")
+                if phase_timer:
+                    phase_timer.mark("compression")
+
             # Check if cache needs rebuild due to compression
             force_rebuild = False
             if ENABLE_PROMPT_CACHING:
-                try:
-                    client = await self.db.client
-                    result = await client.table('threads').select('metadata').eq('thread_id', thread_id).single().execute()
-                    if result.data:
-                        metadata = result.data.get('metadata', {})
-                        if metadata.get('cache_needs_rebuild'):
-                            force_rebuild = True
-                            logger.info("🔄 Rebuilding cache due to compression/model change")
-                            # Clear the flag
-                            metadata['cache_needs_rebuild'] = False
-                            await client.table('threads').update({'metadata': metadata}).eq('thread_id', thread_id).execute()
-                except Exception as e:
-                    logger.debug(f"Failed to check cache_needs_rebuild flag: {e}")
+                # The direct check read the row every turn and wrote it back to clear the flag
+                thread_metadata.add_legacy_calls(1)
+                if thread_metadata.cache_needs_rebuild:
+                    force_rebuild = True
+                    logger.info("🔄 Rebuilding cache due to compression/model change")
+                    # Clear the flag
+                    thread_metadata.add_legacy_calls(1)
+                    thread_metadata.cache_needs_rebuild = False
             
             # Apply caching
             if ENABLE_PROMPT_CACHING:
@@ -492,11 +503,19 @@ class ThreadManager:
                     messages, 
                     llm_model,
                     thread_id=thread_id,
-                    force_recalc=force_rebuild
+                    force_recalc=force_rebuild,
+                    thread_metadata=thread_metadata
                 )
                 prepared_messages = validate_cache_blocks(prepared_messages, llm_model)
+
+                # Write every metadata change from this turn in one patch
+                await thread_metadata.flush()
+                self.metadata_db_calls_saved += thread_metadata.db_calls_saved
+                logger.debug(f"Thread metadata: {thread_metadata.db_calls} DB calls this turn, {thread_metadata.db_calls_saved} saved ({self.metadata_db_calls_saved} saved this run)")
             else:
                 prepared_messages = [system_prompt] + messages
+            if phase_timer:
+                phase_timer.mark("prompt_caching")
 
             # Get tool schemas for LLM API call (after compression)
             openapi_tool_schemas = self.tool_registry.get_openapi_schemas() if config.native_tool_calling else None
@@ -534,6 +553,8 @@ class ThreadManager:
                 )
             except LLMError as e:
                 return {"type": "status", "status": "error", "message": str(e)}
+            if phase_timer:
+                phase_timer.mark("llm_request")
 
             # Check for error response
             if isinstance(llm_response, dict) and llm_response.get("status") == "error":
@@ -562,6 +583,126 @@ class ThreadManager:
             ErrorProcessor.log_error(processed_error)
             return processed_error.to_stream_dict()
 
+    async def _check_context_fast_path(
+        self, thread_id: str, llm_model: str, auto_continue_state: Dict[str, Any],
+        latest_user_message_content: Optional[str] = None
+    ) -> Tuple[bool, bool, Optional[int]]:
+        """Estimate the context size from the last stored usage plus the new user message.
+
+        Returns (skip_fetch, need_compression, estimated_total_tokens).
+        """
+        skip_fetch = False
+        need_compression = False
+        estimated_total_tokens = None
+        is_auto_continue = auto_continue_state.get('count', 0) > 0
+
+        try:
+            from core.ai_models import model_manager
+            from litellm.utils import token_counter
+            client = await self.db.client
+
+            # Query last llm_response_end message from messages table (already stored there!)
+            last_usage_result = await client.table('messages')\
+                .select('content')\
+                .eq('thread_id', thread_id)\
+                .eq('type', 'llm_response_end')\
+                .order('created_at', desc=True)\
+                .limit(1)\
+                .maybe_single()\
+                .execute()
+
+            if last_usage_result.data:
+                llm_end_content = last_usage_result.data.get('content', {})
+                if isinstance(llm_end_content, str):
+                    import json
+                    llm_end_content = json.loads(llm_end_content)
+
+                usage = llm_end_content.get('usage', {})
+                stored_model = llm_end_content.get('model', '')
+
+                # Normalize model names for comparison (strip any provider prefix like anthropic/, openai/, google/, etc.)
+                def normalize_model_name(model: str) -> str:
+                    """Strip provider prefix (e.g., 'anthropic/claude-3' -> 'claude-3')"""
+                    return model.split('/')[-1] if '/' in model else model
+
+                normalized_stored = normalize_model_name(stored_model)
+                normalized_current = normalize_model_name(llm_model)
+
+                logger.debug(f"Fast check data - stored: {stored_model}, current: {llm_model}, match: {normalized_stored == normalized_current}")
+
+                # Only use fast path if model matches and we have stored tokens
+                if usage and normalized_stored == normalized_current:
+                    # Use total_tokens (includes prev completion) for better accuracy
+                    last_total_tokens = int(usage.get('total_tokens', 0))
+
+                    # Count tokens in new message (only for first turn, not auto-continue)
+                    new_msg_tokens = 0
+
+                    if is_auto_continue:
+                        # Auto-continue: No new user message, last_total already includes everything
+                        new_msg_tokens = 0
+                        logger.debug(f"✅ Auto-continue detected (count={auto_continue_state['count']}), skipping new message token count")
+                    elif latest_user_message_content:
+                        # First turn: Use passed content (avoids DB query)
+                        new_msg_tokens = token_counter(
+                            model=llm_model, 
+                            messages=[{"role": "user", "content": latest_user_message_content}]
+                        )
+                        logger.debug(f"First turn: counting {new_msg_tokens} tokens from latest_user_message_content")
+                    else:
+                        # First turn fallback: Query DB if content not provided
+                        latest_msg_result = await client.table('messages')\
+                            .select('content')\
+                            .eq('thread_id', thread_id)\
+                            .eq('type', 'user')\
+                            .order('created_at', desc=True)\
+                            .limit(1)\
+                            .single()\
+                            .execute()
+
+                        if latest_msg_result.data:
+                            new_msg_content = latest_msg_result.data.get('content', '')
+                            if new_msg_content:
+                                new_msg_tokens = token_counter(
+                                    model=llm_model, 
+                                    messages=[{"role": "user", "content": new_msg_content}]
+                                )
+                                logger.debug(f"First turn (DB fallback): counting {new_msg_tokens} tokens from DB query")
+
+                    estimated_total = last_total_tokens + new_msg_tokens
+                    estimated_total_tokens = estimated_total  # Store for response processor
+
+                    # Calculate threshold (same logic as context_manager.py)
+                    context_window = model_manager.get_context_window(llm_model)
+
+                    if context_window >= 1_000_000:
+                        max_tokens = context_window - 300_000
+                    elif context_window >= 400_000:
+                        max_tokens = context_window - 64_000
+                    elif context_window >= 200_000:
+                        max_tokens = context_window - 32_000
+                    elif context_window >= 100_000:
+                        max_tokens = context_window - 16_000
+                    else:
+                        max_tokens = int(context_window * 0.84)
+
+                    logger.info(f"⚡ Fast check: {last_total_tokens} + {new_msg_tokens} = {estimated_total} tokens (threshold: {max_tokens})")
+
+                    if estimated_total < max_tokens:
+                        logger.info(f"✅ Under threshold, skipping compression")
+                        skip_fetch = True
+                    else:
+                        logger.info(f"📊 Over threshold ({estimated_total} >= {max_tokens}), triggering compression")
+                        need_compression = True
+                        # Will fetch and compress below
+                else:
+                    logger.debug(f"Fast check skipped - usage: {bool(usage)}, model_match: {normalized_stored == normalized_current}")
+            else:
+                logger.debug(f"Fast check skipped - no last llm_response_end message found")
+        except Exception as e:
+            logger.debug(f"Fast path check failed, falling back to full fetch: {e}")
+        return skip_fetch, need_compression, estimated_total_tokens
+
     async def _auto_continue_generator(
         self, thread_id: str, system_prompt: Dict[str, Any], llm_model: str,
         llm_temperature: float, llm_max_tokens: Optional[int], tool_choice: ToolChoice,
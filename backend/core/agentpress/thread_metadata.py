@@ -0,0 +1,146 @@
+"""
+Run-scoped access to threads.metadata for AgentPress.
+
+Prompt caching and context compression keep their state (cache threshold,
+cached blocks, rebuild flag) in the thread's metadata JSON. Instead of every
+helper doing its own read-modify-write of the whole column, a ThreadMetadata
+instance loads the row once per turn, serves reads from memory and flushes only
+the keys that changed in a single JSONB patch. Patching individual keys also
+means concurrent writers no longer overwrite each other's keys.
+"""
+
+from typing import Dict, Any, List, Optional, Set
+from core.services.supabase import DBConnection
+from core.utils.logger import logger
+
+
+class ThreadMetadata:
+    """Loads threads.metadata once and coalesces writes into one patch."""
+
+    CACHE_CONFIG_KEY = 'cache_config'
+    CACHED_BLOCKS_KEY = 'cached_blocks'
+    CACHE_METADATA_KEY = 'cache_metadata'
+    CACHE_NEEDS_REBUILD_KEY = 'cache_needs_rebuild'
+
+    def __init__(self, thread_id: str, db: Optional[DBConnection] = None):
+        """Initialize the accessor.
+
+        Args:
+            thread_id: The thread whose metadata is accessed
+            db: Optional shared database connection
+        """
+        self.thread_id = thread_id
+        self.db = db or DBConnection()
+        self._metadata: Dict[str, Any] = {}
+        self._loaded = False
+        self._dirty_keys: Set[str] = set()
+        self._removed_keys: Set[str] = set()
+        # Round trips actually made vs. those the per-helper read-modify-write would have made.
+        # Callers record the legacy round trips once per helper invocation, not per key.
+        self.db_calls = 0
+        self.legacy_db_calls = 0
+
+    @property
+    def db_calls_saved(self) -> int:
+        """Number of database round trips avoided by coalescing."""
+        return max(0, self.legacy_db_calls - self.db_calls)
+
+    def add_legacy_calls(self, count: int):
+        """Record the round trips the direct-DB version of an operation would have made."""
+        self.legacy_db_calls += count
+
+    async def load(self) -> 'ThreadMetadata':
+        """Read the thread's metadata column. Subsequent calls are no-ops."""
+        if self._loaded:
+            return self
+
+        client = await self.db.client
+        try:
+            self.db_calls += 1
+            result = await client.table('threads').select('metadata').eq('thread_id', self.thread_id).single().execute()
+            metadata = result.data.get('metadata') if result.data else None
+            self._metadata = metadata if isinstance(metadata, dict) else {}
+            self._loaded = True
+        except Exception as e:
+            logger.warning(f"Failed to load metadata for thread {self.thread_id}: {e}")
+        return self
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a metadata value from the loaded snapshot."""
+        return self._metadata.get(key, default)
+
+    def set(self, key: str, value: Any):
+        """Set a metadata value, to be written on the next flush."""
+        self._metadata[key] = value
+        self._dirty_keys.add(key)
+        self._removed_keys.discard(key)
+
+    def remove(self, key: str):
+        """Remove a metadata key, to be applied on the next flush."""
+        self._metadata.pop(key, None)
+        self._dirty_keys.discard(key)
+        self._removed_keys.add(key)
+
+    @property
+    def cache_config(self) -> Optional[Dict[str, Any]]:
+        """Stored prompt caching threshold configuration."""
+        return self.get(self.CACHE_CONFIG_KEY)
+
+    @cache_config.setter
+    def cache_config(self, value: Dict[str, Any]):
+        self.set(self.CACHE_CONFIG_KEY, value)
+
+    @property
+    def cached_blocks(self) -> Optional[List[Dict[str, Any]]]:
+        """Prepared prompt cache blocks from a previous turn."""
+        return self.get(self.CACHED_BLOCKS_KEY)
+
+    @cached_blocks.setter
+    def cached_blocks(self, value: List[Dict[str, Any]]):
+        self.set(self.CACHED_BLOCKS_KEY, value)
+
+    @property
+    def cache_metadata(self) -> Optional[Dict[str, Any]]:
+        """Model and coverage information for the stored cache blocks."""
+        return self.get(self.CACHE_METADATA_KEY)
+
+    @cache_metadata.setter
+    def cache_metadata(self, value: Dict[str, Any]):
+        self.set(self.CACHE_METADATA_KEY, value)
+
+    @property
+    def cache_needs_rebuild(self) -> bool:
+        """Whether compression changed stored messages since the cache was built."""
+        return bool(self.get(self.CACHE_NEEDS_REBUILD_KEY, False))
+
+    @cache_needs_rebuild.setter
+    def cache_needs_rebuild(self, value: bool):
+        self.set(self.CACHE_NEEDS_REBUILD_KEY, value)
+
+    async def flush(self) -> bool:
+        """Write all changed keys in one patch.
+
+        Returns:
+            True if a write was issued, False if nothing was dirty
+        """
+        if not self._dirty_keys and not self._removed_keys:
+            return False
+
+        patch = {key: self._metadata[key] for key in self._dirty_keys}
+        removed = list(self._removed_keys)
+
+        client = await self.db.client
+        try:
+            self.db_calls += 1
+            await client.rpc('patch_thread_metadata', {
+                'p_thread_id': self.thread_id,
+                'p_set': patch,
+                'p_remove': removed
+            }).execute()
+            self._dirty_keys.clear()
+            self._removed_keys.clear()
+            logger.debug(f"Flushed thread metadata for {self.thread_id}: set={list(patch)}, removed={removed}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to flush metadata for thread {self.thread_id}: {e}")
+            return False
@@ -0,0 +1,246 @@
+"""
+Token count memoization for AgentPress.
+
+Context compression counts the same conversation many times while it tries
+successive strategies, and most messages are unchanged between counts. Counts
+are therefore cached per message, keyed by tokenizer family and a hash of the
+message, in a process-wide LRU. Totals are sums over the cached per-message
+counts, so only messages that have not been seen before need tokenizing.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from litellm.utils import token_counter
+from core.utils.logger import logger
+
+DEFAULT_MAX_ENTRIES = 50_000
+
+# Remote counting limits: concurrent requests per process and how long a caller
+# waits before falling back to the local estimate
+ANTHROPIC_COUNT_MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_COUNT_MAX_CONNECTIONS", "8"))
+ANTHROPIC_COUNT_TIMEOUT = float(os.getenv("ANTHROPIC_COUNT_TIMEOUT", "2.0"))
+
+TokenCacheKey = Tuple[str, str]
+
+
+def tokenizer_family(model: Optional[str]) -> str:
+    """Return the tokenizer family used as the cache namespace for a model."""
+    if not model:
+        return "default"
+    lowered = model.lower()
+    if 'claude' in lowered or 'anthropic' in lowered:
+        return "anthropic"
+    return model
+
+
+def message_hash(message: Dict[str, Any]) -> str:
+    """Hash the token-relevant parts of a message (everything except message_id)."""
+    payload = {key: value for key, value in message.items() if key != 'message_id'}
+    serialized = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class TokenCountCache:
+    """Bounded LRU of per-message token counts."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[TokenCacheKey, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model: Optional[str], message: Dict[str, Any]) -> TokenCacheKey:
+        """Build the cache key for a message counted with the given model."""
+        return (tokenizer_family(model), message_hash(message))
+
+    def estimate_key(self, key: TokenCacheKey) -> TokenCacheKey:
+        """Key for a local estimate standing in for a remote count that was unavailable.
+
+        Kept apart from the accurate count so a later remote count still takes precedence.
+        """
+        family, digest = key
+        return (f"{family}-local", digest)
+
+    def get(self, key: TokenCacheKey) -> Optional[int]:
+        """Get a cached count, marking it as recently used."""
+        count = self._counts.get(key)
+        if count is None:
+            self.misses += 1
+            return None
+        self._counts.move_to_end(key)
+        self.hits += 1
+        return count
+
+    def set(self, key: TokenCacheKey, count: int):
+        """Store a count, evicting the least recently used entries beyond the bound."""
+        self._counts[key] = count
+        self._counts.move_to_end(key)
+        while len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+token_count_cache = TokenCountCache()
+
+
+def count_message_tokens(message: Dict[str, Any], model: Optional[str] = None) -> int:
+    """Count tokens for a single message locally with LiteLLM, using the shared cache."""
+    key = token_count_cache.key(model, message)
+    count = token_count_cache.get(key)
+    if count is None:
+        count = token_counter(model=model, messages=[message]) if model else token_counter(messages=[message])
+        token_count_cache.set(key, count)
+    return count
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds."""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        """Record one observation."""
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return bucket counts keyed by upper bound, plus count, mean and max."""
+        labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["inf"]
+        return {
+            "buckets": dict(zip(labels, self.bucket_counts)),
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class AnthropicTokenCounter:
+    """Non-blocking client for Anthropic's count_tokens endpoint.
+
+    Requests share one AsyncAnthropic client with a bounded connection pool,
+    identical payloads in flight are coalesced onto a single request, and callers
+    that wait longer than the timeout get None so they can use the local estimate.
+    """
+
+    def __init__(self, max_connections: int = ANTHROPIC_COUNT_MAX_CONNECTIONS, timeout: float = ANTHROPIC_COUNT_TIMEOUT):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[AsyncAnthropic] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Remote round trip time, and the time callers actually spent waiting
+        self.request_latency = LatencyHistogram()
+        self.wait_latency = LatencyHistogram()
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _get_client(self) -> Optional[AsyncAnthropic]:
+        """Lazy initialization of the Anthropic client."""
+        if self._client is None:
+            api_key = os.environ.get("ANTHROPIC_API_KEY")
+            if api_key:
+                self._client = AsyncAnthropic(
+                    api_key=api_key,
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections
+                        )
+                    )
+                )
+                self._semaphore = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    async def count(self, model: str, messages: List[Dict[str, Any]], system: Optional[Any] = None) -> Optional[int]:
+        """Count input tokens remotely.
+
+        Args:
+            model: Anthropic model name, with or without provider prefix
+            messages: Messages with only role and content
+            system: Optional system prompt content
+
+        Returns:
+            The token count, or None if the client is unavailable, the request
+            failed, or it did not finish within the timeout
+        """
+        client = self._get_client()
+        if client is None:
+            return None
+
+        # Strip provider prefix
+        clean_model = model.split('/')[-1] if '/' in model else model
+        params: Dict[str, Any] = {'model': clean_model, 'messages': messages}
+        if system:
+            params['system'] = system
+
+        key = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request(client, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._on_request_done(key, done))
+        else:
+            self.coalesced += 1
+
+        start = time.monotonic()
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.debug(f"Anthropic token counting timed out after {self.timeout}s, falling back to LiteLLM")
+        except Exception as e:
+            self.failures += 1
+            logger.debug(f"Anthropic token counting failed, falling back to LiteLLM: {e}")
+        finally:
+            self.wait_latency.observe((time.monotonic() - start) * 1000)
+        return None
+
+    async def _request(self, client: AsyncAnthropic, params: Dict[str, Any]) -> int:
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                result = await client.messages.count_tokens(**params)
+            finally:
+                self.request_latency.observe((time.monotonic() - start) * 1000)
+        return result.input_tokens
+
+    def _on_request_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Retrieve the exception so requests every caller gave up on are not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and latency histograms for monitoring."""
+        return {
+            "request_latency": self.request_latency.snapshot(),
+            "wait_latency": self.wait_latency.snapshot(),
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "inflight": len(self._inflight),
+        }
+
+
+anthropic_token_counter = AnthropicTokenCounter()
@@ -8,7 +8,7 @@ the XML format with structured function_calls blocks.
 import re
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import json
 import logging
 
@@ -24,6 +24,24 @@ class XMLToolCall:
     parsing_details: Dict[str, Any]
 
 
+@dataclass
+class XMLParameterSpan:
+    """Offsets of a parameter value within the parsed content."""
+    name: str
+    start: int
+    end: int
+
+
+@dataclass
+class XMLInvokeSpan:
+    """Offsets of an invoke block and its parameters within the parsed content."""
+    function_name: str
+    start: int
+    end: int
+    block_start: int
+    parameters: List[XMLParameterSpan] = field(default_factory=list)
+
+
 class XMLToolParser:
     """
     Parser for XML tool calls format:
@@ -34,23 +52,20 @@ class XMLToolParser:
     ...
     </invoke>
     </function_calls>
-    """
     
-    # Regex patterns for extracting XML blocks
-    FUNCTION_CALLS_PATTERN = re.compile(
-        r'<function_calls>(.*?)</function_calls>',
-        re.DOTALL | re.IGNORECASE
-    )
+    Content is tokenized in a single pass over the tags below, recording the
+    offsets of every function_calls, invoke and parameter block. Raw XML and
+    parameter values are then sliced out of the original content once.
+    """
     
-    INVOKE_PATTERN = re.compile(
-        r'<invoke\s+name=["\']([^"\']+)["\']>(.*?)</invoke>',
-        re.DOTALL | re.IGNORECASE
+    # Matches every opening and closing tag the parser cares about
+    TAG_PATTERN = re.compile(
+        r'<(/?)(function_calls|invoke|parameter)\b(?:\s+name=["\']([^"\']+)["\'])?\s*>',
+        re.IGNORECASE
     )
     
-    PARAMETER_PATTERN = re.compile(
-        r'<parameter\s+name=["\']([^"\']+)["\']>(.*?)</parameter>',
-        re.DOTALL | re.IGNORECASE
-    )
+    # Values longer than this are never converted to numbers
+    MAX_NUMBER_LENGTH = 64
     
     def __init__(self):
         """Initialize the XML tool parser."""
@@ -66,67 +81,122 @@ class XMLToolParser:
         Returns:
             List of parsed XMLToolCall objects
         """
-        tool_calls = []
+        return self._build_tool_calls(content, self.tokenize(content))
+    
+    def parse_invoke(self, invoke_xml: str) -> Optional[XMLToolCall]:
+        """
+        Parse a single standalone <invoke> block.
+        
+        Used for blocks handed over by XMLStreamScanner, which are not
+        wrapped in <function_calls>.
+        
+        Args:
+            invoke_xml: A complete <invoke ...>...</invoke> block
+            
+        Returns:
+            The parsed XMLToolCall, or None if the block is malformed
+        """
+        tool_calls = self._build_tool_calls(invoke_xml, self.tokenize(invoke_xml, in_function_calls=True))
+        return tool_calls[0] if tool_calls else None
+    
+    def tokenize(self, content: str, in_function_calls: bool = False) -> List[XMLInvokeSpan]:
+        """
+        Locate all complete invoke blocks in a single pass over the content.
         
-        # Find function_calls blocks
-        function_calls_matches = self.FUNCTION_CALLS_PATTERN.findall(content)
+        Closing tags take precedence from the outside in: </function_calls>
+        ends any open invoke, and </invoke> ends any open parameter. Opening
+        tags that appear inside a block of the same kind are treated as text.
+        Invokes are only returned once their enclosing <function_calls> block
+        has closed.
         
-        for fc_content in function_calls_matches:
-            # Find all invoke blocks within this function_calls block
-            invoke_matches = self.INVOKE_PATTERN.findall(fc_content)
+        Args:
+            content: The text content potentially containing XML tool calls
+            in_function_calls: Treat the content as the body of an already
+                open <function_calls> block that ends with the content
             
-            for function_name, invoke_content in invoke_matches:
-                try:
-                    tool_call = self._parse_invoke_block(
-                        function_name, 
-                        invoke_content,
-                        fc_content
-                    )
-                    if tool_call:
-                        tool_calls.append(tool_call)
-                except Exception as e:
-                    logger.error(f"Error parsing invoke block for {function_name}: {e}")
+        Returns:
+            List of XMLInvokeSpan objects in document order
+        """
+        invokes: List[XMLInvokeSpan] = []
+        block_invokes: List[XMLInvokeSpan] = []
+        block_start = 0 if in_function_calls else -1
+        invoke: Optional[XMLInvokeSpan] = None
+        param_name: Optional[str] = None
+        param_start = 0
         
+        for match in self.TAG_PATTERN.finditer(content):
+            closing, tag, name = match.groups()
+            tag = tag.lower()
+            
+            if block_start == -1:
+                if tag == 'function_calls' and not closing:
+                    block_start = match.start()
+                continue
+            
+            if tag == 'function_calls':
+                if closing:
+                    invokes.extend(block_invokes)
+                    block_invokes = []
+                    block_start = -1
+                    invoke = None
+                    param_name = None
+            elif tag == 'invoke':
+                if invoke is None:
+                    if not closing and name:
+                        invoke = XMLInvokeSpan(name, match.start(), -1, block_start)
+                elif closing:
+                    invoke.end = match.end()
+                    block_invokes.append(invoke)
+                    invoke = None
+                    param_name = None
+            elif invoke is not None:
+                if param_name is None:
+                    if not closing and name:
+                        param_name = name
+                        param_start = match.end()
+                elif closing:
+                    invoke.parameters.append(XMLParameterSpan(param_name, param_start, match.start()))
+                    param_name = None
+        
+        if in_function_calls and block_start != -1:
+            invokes.extend(block_invokes)
+        
+        return invokes
+    
+    def _build_tool_calls(self, content: str, invoke_spans: List[XMLInvokeSpan]) -> List[XMLToolCall]:
+        """Build XMLToolCall objects from tokenized invoke spans."""
+        tool_calls = []
+        for invoke_span in invoke_spans:
+            try:
+                tool_calls.append(self._parse_invoke_block(content, invoke_span))
+            except Exception as e:
+                logger.error(f"Error parsing invoke block for {invoke_span.function_name}: {e}")
         return tool_calls
     
-    def _parse_invoke_block(
-        self, 
-        function_name: str, 
-        invoke_content: str,
-        full_block: str
-    ) -> Optional[XMLToolCall]:
-        """Parse a single invoke block into an XMLToolCall."""
+    def _parse_invoke_block(self, content: str, invoke_span: XMLInvokeSpan) -> XMLToolCall:
+        """Parse a single tokenized invoke block into an XMLToolCall."""
         parameters = {}
         parsing_details = {
-            "function_name": function_name,
+            "function_name": invoke_span.function_name,
             "raw_parameters": {}
         }
         
-        # Extract all parameters
-        param_matches = self.PARAMETER_PATTERN.findall(invoke_content)
-        
-        for param_name, param_value in param_matches:
-            # Clean up the parameter value
-            param_value = param_value.strip()
+        for param_span in invoke_span.parameters:
+            # Trim surrounding whitespace by offset so the value is sliced only once
+            start, end = param_span.start, param_span.end
+            while start < end and content[start].isspace():
+                start += 1
+            while end > start and content[end - 1].isspace():
+                end -= 1
+            param_value = content[start:end]
             
-            # Try to parse as JSON if it looks like JSON
-            parsed_value = self._parse_parameter_value(param_value)
-            
-            parameters[param_name] = parsed_value
-            parsing_details["raw_parameters"][param_name] = param_value
-        
-        # Extract the raw XML for this specific invoke
-        invoke_pattern = re.compile(
-            rf'<invoke\s+name=["\']{re.escape(function_name)}["\']>.*?</invoke>',
-            re.DOTALL | re.IGNORECASE
-        )
-        raw_xml_match = invoke_pattern.search(full_block)
-        raw_xml = raw_xml_match.group(0) if raw_xml_match else f"<invoke name=\"{function_name}\">...</invoke>"
+            parameters[param_span.name] = self._parse_parameter_value(param_value)
+            parsing_details["raw_parameters"][param_span.name] = param_value
         
         return XMLToolCall(
-            function_name=function_name,
+            function_name=invoke_span.function_name,
             parameters=parameters,
-            raw_xml=raw_xml,
+            raw_xml=content[invoke_span.start:invoke_span.end],
             parsing_details=parsing_details
         )
     
@@ -134,6 +204,9 @@ class XMLToolParser:
         """
         Parse a parameter value, attempting to convert to appropriate type.
         
+        Conversions are only attempted when the leading character or length
+        allows them to succeed, so large text bodies are returned untouched.
+        
         Args:
             value: The string value to parse
             
@@ -141,26 +214,31 @@ class XMLToolParser:
             Parsed value (could be dict, list, bool, int, float, or str)
         """
         value = value.strip()
+        if not value:
+            return value
+        
+        first_char = value[0]
         
         # Try to parse as JSON first
-        if value.startswith(('{', '[')):
+        if first_char in '{[':
             try:
                 return json.loads(value)
             except json.JSONDecodeError:
                 pass
         
         # Try to parse as boolean
-        if value.lower() in ('true', 'false'):
+        if len(value) in (4, 5) and value.lower() in ('true', 'false'):
             return value.lower() == 'true'
         
         # Try to parse as number
-        try:
-            if '.' in value:
-                return float(value)
-            else:
-                return int(value)
-        except ValueError:
-            pass
+        if len(value) <= self.MAX_NUMBER_LENGTH and (first_char in '+-.' or first_char.isdigit()):
+            try:
+                if '.' in value:
+                    return float(value)
+                else:
+                    return int(value)
+            except ValueError:
+                pass
         
         # Return as string
         return value
@@ -220,6 +298,119 @@ class XMLToolParser:
         return True, None
 
 
+class XMLStreamScanner:
+    """
+    Incremental scanner for XML tool calls in streamed content.
+    
+    Keeps its scan state across deltas so that every delta is examined once,
+    instead of rescanning the whole accumulated buffer. Complete <invoke>
+    blocks inside a <function_calls> block are returned as soon as their
+    closing tag arrives.
+    
+    Only the unresolved tail of the stream is retained: a few characters that
+    may hold a split tag, plus the body of the invoke currently being read.
+    """
+    
+    FUNCTION_CALLS_OPEN = '<function_calls>'
+    FUNCTION_CALLS_CLOSE = '</function_calls>'
+    INVOKE_OPEN = '<invoke'
+    INVOKE_CLOSE = '</invoke>'
+    
+    # Scanner states
+    OUTSIDE = 'outside'
+    IN_FUNCTION_CALLS = 'in_function_calls'
+    IN_INVOKE = 'in_invoke'
+    
+    def __init__(self):
+        """Initialize the scanner with an empty stream."""
+        self.state = self.OUTSIDE
+        self.chars_scanned = 0
+        self.blocks_emitted = 0
+        # Stream offsets just past each block returned by the last feed() call
+        self.last_end_offsets: List[int] = []
+        self._carry = ""
+        self._invoke_parts: List[str] = []
+        self._invoke_tail = ""
+    
+    @property
+    def in_function_calls(self) -> bool:
+        """Whether a <function_calls> block has been opened but not yet closed."""
+        return self.state != self.OUTSIDE
+    
+    def feed(self, delta: str) -> List[str]:
+        """
+        Consume the next piece of streamed content.
+        
+        Args:
+            delta: Newly received content
+            
+        Returns:
+            Raw XML of every <invoke> block that was completed by this delta
+        """
+        completed = []
+        self.last_end_offsets = []
+        if not delta:
+            return completed
+        
+        self.chars_scanned += len(delta)
+        text = self._carry + delta if self._carry else delta
+        self._carry = ""
+        # Offset of text[0] in the whole stream
+        base = self.chars_scanned - len(text)
+        pos = 0
+        
+        while True:
+            if self.state == self.OUTSIDE:
+                start = text.find(self.FUNCTION_CALLS_OPEN, pos)
+                if start == -1:
+                    self._carry = self._partial_tail(text, pos, len(self.FUNCTION_CALLS_OPEN))
+                    break
+                pos = start + len(self.FUNCTION_CALLS_OPEN)
+                self.state = self.IN_FUNCTION_CALLS
+            
+            elif self.state == self.IN_FUNCTION_CALLS:
+                invoke_start = text.find(self.INVOKE_OPEN, pos)
+                block_end = text.find(self.FUNCTION_CALLS_CLOSE, pos)
+                if block_end != -1 and (invoke_start == -1 or block_end < invoke_start):
+                    pos = block_end + len(self.FUNCTION_CALLS_CLOSE)
+                    self.state = self.OUTSIDE
+                    continue
+                if invoke_start == -1:
+                    self._carry = self._partial_tail(text, pos, len(self.FUNCTION_CALLS_CLOSE))
+                    break
+                pos = invoke_start
+                self._invoke_parts = []
+                self._invoke_tail = ""
+                self.state = self.IN_INVOKE
+            
+            else:
+                # Search the new text plus a short overlap with the previous
+                # delta, so a closing tag split across deltas is still found.
+                overlap = self._invoke_tail
+                window = overlap + text[pos:] if overlap else text[pos:]
+                end = window.find(self.INVOKE_CLOSE)
+                if end == -1:
+                    self._invoke_parts.append(text[pos:])
+                    self._invoke_tail = window[-(len(self.INVOKE_CLOSE) - 1):]
+                    break
+                block_end = pos + end - len(overlap) + len(self.INVOKE_CLOSE)
+                self._invoke_parts.append(text[pos:block_end])
+                completed.append("".join(self._invoke_parts))
+                self.last_end_offsets.append(base + block_end)
+                self.blocks_emitted += 1
+                self._invoke_parts = []
+                self._invoke_tail = ""
+                pos = block_end
+                self.state = self.IN_FUNCTION_CALLS
+        
+        return completed
+    
+    @staticmethod
+    def _partial_tail(text: str, pos: int, tag_length: int) -> str:
+        """Return the trailing characters that could be the start of a split tag."""
+        return text[max(pos, len(text) - (tag_length - 1)):]
+
+
 # Convenience function for quick parsing
 def parse_xml_tool_calls(content: str) -> List[XMLToolCall]:
     """
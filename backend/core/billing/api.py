@@ -556,6 +556,7 @@ async def cancel_subscription(
         )
         
         await Cache.invalidate(f"subscription_tier:{account_id}")
+        await Cache.invalidate(f"billing_entitlements:{account_id}")
         return result
         
     except HTTPException as e:
@@ -573,6 +574,7 @@ async def reactivate_subscription(
     try:
         result = await subscription_service.reactivate_subscription(account_id)
         await Cache.invalidate(f"subscription_tier:{account_id}")
+        await Cache.invalidate(f"billing_entitlements:{account_id}")
         return result
         
     except HTTPException as e:
@@ -1,26 +1,111 @@
+from dataclasses import dataclass
 from decimal import Decimal
 from typing import Optional, Dict, Tuple, List
 from core.billing.api import calculate_token_cost
 from core.billing.credit_manager import credit_manager
+from core.utils.cache import Cache
 from core.utils.config import config, EnvMode
 from core.utils.logger import logger
 from core.services.supabase import DBConnection
 
+# Minimum balance needed to start another LLM call
+MIN_RUN_BALANCE = Decimal('0.10')
+ENTITLEMENTS_CACHE_TTL = 60
+# A run re-reads the balance after this many iterations on its local estimate
+RUN_BALANCE_RESYNC_ITERATIONS = 10
+
+
+def entitlements_cache_key(account_id: str) -> str:
+    return f"billing_entitlements:{account_id}"
+
+
+@dataclass
+class RunCreditEstimate:
+    """Running balance estimate for one agent run.
+
+    Starts from the account balance and is updated from each deduction made
+    during the run, so iterations don't re-read credit_accounts. The balance is
+    re-read periodically and whenever the estimate gets close to the minimum.
+    """
+    account_id: str
+    balance: Optional[Decimal] = None
+    spent: Decimal = Decimal('0')
+    iterations_since_sync: int = 0
+
+    @property
+    def remaining(self) -> Decimal:
+        return (self.balance or Decimal('0')) - self.spent
+
+    def needs_sync(self) -> bool:
+        return (
+            self.balance is None
+            or self.iterations_since_sync >= RUN_BALANCE_RESYNC_ITERATIONS
+            or self.remaining < MIN_RUN_BALANCE * 2
+        )
+
+    def sync(self, balance: Decimal):
+        self.balance = balance
+        self.spent = Decimal('0')
+        self.iterations_since_sync = 0
+
+    def record_usage(self, cost: Decimal, new_balance: Optional[Decimal] = None):
+        if new_balance is not None:
+            self.sync(new_balance)
+        else:
+            self.spent += cost
+
+
 class BillingIntegration:
+    @staticmethod
+    async def get_entitlements(account_id: str) -> Dict:
+        """Cached snapshot of the account's tier, allowed models and credit balance.
+
+        Invalidated whenever credits are added or used and on subscription changes.
+        """
+        async def load():
+            from core.billing.subscription_service import subscription_service
+            tier_info = await subscription_service.get_user_subscription_tier(account_id)
+            balance_info = await credit_manager.get_balance(account_id)
+            return {
+                'tier_info': tier_info,
+                'allowed_models': tier_info.get('models', []),
+                'balance': balance_info.get('total', 0)
+            }
+
+        return await Cache.get_or_load(entitlements_cache_key(account_id), load, ttl=ENTITLEMENTS_CACHE_TTL)
+
     @staticmethod
     async def check_and_reserve_credits(account_id: str, estimated_tokens: int = 10000) -> Tuple[bool, str, Optional[str]]:
         if config.ENV_MODE == EnvMode.LOCAL:
             return True, "Local mode", None
         
-        balance_info = await credit_manager.get_balance(account_id)
-        balance = Decimal(str(balance_info.get('total', 0)))
+        entitlements = await BillingIntegration.get_entitlements(account_id)
+        balance = Decimal(str(entitlements.get('balance', 0)))
         
-        estimated_cost = Decimal('0.10')
+        estimated_cost = MIN_RUN_BALANCE
         
         if balance < estimated_cost:
             return False, f"Insufficient credits. Balance: ${balance:.2f}, Required: ~${estimated_cost:.2f}", None
         
         return True, f"Credits available: ${balance:.2f}", None
+
+    @staticmethod
+    async def check_run_credits(estimate: RunCreditEstimate) -> Tuple[bool, str, Optional[str]]:
+        """Credit check for an iteration of a run, using the run's local estimate when possible."""
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return True, "Local mode", None
+
+        if estimate.needs_sync():
+            entitlements = await BillingIntegration.get_entitlements(estimate.account_id)
+            estimate.sync(Decimal(str(entitlements.get('balance', 0))))
+        else:
+            estimate.iterations_since_sync += 1
+
+        balance = estimate.remaining
+        if balance < MIN_RUN_BALANCE:
+            return False, f"Insufficient credits. Balance: ${balance:.2f}, Required: ~${MIN_RUN_BALANCE:.2f}", None
+
+        return True, f"Credits available: ${balance:.2f}", None
     
     @staticmethod
     async def deduct_usage(
@@ -109,16 +194,16 @@ class BillingIntegration:
             return True, "Local development mode", {"local_mode": True}
         
         try:
-            from core.billing.subscription_service import subscription_service
             from core.billing import is_model_allowed
             
-            # Get user's subscription tier
-            tier_info = await subscription_service.get_user_subscription_tier(account_id)
+            # Tier and balance come from one cached snapshot
+            entitlements = await BillingIntegration.get_entitlements(account_id)
+            tier_info = entitlements['tier_info']
             tier_name = tier_info['name']
             
             # Check model access
             if not is_model_allowed(tier_name, model_name):
-                available_models = tier_info.get('models', [])
+                available_models = entitlements.get('allowed_models', [])
                 return False, f"Your current subscription plan does not include access to {model_name}. Please upgrade your subscription.", {
                     "allowed_models": available_models,
                     "tier_info": tier_info,
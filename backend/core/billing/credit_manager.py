@@ -46,6 +46,7 @@ class CreditManager:
                     
                     await Cache.invalidate(f"credit_balance:{account_id}")
                     await Cache.invalidate(f"credit_summary:{account_id}")
+                    await Cache.invalidate(f"billing_entitlements:{account_id}")
                     
                     return {
                         'success': data.get('success', False),
@@ -179,6 +180,7 @@ class CreditManager:
         
         await Cache.invalidate(f"credit_balance:{account_id}")
         await Cache.invalidate(f"credit_summary:{account_id}")
+        await Cache.invalidate(f"billing_entitlements:{account_id}")
         
         return {
             'success': True,
@@ -213,6 +215,7 @@ class CreditManager:
                     if data.get('success'):
                         logger.info(f"[ATOMIC] Deducted ${amount} credits from {account_id} atomically")
                         await Cache.invalidate(f"credit_balance:{account_id}")
+                        await Cache.invalidate(f"billing_entitlements:{account_id}")
                         
                         return {
                             'success': True,
@@ -267,6 +270,7 @@ class CreditManager:
                         
                         await Cache.invalidate(f"credit_balance:{account_id}")
                         await Cache.invalidate(f"credit_summary:{account_id}")
+                        await Cache.invalidate(f"billing_entitlements:{account_id}")
                         
                         return {
                             'success': True,
@@ -333,6 +337,7 @@ class CreditManager:
         
         await Cache.invalidate(f"credit_balance:{account_id}")
         await Cache.invalidate(f"credit_summary:{account_id}")
+        await Cache.invalidate(f"billing_entitlements:{account_id}")
         
         return {
             'success': True,
@@ -311,6 +311,7 @@ class SubscriptionService:
             await Cache.invalidate(f"subscription_tier:{account_id}")
             await Cache.invalidate(f"credit_balance:{account_id}")
             await Cache.invalidate(f"credit_summary:{account_id}")
+            await Cache.invalidate(f"billing_entitlements:{account_id}")
             
             old_price_id = subscription['items']['data'][0].price.id
             old_tier = get_tier_by_price_id(old_price_id)
@@ -391,6 +392,7 @@ class SubscriptionService:
             await Cache.invalidate(f"subscription_tier:{account_id}")
             await Cache.invalidate(f"credit_balance:{account_id}")
             await Cache.invalidate(f"credit_summary:{account_id}")
+            await Cache.invalidate(f"billing_entitlements:{account_id}")
             
             return {
                 'success': True,
@@ -970,10 +972,9 @@ class SubscriptionService:
 
     async def get_user_subscription_tier(self, account_id: str) -> Dict:
         cache_key = f"subscription_tier:{account_id}"
-        cached = await Cache.get(cache_key)
-        if cached:
-            return cached
-        
+        return await Cache.get_or_load(cache_key, lambda: self._load_subscription_tier(account_id), ttl=60)
+
+    async def _load_subscription_tier(self, account_id: str) -> Dict:
         db = DBConnection()
         client = await db.client
 
@@ -1007,7 +1008,6 @@ class SubscriptionService:
             'is_trial': trial_status == 'active'
         }
         
-        await Cache.set(cache_key, tier_info, ttl=60)
         return tier_info
 
     async def get_allowed_models_for_user(self, user_id: str, client=None) -> List[str]:
@@ -1134,6 +1134,7 @@ class WebhookService:
                     await Cache.invalidate(f"credit_balance:{account_id}")
                     await Cache.invalidate(f"credit_summary:{account_id}")
                     await Cache.invalidate(f"subscription_tier:{account_id}")
+                    await Cache.invalidate(f"billing_entitlements:{account_id}")
                 elif is_true_renewal and result and hasattr(result, 'data') and result.data and result.data.get('duplicate_prevented'):
                     logger.info(
                         f"[RENEWAL DEDUPE] ⛔ Duplicate renewal prevented for {account_id} period {period_start} "
@@ -1148,6 +1149,7 @@ class WebhookService:
                     await Cache.invalidate(f"credit_balance:{account_id}")
                     await Cache.invalidate(f"credit_summary:{account_id}")
                     await Cache.invalidate(f"subscription_tier:{account_id}")
+                    await Cache.invalidate(f"billing_entitlements:{account_id}")
             
             except Exception as e:
                 logger.error(f"Error handling subscription renewal: {e}")
@@ -244,7 +244,10 @@ async def list_toolkits(
         service = get_integration_service()
         
         if search:
-            result = await service.search_toolkits(search, category=category, limit=limit, cursor=cursor)
+            if cursor:
+                # Search returns every match in one ranked page
+                raise HTTPException(status_code=400, detail="cursor is not supported together with search")
+            result = await service.search_toolkits(search, category=category, limit=limit)
         else:
             result = await service.list_available_toolkits(limit, cursor=cursor, category=category)
         
@@ -258,6 +261,8 @@ async def list_toolkits(
             "has_more": result.get('next_cursor') is not None
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch toolkits: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch toolkits: {str(e)}")
@@ -152,8 +152,8 @@ class ComposioIntegrationService:
     async def list_available_toolkits(self, limit: int = 100, cursor: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
         return await self.toolkit_service.list_toolkits(limit=limit, cursor=cursor, category=category)
     
-    async def search_toolkits(self, query: str, category: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
-        return await self.toolkit_service.search_toolkits(query, category=category, limit=limit, cursor=cursor)
+    async def search_toolkits(self, query: str, category: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        return await self.toolkit_service.search_toolkits(query, category=category, limit=limit)
     
     async def get_integration_status(self, connected_account_id: str) -> Dict[str, Any]:
         return await self.connected_account_service.get_auth_status(connected_account_id)
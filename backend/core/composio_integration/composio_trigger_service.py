@@ -4,7 +4,7 @@ import httpx
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from core.utils.logger import logger
-from .toolkit_service import ToolkitService
+from .toolkit_catalog import toolkit_catalog
 
 
 class ComposioTriggerService:
@@ -95,17 +95,12 @@ class ComposioTriggerService:
                         toolkits_map[key] = {"slug": val.strip(), "name": val.strip().capitalize(), "logo": None}
                     break
 
-        # Fallback enrichment with ToolkitService only for missing logos
+        # Fallback enrichment from the toolkit catalog only for missing logos
         missing = [slug for slug, info in toolkits_map.items() if not info.get("logo")]
-        if missing:
-            toolkit_service = ToolkitService()
-            tk_resp = await toolkit_service.list_toolkits(limit=500)
-            tk_items = tk_resp.get("items", [])
-            tk_by_slug = {t.slug.lower(): t for t in tk_items if hasattr(t, 'slug')}
-            for slug in missing:
-                t = tk_by_slug.get(slug)
-                if t and t.logo:
-                    toolkits_map[slug]["logo"] = t.logo
+        for slug in missing:
+            t = await toolkit_catalog.get_toolkit(slug)
+            if t and t.logo:
+                toolkits_map[slug]["logo"] = t.logo
 
         # Prepare final list
         result_items = sorted(toolkits_map.values(), key=lambda x: x["slug"].lower())
@@ -172,11 +167,7 @@ class ComposioTriggerService:
                     params_all["cursor"] = next_cursor
 
         # Prepare toolkit info
-        toolkit_service = ToolkitService()
-        tk_resp = await toolkit_service.list_toolkits(limit=500)
-        tk_items = tk_resp.get("items", [])
-        tk_by_slug = {t.slug.lower(): t for t in tk_items if hasattr(t, 'slug')}
-        tk = tk_by_slug.get(toolkit_slug.lower())
+        tk = await toolkit_catalog.get_toolkit(toolkit_slug)
         tk_info = {"slug": toolkit_slug, "name": (tk.name if tk else toolkit_slug), "logo": (tk.logo if tk else None)}
 
         def match_toolkit(x: Dict[str, Any]) -> bool:
@@ -0,0 +1,139 @@
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+import pytest_asyncio
+
+from core.composio_integration import toolkit_catalog as catalog_module
+from core.composio_integration.client import ComposioClient
+from core.composio_integration.toolkit_catalog import CatalogSnapshot, ToolkitCatalog
+from core.composio_integration.toolkit_service import ToolkitService
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "toolkits_list.json"
+
+
+def _to_sdk_object(value):
+    """Mirror the SDK's response models, which expose their fields through __dict__."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _to_sdk_object(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_sdk_object(item) for item in value]
+    return value
+
+
+class FakeToolkitsResource:
+    def __init__(self, recorded):
+        self.recorded = recorded
+        self.calls = []
+
+    def list(self, **params):
+        self.calls.append(params)
+        response = dict(self.recorded)
+        category = params.get("category")
+        if category:
+            response["items"] = [
+                item for item in self.recorded["items"]
+                if any(cat["id"] == category for cat in item["meta"]["categories"])
+            ]
+        return _to_sdk_object(response)
+
+
+class TestToolkitCatalog:
+    """Toolkit lookups and search against a recorded toolkits.list() response."""
+
+    @pytest.fixture
+    def toolkits_resource(self, monkeypatch):
+        resource = FakeToolkitsResource(json.loads(FIXTURE_PATH.read_text()))
+        monkeypatch.setattr(ComposioClient, "_instance", SimpleNamespace(toolkits=resource))
+        return resource
+
+    @pytest.fixture
+    def redis(self, monkeypatch):
+        client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+        async def get_client():
+            return client
+
+        monkeypatch.setattr(catalog_module, "get_client", get_client)
+        return client
+
+    @pytest_asyncio.fixture
+    async def snapshot(self, toolkits_resource):
+        page = await ToolkitService().list_toolkits()
+        items = [toolkit.model_dump() for toolkit in page["items"]]
+        return CatalogSnapshot.build(items, etag="fixture", fetched_at=0.0)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_list_toolkits_reads_categories_from_sdk_objects(self, toolkits_resource):
+        page = await ToolkitService().list_toolkits()
+        by_slug = {toolkit.slug: toolkit for toolkit in page["items"]}
+
+        assert "openweather_api" not in by_slug
+        assert by_slug["gmail"].categories == ["communication", "productivity"]
+        assert by_slug["gmail"].tags == ["Communication", "Productivity"]
+        assert by_slug["gmail"].logo == "https://logos.composio.dev/api/gmail"
+        assert by_slug["gmail"].description.startswith("Gmail is Google's email service")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_slug_lookup(self, snapshot):
+        assert snapshot.get("github").name == "GitHub"
+        assert snapshot.get("GitHub").slug == "github"
+        assert snapshot.get("openweather_api") is None
+        assert snapshot.get("missing") is None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_ranked_prefix_search(self, snapshot):
+        slugs = [toolkit.slug for toolkit in snapshot.search("git")]
+
+        # Name prefixes first, then the description-only match
+        assert slugs[:2] == ["github", "gitlab"]
+        assert "linear" in slugs[2:]
+
+        slugs = [toolkit.slug for toolkit in snapshot.search("google cal")]
+        assert slugs == ["googlecalendar"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_substring_fallback(self, snapshot):
+        # No indexed token starts with these, so they match inside names and descriptions
+        assert [toolkit.slug for toolkit in snapshot.search("ithub")] == ["github"]
+        assert [toolkit.slug for toolkit in snapshot.search("spot")] == ["hubspot"]
+        assert snapshot.search("nothing matches this") == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_category_filter(self, snapshot):
+        assert [toolkit.slug for toolkit in snapshot.search("email", category="communication")] == ["gmail"]
+        assert [toolkit.slug for toolkit in snapshot.search("git", category="productivity")] == ["linear"]
+        assert snapshot.search("slack", category="crm") == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_search_toolkits_filters_category_locally(self, toolkits_resource, redis, monkeypatch):
+        catalog = ToolkitCatalog()
+        await catalog.warm()
+        monkeypatch.setattr(catalog_module, "toolkit_catalog", catalog)
+        upstream_calls = len(toolkits_resource.calls)
+
+        result = await ToolkitService().search_toolkits("google", category="productivity")
+
+        assert [toolkit.slug for toolkit in result["items"]] == ["googlecalendar", "googledrive", "gmail"]
+        assert result["next_cursor"] is None
+        assert len(toolkits_resource.calls) == upstream_calls
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_second_process_loads_from_redis(self, toolkits_resource, redis):
+        first = ToolkitCatalog()
+        assert (await first.get_toolkit("slack")).name == "Slack"
+        upstream_calls = len(toolkits_resource.calls)
+
+        second = ToolkitCatalog()
+        assert (await second.get_toolkit("notion")).name == "Notion"
+        assert [toolkit.slug for toolkit in await second.search("hub")] == ["hubspot"]
+        assert len(toolkits_resource.calls) == upstream_calls
@@ -0,0 +1,294 @@
+"""
+Local snapshot of the Composio toolkit catalog.
+
+Slug lookups, toolkit search and toolkit logos used to list every toolkit from
+the Composio API and scan the result on each request. The catalog is now
+fetched periodically and kept in two places:
+
+- Redis holds the serialized snapshot (CATALOG_SNAPSHOT_KEY) and a small meta
+  record (CATALOG_META_KEY) with the snapshot's etag and fetch time. The etag
+  is a hash of the catalog contents; the Composio SDK does not expose HTTP
+  ETags, so an upstream refresh that returns the same contents only bumps the
+  fetch time instead of rewriting the snapshot.
+- Each process keeps the parsed snapshot in memory with a slug -> toolkit dict
+  and an inverted index over name, slug, tag and description tokens.
+
+Requests are served from memory. Every CATALOG_CHECK_INTERVAL_SECONDS a request
+triggers a background sync that compares the Redis etag with the local one and
+reloads on change. When the snapshot is older than TOOLKIT_CATALOG_TTL_SECONDS,
+one process (holding CATALOG_REFRESH_LOCK_KEY) refetches it from Composio. Only
+a process that finds no snapshot anywhere fetches upstream on the request path.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.services.redis import get_client
+from core.utils.logger import logger
+from .toolkit_service import ToolkitInfo, ToolkitService
+
+CATALOG_SNAPSHOT_KEY = "composio:toolkit_catalog:v1"
+CATALOG_META_KEY = "composio:toolkit_catalog:v1:meta"
+CATALOG_REFRESH_LOCK_KEY = "composio:toolkit_catalog:v1:refresh_lock"
+CATALOG_REFRESH_LOCK_TTL_SECONDS = 120
+TOOLKIT_CATALOG_TTL_SECONDS = int(os.getenv("TOOLKIT_CATALOG_TTL_SECONDS", "3600"))
+CATALOG_CHECK_INTERVAL_SECONDS = 60
+# Kept well past the refresh TTL so a failing upstream leaves the last good snapshot in place
+CATALOG_REDIS_EXPIRY_SECONDS = 7 * 24 * 3600
+CATALOG_PAGE_SIZE = 500
+CATALOG_MAX_PAGES = 20
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Score of a query token matching a token in each field
+_FIELD_WEIGHTS = (("name", 3.0), ("slug", 3.0), ("tags", 2.0), ("description", 1.0))
+# A query token that is only a prefix of the indexed token scores less than an exact match
+_PREFIX_MATCH_FACTOR = 0.6
+
+
+def _tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _catalog_etag(items: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(items, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class CatalogSnapshot:
+    etag: str
+    fetched_at: float
+    toolkits: List[ToolkitInfo]
+    by_slug: Dict[str, ToolkitInfo] = field(default_factory=dict)
+    # token -> {toolkit position: best field weight}
+    postings: Dict[str, Dict[int, float]] = field(default_factory=dict)
+    # Sorted tokens, for prefix lookups with bisect
+    vocabulary: List[str] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, items: List[Dict[str, Any]], etag: str, fetched_at: float) -> "CatalogSnapshot":
+        toolkits = [ToolkitInfo(**item) for item in items]
+        snapshot = cls(etag=etag, fetched_at=fetched_at, toolkits=toolkits)
+        for position, toolkit in enumerate(toolkits):
+            snapshot.by_slug[toolkit.slug.lower()] = toolkit
+            fields = {
+                "name": _tokenize(toolkit.name),
+                "slug": _tokenize(toolkit.slug),
+                "tags": [token for tag in toolkit.tags for token in _tokenize(tag)],
+                "description": _tokenize(toolkit.description),
+            }
+            for field_name, weight in _FIELD_WEIGHTS:
+                for token in fields[field_name]:
+                    entries = snapshot.postings.setdefault(token, {})
+                    if entries.get(position, 0.0) < weight:
+                        entries[position] = weight
+        snapshot.vocabulary = sorted(snapshot.postings)
+        return snapshot
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "etag": self.etag,
+            "fetched_at": self.fetched_at,
+            "items": [toolkit.model_dump() for toolkit in self.toolkits],
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CatalogSnapshot":
+        data = json.loads(raw)
+        return cls.build(data["items"], data["etag"], data["fetched_at"])
+
+    def is_stale(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at >= ttl
+
+    def get(self, slug: str) -> Optional[ToolkitInfo]:
+        return self.by_slug.get(slug.lower())
+
+    def _token_scores(self, query_token: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        start = bisect_left(self.vocabulary, query_token)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(query_token):
+                break
+            factor = 1.0 if token == query_token else _PREFIX_MATCH_FACTOR
+            for position, weight in self.postings[token].items():
+                score = weight * factor
+                if scores.get(position, 0.0) < score:
+                    scores[position] = score
+        return scores
+
+    def search(self, query: str, category: Optional[str] = None) -> List[ToolkitInfo]:
+        """Toolkits matching every query token by prefix, best matches first.
+
+        Falls back to the substring match the API used before the index so
+        queries like "hub" still find "GitHub".
+        """
+        query_lower = query.strip().lower()
+        query_tokens = _tokenize(query_lower)
+
+        scores: Optional[Dict[int, float]] = None
+        for query_token in query_tokens:
+            token_scores = self._token_scores(query_token)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {position: scores[position] + score for position, score in token_scores.items() if position in scores}
+            if not scores:
+                break
+
+        if scores:
+            ranked: List[Tuple[float, ToolkitInfo]] = []
+            for position, score in scores.items():
+                toolkit = self.toolkits[position]
+                name_lower = toolkit.name.lower()
+                if name_lower == query_lower or toolkit.slug.lower() == query_lower:
+                    score += 5.0
+                elif name_lower.startswith(query_lower):
+                    score += 2.0
+                ranked.append((score, toolkit))
+            ranked.sort(key=lambda entry: (-entry[0], entry[1].name.lower()))
+            matches = [toolkit for _, toolkit in ranked]
+        else:
+            matches = [
+                toolkit for toolkit in self.toolkits
+                if query_lower in toolkit.name.lower()
+                or (toolkit.description and query_lower in toolkit.description.lower())
+                or any(query_lower in tag.lower() for tag in toolkit.tags)
+            ]
+
+        if category:
+            matches = [toolkit for toolkit in matches if category in toolkit.categories]
+        return matches
+
+
+class ToolkitCatalog:
+    def __init__(self, ttl: float = TOOLKIT_CATALOG_TTL_SECONDS, check_interval: float = CATALOG_CHECK_INTERVAL_SECONDS):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+
+    async def _current(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            # Cold process: callers wait for the first sync
+            await asyncio.shield(self._start_sync())
+            if self._snapshot is None:
+                raise RuntimeError("Composio toolkit catalog is unavailable")
+        elif time.monotonic() - self._checked_at >= self.check_interval:
+            self._start_sync()
+        return self._snapshot
+
+    def _start_sync(self) -> asyncio.Task:
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync())
+        return self._sync_task
+
+    async def _sync(self):
+        self._checked_at = time.monotonic()
+        redis = None
+        try:
+            redis = await get_client()
+            await self._load_from_redis(redis)
+        except Exception as e:
+            logger.warning(f"Failed to read toolkit catalog from Redis: {e}")
+
+        if self._snapshot is None or self._snapshot.is_stale(self.ttl):
+            try:
+                await self._refresh_from_upstream(redis)
+            except Exception as e:
+                logger.error(f"Failed to refresh toolkit catalog: {e}", exc_info=True)
+
+    async def _load_from_redis(self, redis):
+        raw_meta = await redis.get(CATALOG_META_KEY)
+        if not raw_meta:
+            return
+        meta = json.loads(raw_meta)
+        if self._snapshot is not None and self._snapshot.etag == meta["etag"]:
+            self._snapshot.fetched_at = meta["fetched_at"]
+            return
+        raw = await redis.get(CATALOG_SNAPSHOT_KEY)
+        if raw:
+            self._snapshot = CatalogSnapshot.from_json(raw)
+            logger.debug(f"Loaded toolkit catalog {self._snapshot.etag[:12]} with {len(self._snapshot.toolkits)} toolkits")
+
+    async def _fetch_items(self) -> List[Dict[str, Any]]:
+        toolkit_service = ToolkitService()
+        items: List[Dict[str, Any]] = []
+        cursor = None
+        for _ in range(CATALOG_MAX_PAGES):
+            page = await toolkit_service.list_toolkits(limit=CATALOG_PAGE_SIZE, cursor=cursor)
+            items.extend(toolkit.model_dump() for toolkit in page.get("items", []))
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+        return items
+
+    async def _refresh_from_upstream(self, redis):
+        if redis is not None:
+            acquired = await redis.set(CATALOG_REFRESH_LOCK_KEY, "1", nx=True, ex=CATALOG_REFRESH_LOCK_TTL_SECONDS)
+            # Another process is refreshing; unless we have nothing to serve, use its result on the next sync
+            if not acquired and self._snapshot is not None:
+                return
+
+        items = await self._fetch_items()
+        etag = _catalog_etag(items)
+        fetched_at = time.time()
+
+        if self._snapshot is not None and self._snapshot.etag == etag:
+            self._snapshot.fetched_at = fetched_at
+            changed = False
+        else:
+            self._snapshot = CatalogSnapshot.build(items, etag, fetched_at)
+            changed = True
+        logger.debug(f"Fetched toolkit catalog {etag[:12]} with {len(items)} toolkits (changed: {changed})")
+
+        if redis is None:
+            return
+        try:
+            meta = json.dumps({"etag": etag, "fetched_at": fetched_at})
+            async with redis.pipeline(transaction=True) as pipe:
+                if changed:
+                    pipe.set(CATALOG_SNAPSHOT_KEY, self._snapshot.to_json(), ex=CATALOG_REDIS_EXPIRY_SECONDS)
+                else:
+                    pipe.expire(CATALOG_SNAPSHOT_KEY, CATALOG_REDIS_EXPIRY_SECONDS)
+                pipe.set(CATALOG_META_KEY, meta, ex=CATALOG_REDIS_EXPIRY_SECONDS)
+                pipe.delete(CATALOG_REFRESH_LOCK_KEY)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to store toolkit catalog in Redis: {e}")
+
+    async def warm(self):
+        """Load the catalog ahead of the first request."""
+        try:
+            await self._current()
+        except Exception as e:
+            logger.warning(f"Toolkit catalog warm-up failed, it will load on first use: {e}")
+
+    async def get_toolkit(self, slug: str) -> Optional[ToolkitInfo]:
+        return (await self._current()).get(slug)
+
+    async def get_logo(self, slug: str) -> Optional[str]:
+        toolkit = await self.get_toolkit(slug)
+        return toolkit.logo if toolkit else None
+
+    async def search(self, query: str, category: Optional[str] = None) -> List[ToolkitInfo]:
+        return (await self._current()).search(query, category=category)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "etag": snapshot.etag[:12] if snapshot else None,
+            "toolkits": len(snapshot.toolkits) if snapshot else 0,
+            "tokens": len(snapshot.vocabulary) if snapshot else 0,
+            "age_seconds": round(time.time() - snapshot.fetched_at, 1) if snapshot else None,
+        }
+
+
+toolkit_catalog = ToolkitCatalog()
@@ -142,37 +142,33 @@ class ToolkitService:
                 if "OAUTH2" not in auth_schemes or "OAUTH2" not in composio_managed_auth_schemes:
                     continue
                 
-                logo_url = None
-                meta = toolkit_data.get("meta", {})
-                if isinstance(meta, dict):
-                    logo_url = meta.get("logo")
-                elif hasattr(meta, '__dict__'):
-                    logo_url = meta.__dict__.get("logo")
+                meta = toolkit_data.get("meta") or {}
+                if not isinstance(meta, dict) and hasattr(meta, '__dict__'):
+                    meta = meta.__dict__
+                if not isinstance(meta, dict):
+                    meta = {}
+                
+                logo_url = meta.get("logo")
                 
                 if not logo_url:
                     logo_url = toolkit_data.get("logo")
                 
                 tags = []
                 categories = []
-                if isinstance(meta, dict) and "categories" in meta:
-                    category_list = meta.get("categories", [])
-                    for cat in category_list:
-                        if isinstance(cat, dict):
-                            cat_name = cat.get("name", "")
-                            cat_id = cat.get("id", "")
-                            tags.append(cat_name)
-                            categories.append(cat_id)
-                        elif hasattr(cat, '__dict__'):
-                            cat_name = cat.__dict__.get("name", "")
-                            cat_id = cat.__dict__.get("id", "")
-                            tags.append(cat_name)
-                            categories.append(cat_id)
+                category_list = meta.get("categories") or []
+                for cat in category_list:
+                    if isinstance(cat, dict):
+                        cat_name = cat.get("name", "")
+                        cat_id = cat.get("id", "")
+                        tags.append(cat_name)
+                        categories.append(cat_id)
+                    elif hasattr(cat, '__dict__'):
+                        cat_name = cat.__dict__.get("name", "")
+                        cat_id = cat.__dict__.get("id", "")
+                        tags.append(cat_name)
+                        categories.append(cat_id)
                 
-                description = None
-                if isinstance(meta, dict):
-                    description = meta.get("description")
-                elif hasattr(meta, '__dict__'):
-                    description = meta.__dict__.get("description")
+                description = meta.get("description")
                 
                 if not description:
                     description = toolkit_data.get("description")
@@ -205,28 +201,17 @@ class ToolkitService:
     
     async def get_toolkit_by_slug(self, slug: str) -> Optional[ToolkitInfo]:
         try:
-            toolkits_response = await self.list_toolkits()
-            toolkits = toolkits_response.get("items", [])
-            for toolkit in toolkits:
-                if toolkit.slug == slug:
-                    return toolkit
-            return None
+            from .toolkit_catalog import toolkit_catalog
+            return await toolkit_catalog.get_toolkit(slug)
         except Exception as e:
             logger.error(f"Failed to get toolkit {slug}: {e}", exc_info=True)
             raise
     
-    async def search_toolkits(self, query: str, category: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+    async def search_toolkits(self, query: str, category: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """Search the local toolkit catalog; results are ranked and not paginated."""
         try:
-            all_toolkits_response = await self.list_toolkits(limit=500, cursor=cursor, category=category)
-            toolkits = all_toolkits_response.get("items", [])
-            query_lower = query.lower()
-            
-            filtered_toolkits = [
-                toolkit for toolkit in toolkits
-                if query_lower in toolkit.name.lower() 
-                or (toolkit.description and query_lower in toolkit.description.lower())
-                or any(query_lower in tag.lower() for tag in toolkit.tags)
-            ]
+            from .toolkit_catalog import toolkit_catalog
+            filtered_toolkits = await toolkit_catalog.search(query, category=category)
             
             limited_results = filtered_toolkits[:limit]
             
@@ -246,6 +231,15 @@ class ToolkitService:
             raise
     
     async def get_toolkit_icon(self, toolkit_slug: str) -> Optional[str]:
+        try:
+            from .toolkit_catalog import toolkit_catalog
+            logo = await toolkit_catalog.get_logo(toolkit_slug)
+            if logo:
+                return logo
+        except Exception as e:
+            logger.warning(f"Toolkit catalog unavailable for icon of {toolkit_slug}: {e}")
+        
+        # Toolkits outside the catalog (it only holds Composio-managed OAuth toolkits)
         try:
             # logger.debug(f"Fetching toolkit icon for: {toolkit_slug}")
             toolkit_response = self.client.toolkits.retrieve(toolkit_slug)
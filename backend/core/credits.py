@@ -23,10 +23,17 @@ class CreditService:
         cache_key = f"credit_balance:{user_id}"
         
         if use_cache and self.cache:
-            cached = await self.cache.get(cache_key)
-            if cached:
-                return Decimal(cached)
+            # Concurrent misses share one DB read (and one account creation for new users)
+            cached = await self.cache.get_or_load(cache_key, lambda: self._load_balance(user_id), ttl=300)
+            return Decimal(cached)
         
+        balance = await self._load_balance(user_id)
+        if self.cache:
+            await self.cache.set(cache_key, balance, ttl=300)
+        
+        return Decimal(balance)
+    
+    async def _load_balance(self, user_id: str) -> str:
         try:
             client = await self._get_client()
             result = await client.from_('credit_accounts').select('balance').eq('account_id', user_id).execute()
@@ -114,10 +121,7 @@ class CreditService:
                     
                     balance = Decimal('0')
         
-        if self.cache:
-            await self.cache.set(cache_key, str(balance), ttl=300)
-        
-        return balance
+        return str(balance)
     
     async def deduct_credits(self, user_id: str, amount: Decimal, description: str = None, reference_id: str = None, reference_type: str = None) -> Dict:
         try:
@@ -132,6 +136,7 @@ class CreditService:
             
             if self.cache:
                 await self.cache.invalidate(f"credit_balance:{user_id}")
+                await self.cache.invalidate(f"billing_entitlements:{user_id}")
             
             if result.data and len(result.data) > 0:
                 row = result.data[0]
@@ -186,6 +191,7 @@ class CreditService:
                 
                 if self.cache:
                     await self.cache.invalidate(f"credit_balance:{user_id}")
+                    await self.cache.invalidate(f"billing_entitlements:{user_id}")
                 
                 logger.info(f"Added {amount} credits to user {user_id}. New balance: {new_balance}")
                 return new_balance
@@ -226,6 +232,7 @@ class CreditService:
             
             if self.cache:
                 await self.cache.invalidate(f"credit_balance:{user_id}")
+                await self.cache.invalidate(f"billing_entitlements:{user_id}")
             
             logger.info(f"Granted {amount} {tier_name} credits to user {user_id}")
             return bool(result.data)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, Iterable
+
+from core.services import redis
+from core.utils.logger import logger
+
+# Compiled prefixes kept in process memory
+MEMORY_CACHE_SIZE = 256
+# Compiled prefixes are content-addressed, so the Redis TTL only bounds storage
+REDIS_CACHE_TTL = 3600 * 24
+REDIS_KEY_PREFIX = "system_prompt:compiled:"
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class CompiledPromptCache:
+    """Cache of compiled system-prompt prefixes.
+
+    The prefix is everything in the system prompt that only depends on the
+    agent version and its tools: the base or agent prompt, the builder prompt,
+    the MCP tool list and the XML tool schemas. Volatile parts (knowledge base
+    context, current date) are appended by the caller, so a cached prefix is
+    byte-identical across runs and stays cacheable by the LLM provider.
+
+    Entries live in a process-local LRU backed by Redis, keyed by a hash of
+    (agent_id, version_id, prompt text, sorted tool/method set, MCP schema hash).
+    Tool schemas come from decorators, so their fingerprints are computed once
+    per tool class and method; MCP schemas are dynamic and hashed on every lookup.
+    """
+
+    def __init__(self, max_size: int = MEMORY_CACHE_SIZE, ttl: int = REDIS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._schema_digests: Dict[Tuple[type, str], str] = {}
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.total_build_ms = 0.0
+        self.builds = 0
+
+    @staticmethod
+    def text_digest(text: str) -> str:
+        return _digest(text)
+
+    def tool_fingerprint(self, tools: Dict[str, Dict[str, Any]], dynamic_types: Iterable[type] = ()) -> str:
+        """Fingerprint the sorted tool/method set of a registry.
+
+        Schemas of instances of dynamic_types (MCP wrappers) are left out; they
+        are covered by the MCP schema hash.
+        """
+        dynamic_types = tuple(dynamic_types)
+        parts = []
+        for name in sorted(tools):
+            instance = tools[name]['instance']
+            if dynamic_types and isinstance(instance, dynamic_types):
+                parts.append(f"{name}:mcp")
+                continue
+            key = (type(instance), name)
+            schema_digest = self._schema_digests.get(key)
+            if schema_digest is None:
+                schema_digest = _digest(json.dumps(tools[name]['schema'].schema, sort_keys=True, default=str))
+                self._schema_digests[key] = schema_digest
+            parts.append(f"{name}:{schema_digest}")
+        return _digest("\n".join(parts))
+
+    @staticmethod
+    def schema_hash(schemas: Any) -> str:
+        return _digest(json.dumps(schemas, sort_keys=True, default=str))
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        return _digest(json.dumps(parts, sort_keys=True, default=str))
+
+    def _remember(self, key: str, prefix: str):
+        self._entries[key] = prefix
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """Look up a compiled prefix. Returns (prefix, source) where source is 'memory' or 'redis'."""
+        prefix = self._entries.get(key)
+        if prefix is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return prefix, "memory"
+
+        try:
+            prefix = await redis.get(f"{REDIS_KEY_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"Failed to read compiled system prompt from Redis: {e}")
+            prefix = None
+
+        if prefix is not None:
+            self._remember(key, prefix)
+            self.redis_hits += 1
+            return prefix, "redis"
+
+        self.misses += 1
+        return None, None
+
+    async def put(self, key: str, prefix: str, build_ms: float):
+        self.builds += 1
+        self.total_build_ms += build_ms
+        self._remember(key, prefix)
+        try:
+            await redis.set(f"{REDIS_KEY_PREFIX}{key}", prefix, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to store compiled system prompt in Redis: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        hits = self.memory_hits + self.redis_hits
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "mean_build_ms": round(self.total_build_ms / self.builds, 2) if self.builds else 0.0,
+        }
+
+
+compiled_prompt_cache = CompiledPromptCache()
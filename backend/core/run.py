@@ -2,6 +2,7 @@ import os
 import json
 import asyncio
 import datetime
+import time
 from typing import Optional, Dict, List, Any, AsyncGenerator
 from dataclasses import dataclass
 
@@ -21,10 +22,12 @@ from core.tools.sb_kb_tool import SandboxKbTool
 from core.tools.data_providers_tool import DataProvidersTool
 from core.tools.expand_msg_tool import ExpandMessageTool
 from core.prompts.prompt import get_system_prompt
+from core.prompts.prompt_cache import compiled_prompt_cache
 
 from core.utils.logger import logger
+from core.utils.phase_timer import PhaseTimer
 
-from core.billing.billing_integration import billing_integration
+from core.billing.billing_integration import billing_integration, RunCreditEstimate
 from core.tools.sb_vision_tool import SandboxVisionTool
 from core.tools.sb_image_edit_tool import SandboxImageEditTool
 from core.tools.sb_designer_tool import SandboxDesignerTool
@@ -263,7 +266,8 @@ class MCPManager:
         self.thread_manager = thread_manager
         self.account_id = account_id
     
-    async def register_mcp_tools(self, agent_config: dict) -> Optional[MCPToolWrapper]:
+    async def connect_mcp_tools(self, agent_config: dict) -> Optional[MCPToolWrapper]:
+        """Connect to the agent's MCP servers without touching the tool registry."""
         all_mcps = []
         
         if agent_config.get('configured_mcps'):
@@ -307,21 +311,28 @@ class MCPManager:
         mcp_wrapper_instance = MCPToolWrapper(mcp_configs=all_mcps)
         try:
             await mcp_wrapper_instance.initialize_and_register_tools()
-            
-            updated_schemas = mcp_wrapper_instance.get_schemas()
-            for method_name, schema_list in updated_schemas.items():
-                for schema in schema_list:
-                    self.thread_manager.tool_registry.tools[method_name] = {
-                        "instance": mcp_wrapper_instance,
-                        "schema": schema
-                    }
-            
-            logger.info(f"⚡ Registered {len(updated_schemas)} MCP tools (Redis cache enabled)")
             return mcp_wrapper_instance
         except Exception as e:
             logger.error(f"Failed to initialize MCP tools: {e}")
             return None
 
+    def add_mcp_tools_to_registry(self, mcp_wrapper_instance: MCPToolWrapper):
+        updated_schemas = mcp_wrapper_instance.get_schemas()
+        for method_name, schema_list in updated_schemas.items():
+            for schema in schema_list:
+                self.thread_manager.tool_registry.tools[method_name] = {
+                    "instance": mcp_wrapper_instance,
+                    "schema": schema
+                }
+        
+        logger.info(f"⚡ Registered {len(updated_schemas)} MCP tools (Redis cache enabled)")
+
+    async def register_mcp_tools(self, agent_config: dict) -> Optional[MCPToolWrapper]:
+        mcp_wrapper_instance = await self.connect_mcp_tools(agent_config)
+        if mcp_wrapper_instance:
+            self.add_mcp_tools_to_registry(mcp_wrapper_instance)
+        return mcp_wrapper_instance
+
 
 class PromptManager:
     @staticmethod
@@ -330,70 +341,107 @@ class PromptManager:
                                   mcp_wrapper_instance: Optional[MCPToolWrapper],
                                   client=None,
                                   tool_registry=None,
-                                  xml_tool_calling: bool = True) -> dict:
-        
-        default_system_content = get_system_prompt()
-        
-        # if "anthropic" not in model_name.lower():
-        #     sample_response_path = os.path.join(os.path.dirname(__file__), 'prompts/samples/1.txt')
-        #     with open(sample_response_path, 'r') as file:
-        #         sample_response = file.read()
-        #     default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
-        
+                                  xml_tool_calling: bool = True,
+                                  knowledge_base_section: Optional[str] = None) -> dict:
+        """Build the system message as a cached, compiled prefix plus a volatile suffix.
+
+        The prefix (agent prompt, builder prompt, MCP tool list, XML tool schemas)
+        is looked up in compiled_prompt_cache by agent version and tool set, so it
+        is byte-identical across runs. The knowledge base context and the date
+        block change independently of the agent version and are appended after it.
+        Pass knowledge_base_section if it was already fetched by get_knowledge_base_section.
+        """
+        build_start = time.monotonic()
+
         # Start with agent's normal system prompt or default
         if agent_config and agent_config.get('system_prompt'):
-            system_content = agent_config['system_prompt'].strip()
+            base_content = agent_config['system_prompt'].strip()
         else:
-            system_content = default_system_content
-        
+            base_content = get_system_prompt()
+
         # Check if agent has builder tools enabled - append the full builder prompt
+        has_builder_tools = False
         if agent_config:
             agentpress_tools = agent_config.get('agentpress_tools', {})
             has_builder_tools = any(
                 agentpress_tools.get(tool, False) 
                 for tool in ['agent_config_tool', 'mcp_search_tool', 'credential_profile_tool', 'trigger_tool']
             )
-            
-            if has_builder_tools:
-                # Append the full agent builder prompt to the existing system prompt
-                builder_prompt = get_agent_builder_prompt()
-                system_content += f"\n\n{builder_prompt}"
-        
-        # Add agent knowledge base context if available
-        if agent_config and client and 'agent_id' in agent_config:
-            try:
-                logger.debug(f"Retrieving agent knowledge base context for agent {agent_config['agent_id']}")
-                
-                # Use only agent-based knowledge base context
-                kb_result = await client.rpc('get_agent_knowledge_base_context', {
-                    'p_agent_id': agent_config['agent_id']
-                }).execute()
-                
-                if kb_result.data and kb_result.data.strip():
-                    logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_result.data)} chars)")
-                    # logger.debug(f"Knowledge base data object: {kb_result.data[:500]}..." if len(kb_result.data) > 500 else f"Knowledge base data object: {kb_result.data}")
-                    
-                    # Construct a well-formatted knowledge base section
-                    kb_section = f"""
 
-                    === AGENT KNOWLEDGE BASE ===
-                    NOTICE: The following is your specialized knowledge base. This information should be considered authoritative for your responses and should take precedence over general knowledge when relevant.
+        include_mcp_info = bool(
+            agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps'))
+            and mcp_wrapper_instance and mcp_wrapper_instance._initialized
+        )
+        include_tool_schemas = bool(xml_tool_calling and tool_registry)
 
-                    {kb_result.data}
+        cache_key = None
+        try:
+            mcp_schema_hash = None
+            if mcp_wrapper_instance:
+                mcp_schema_hash = compiled_prompt_cache.schema_hash(
+                    PromptManager._openapi_schemas(mcp_wrapper_instance.get_schemas())
+                )
+            cache_key = compiled_prompt_cache.make_key(
+                agent_id=agent_config.get('agent_id') if agent_config else None,
+                version_id=agent_config.get('current_version_id') if agent_config else None,
+                base_prompt=compiled_prompt_cache.text_digest(base_content),
+                builder_tools=has_builder_tools,
+                mcp_info=include_mcp_info,
+                tools=compiled_prompt_cache.tool_fingerprint(tool_registry.tools, (MCPToolWrapper,)) if include_tool_schemas else None,
+                mcp_schemas=mcp_schema_hash,
+            )
+        except Exception as e:
+            logger.warning(f"Could not compute system prompt cache key, compiling without cache: {e}")
 
-                    === END AGENT KNOWLEDGE BASE ===
+        prefix, cache_source = (None, None)
+        if cache_key:
+            prefix, cache_source = await compiled_prompt_cache.get(cache_key)
 
-                    IMPORTANT: Always reference and utilize the knowledge base information above when it's relevant to user queries. This knowledge is specific to your role and capabilities."""
-                    
-                    system_content += kb_section
-                else:
-                    logger.debug("No knowledge base context found for this agent")
-                    
-            except Exception as e:
-                logger.error(f"Error retrieving knowledge base context for agent {agent_config.get('agent_id', 'unknown')}: {e}")
-                # Continue without knowledge base context rather than failing
-        
-        if agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps')) and mcp_wrapper_instance and mcp_wrapper_instance._initialized:
+        if prefix is None:
+            compile_start = time.monotonic()
+            prefix = PromptManager._compile_prefix(
+                base_content, has_builder_tools,
+                mcp_wrapper_instance if include_mcp_info else None,
+                tool_registry if include_tool_schemas else None
+            )
+            if cache_key:
+                await compiled_prompt_cache.put(cache_key, prefix, (time.monotonic() - compile_start) * 1000)
+
+        system_content = prefix
+        if knowledge_base_section is None:
+            knowledge_base_section = await PromptManager.get_knowledge_base_section(agent_config, client)
+        system_content += knowledge_base_section
+        system_content += PromptManager._datetime_section()
+
+        build_ms = (time.monotonic() - build_start) * 1000
+        cache_stats = compiled_prompt_cache.stats()
+        logger.info(
+            f"📝 System prompt built in {build_ms:.1f}ms "
+            f"(prefix: {cache_source or 'compiled'}, {len(prefix)} chars; "
+            f"cache hit rate: {cache_stats['hit_rate']:.0%}, mean compile: {cache_stats['mean_build_ms']}ms)"
+        )
+
+        system_message = {"role": "system", "content": system_content}
+        return system_message
+
+    @staticmethod
+    def _openapi_schemas(registered_schemas: Dict[str, list]) -> Dict[str, List[dict]]:
+        return {
+            method_name: [schema.schema for schema in schema_list if schema.schema_type == SchemaType.OPENAPI]
+            for method_name, schema_list in registered_schemas.items()
+        }
+
+    @staticmethod
+    def _compile_prefix(system_content: str, has_builder_tools: bool,
+                        mcp_wrapper_instance: Optional[MCPToolWrapper],
+                        tool_registry=None) -> str:
+        """Compile the stable part of the system prompt."""
+        if has_builder_tools:
+            # Append the full agent builder prompt to the existing system prompt
+            builder_prompt = get_agent_builder_prompt()
+            system_content += f"\n\n{builder_prompt}"
+
+        if mcp_wrapper_instance:
             mcp_info = "\n\n--- MCP Tools Available ---\n"
             mcp_info += "You have access to external MCP (Model Context Protocol) server tools.\n"
             mcp_info += "MCP tools can be called directly using their native function names in the standard function calling format:\n"
@@ -437,9 +485,9 @@ class PromptManager:
             mcp_info += "NEVER supplement MCP results with your training data or make assumptions beyond what the tools provide.\n"
             
             system_content += mcp_info
-        
+
         # Add XML tool calling instructions to system prompt if requested
-        if xml_tool_calling and tool_registry:
+        if tool_registry:
             openapi_schemas = tool_registry.get_openapi_schemas()
             
             if openapi_schemas:
@@ -477,6 +525,48 @@ When using the tools:
                 system_content += examples_content
                 logger.debug("Appended XML tool examples to system prompt")
 
+        return system_content
+
+    @staticmethod
+    async def get_knowledge_base_section(agent_config: Optional[dict], client=None) -> str:
+        # Add agent knowledge base context if available
+        if not (agent_config and client and 'agent_id' in agent_config):
+            return ""
+
+        try:
+            logger.debug(f"Retrieving agent knowledge base context for agent {agent_config['agent_id']}")
+            
+            # Use only agent-based knowledge base context
+            kb_result = await client.rpc('get_agent_knowledge_base_context', {
+                'p_agent_id': agent_config['agent_id']
+            }).execute()
+            
+            if kb_result.data and kb_result.data.strip():
+                logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_result.data)} chars)")
+                
+                # Construct a well-formatted knowledge base section
+                kb_section = f"""
+
+                === AGENT KNOWLEDGE BASE ===
+                NOTICE: The following is your specialized knowledge base. This information should be considered authoritative for your responses and should take precedence over general knowledge when relevant.
+
+                {kb_result.data}
+
+                === END AGENT KNOWLEDGE BASE ===
+
+                IMPORTANT: Always reference and utilize the knowledge base information above when it's relevant to user queries. This knowledge is specific to your role and capabilities."""
+                
+                return kb_section
+
+            logger.debug("No knowledge base context found for this agent")
+                
+        except Exception as e:
+            logger.error(f"Error retrieving knowledge base context for agent {agent_config.get('agent_id', 'unknown')}: {e}")
+            # Continue without knowledge base context rather than failing
+        return ""
+
+    @staticmethod
+    def _datetime_section() -> str:
         now = datetime.datetime.now(datetime.timezone.utc)
         datetime_info = f"\n\n=== CURRENT DATE/TIME INFORMATION ===\n"
         datetime_info += f"Today's date: {now.strftime('%A, %B %d, %Y')}\n"
@@ -485,10 +575,7 @@ When using the tools:
         datetime_info += f"Current day: {now.strftime('%A')}\n"
         datetime_info += "Use this information for any time-sensitive tasks, research, or when current date/time context is needed.\n"
         
-        system_content += datetime_info
-
-        system_message = {"role": "system", "content": system_content}
-        return system_message
+        return datetime_info
 
 
 
@@ -500,14 +587,26 @@ class AgentRunner:
         if not self.config.trace:
             self.config.trace = langfuse.trace(name="run_agent", session_id=self.config.thread_id, metadata={"project_id": self.config.project_id})
         
+        self.phase_timer = PhaseTimer()
         self.thread_manager = ThreadManager(
             trace=self.config.trace, 
             agent_config=self.config.agent_config
         )
         
         self.client = await self.thread_manager.db.client
-        
-        response = await self.client.table('threads').select('account_id').eq('thread_id', self.config.thread_id).execute()
+
+        # MCP connections and the knowledge base context don't depend on the
+        # lookups below; start them now and collect them after tool registration
+        self._mcp_task = asyncio.create_task(self._connect_mcp_tools())
+        self._kb_task = asyncio.create_task(self._fetch_knowledge_base_section())
+
+        thread_query = self.client.table('threads').select('account_id').eq('thread_id', self.config.thread_id).execute()
+        project_query = self.client.table('projects').select('sandbox').eq('project_id', self.config.project_id).execute()
+        latest_user_message_query = self.client.table('messages').select('content').eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
+        latest_message_query = self.client.table('messages').select('type').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+        response, project, latest_user_message, latest_message = await asyncio.gather(
+            thread_query, project_query, latest_user_message_query, latest_message_query
+        )
         
         if not response.data or len(response.data) == 0:
             raise ValueError(f"Thread {self.config.thread_id} not found")
@@ -517,15 +616,33 @@ class AgentRunner:
         if not self.account_id:
             raise ValueError(f"Thread {self.config.thread_id} has no associated account")
 
-        project = await self.client.table('projects').select('*').eq('project_id', self.config.project_id).execute()
+        # Iterations check credits against this estimate; billing keeps it current
+        self.credit_estimate = RunCreditEstimate(account_id=self.account_id)
+        self.thread_manager.credit_estimate = self.credit_estimate
+
         if not project.data or len(project.data) == 0:
             raise ValueError(f"Project {self.config.project_id} not found")
 
         project_data = project.data[0]
-        sandbox_info = project_data.get('sandbox', {})
+        sandbox_info = project_data.get('sandbox') or {}
         if not sandbox_info.get('id'):
             logger.debug(f"No sandbox found for project {self.config.project_id}; will create lazily when needed")
-    
+
+        self.latest_user_message_content = None
+        if latest_user_message.data and len(latest_user_message.data) > 0:
+            data = latest_user_message.data[0]['content']
+            if isinstance(data, str):
+                data = json.loads(data)
+            if self.config.trace:
+                self.config.trace.update(input=data['content'])
+            # Extract content for fast path optimization
+            self.latest_user_message_content = data.get('content') if isinstance(data, dict) else str(data)
+
+        # Used by the first iteration instead of querying the latest message again
+        self.latest_message_type = latest_message.data[0].get('type') if latest_message.data else None
+
+        self.phase_timer.mark("bootstrap_reads")
+
     async def setup_tools(self):
         tool_manager = ToolManager(self.thread_manager, self.config.project_id, self.config.thread_id, self.config.agent_config)
         
@@ -626,45 +743,90 @@ class AgentRunner:
         logger.debug(f"Disabled tools from config: {disabled_tools}")
         return disabled_tools
     
-    async def setup_mcp_tools(self) -> Optional[MCPToolWrapper]:
+    async def _connect_mcp_tools(self) -> Optional[MCPToolWrapper]:
         if not self.config.agent_config:
             return None
         
-        mcp_manager = MCPManager(self.thread_manager, self.account_id)
-        return await mcp_manager.register_mcp_tools(self.config.agent_config)
-    
-    async def run(self) -> AsyncGenerator[Dict[str, Any], None]:
-        await self.setup()
-        await self.setup_tools()
-        mcp_wrapper_instance = await self.setup_mcp_tools()
-        
+        started_at = time.monotonic()
+        try:
+            mcp_manager = MCPManager(self.thread_manager, self.config.agent_config.get('account_id'))
+            return await mcp_manager.connect_mcp_tools(self.config.agent_config)
+        finally:
+            self.phase_timer.record("mcp_connect_background", (time.monotonic() - started_at) * 1000)
+
+    async def _fetch_knowledge_base_section(self) -> str:
+        started_at = time.monotonic()
+        try:
+            return await PromptManager.get_knowledge_base_section(self.config.agent_config, self.client)
+        finally:
+            self.phase_timer.record("knowledge_base_background", (time.monotonic() - started_at) * 1000)
+
+    async def setup_mcp_tools(self) -> Optional[MCPToolWrapper]:
+        # MCP tools go after the built-in tools so the tool order, and with it
+        # the compiled system prompt, doesn't depend on connection timing
+        mcp_wrapper_instance = await self._mcp_task
+        if mcp_wrapper_instance:
+            MCPManager(self.thread_manager, self.account_id).add_mcp_tools_to_registry(mcp_wrapper_instance)
+        return mcp_wrapper_instance
+
+    async def bootstrap(self) -> dict:
+        """Prepare the run and return its system message.
+
+        The thread, project and latest-message reads run concurrently, while
+        MCP connections and knowledge base retrieval proceed in the background
+        during tool registration.
+        """
+        try:
+            await self.setup()
+            await self.setup_tools()
+            self.phase_timer.mark("tool_registration")
+            mcp_wrapper_instance = await self.setup_mcp_tools()
+            self.phase_timer.mark("mcp_wait")
+            knowledge_base_section = await self._kb_task
+            self.phase_timer.mark("knowledge_base_wait")
+        except BaseException:
+            for task in (getattr(self, '_mcp_task', None), getattr(self, '_kb_task', None)):
+                if task and not task.done():
+                    task.cancel()
+            raise
+
         system_message = await PromptManager.build_system_prompt(
             self.config.model_name, self.config.agent_config, 
             self.config.thread_id, 
             mcp_wrapper_instance, self.client,
             tool_registry=self.thread_manager.tool_registry,
-            xml_tool_calling=True
+            xml_tool_calling=True,
+            knowledge_base_section=knowledge_base_section
         )
-        logger.info(f"📝 System message built once: {len(str(system_message.get('content', '')))} chars")
+        self.phase_timer.mark("system_prompt")
+        return system_message
+    
+    def _report_time_to_first_token(self):
+        self.phase_timer.mark("first_token")
+        self.thread_manager.phase_timer = None
+        logger.info(f"⏱️ Time to first token {self.phase_timer.elapsed_ms():.0f}ms for thread {self.config.thread_id}: {self.phase_timer.summary()}")
+
+    async def run(self) -> AsyncGenerator[Dict[str, Any], None]:
+        system_message = await self.bootstrap()
         logger.debug(f"model_name received: {self.config.model_name}")
         iteration_count = 0
         continue_execution = True
-
-        latest_user_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
-        latest_user_message_content = None
-        if latest_user_message.data and len(latest_user_message.data) > 0:
-            data = latest_user_message.data[0]['content']
-            if isinstance(data, str):
-                data = json.loads(data)
-            if self.config.trace:
-                self.config.trace.update(input=data['content'])
-            # Extract content for fast path optimization
-            latest_user_message_content = data.get('content') if isinstance(data, dict) else str(data)
+        latest_user_message_content = self.latest_user_message_content
 
         while continue_execution and iteration_count < self.config.max_iterations:
             iteration_count += 1
 
-            can_run, message, reservation_id = await billing_integration.check_and_reserve_credits(self.account_id)
+            if iteration_count == 1:
+                # The latest message was read during bootstrap
+                can_run, message, reservation_id = await billing_integration.check_run_credits(self.credit_estimate)
+                message_type = self.latest_message_type
+            else:
+                (can_run, message, reservation_id), latest_message = await asyncio.gather(
+                    billing_integration.check_run_credits(self.credit_estimate),
+                    self.client.table('messages').select('type').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+                )
+                message_type = latest_message.data[0].get('type') if latest_message.data else None
+
             if not can_run:
                 error_msg = f"Insufficient credits: {message}"
                 yield {
@@ -674,12 +836,13 @@ class AgentRunner:
                 }
                 break
 
-            latest_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
-            if latest_message.data and len(latest_message.data) > 0:
-                message_type = latest_message.data[0].get('type')
-                if message_type == 'assistant':
-                    continue_execution = False
-                    break
+            if message_type == 'assistant':
+                continue_execution = False
+                break
+
+            if iteration_count == 1:
+                self.phase_timer.mark("run_checks")
+                self.thread_manager.phase_timer = self.phase_timer
 
             temporary_message = None
             # Don't set max_tokens by default - let LiteLLM and providers handle their own defaults
@@ -718,6 +881,9 @@ class AgentRunner:
                 try:
                     if hasattr(response, '__aiter__') and not isinstance(response, dict):
                         async for chunk in response:
+                            if self.thread_manager.phase_timer and isinstance(chunk, dict) and chunk.get('type') == 'assistant':
+                                self._report_time_to_first_token()
+
                             # Check for error status from thread_manager
                             if isinstance(chunk, dict) and chunk.get('type') == 'status' and chunk.get('status') == 'error':
                                 logger.error(f"Error in thread execution: {chunk.get('message', 'Unknown error')}")
@@ -813,6 +979,9 @@ class AgentRunner:
                 yield processed_error.to_stream_dict()
                 break
             
+            # Only the first LLM call of the run is broken down
+            self.thread_manager.phase_timer = None
+
             if generation:
                 generation.end()
 
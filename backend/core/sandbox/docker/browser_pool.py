@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Shared headless Chromium for the HTML conversion routers.
+
+Launching Chromium dominates the time to convert a short deck, and concurrent
+exports that each launch their own browser can exhaust sandbox memory. The
+pool keeps one browser alive for the lifetime of the server:
+
+- Pages are opened in a shared browser context. A context is recycled after
+  it has served BROWSER_CONTEXT_MAX_RENDERS pages so leaked renderer memory
+  is released.
+- At most BROWSER_MAX_PAGES pages are open at once across all requests, and a
+  single request renders at most BROWSER_PAGES_PER_REQUEST slides at a time.
+  By default a request may use every page, so a lone short deck renders in one
+  round; concurrent requests still share the global limit.
+- If the browser crashes or disconnects, it is relaunched on the next render.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+
+
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "8"))
+BROWSER_PAGES_PER_REQUEST = int(os.getenv("BROWSER_PAGES_PER_REQUEST", str(BROWSER_MAX_PAGES)))
+BROWSER_CONTEXT_MAX_RENDERS = int(os.getenv("BROWSER_CONTEXT_MAX_RENDERS", "50"))
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--force-device-scale-factor=1',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-extensions',
+    '--disable-plugins',
+    '--disable-web-security',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection'
+]
+
+VIEWPORT = {'width': 1920, 'height': 1080}
+
+
+class _PooledContext:
+    """A browser context plus how many pages it has served and has open."""
+
+    def __init__(self, context):
+        self.context = context
+        self.renders = 0
+        self.open_pages = 0
+        self.retired = False
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        max_pages: int = BROWSER_MAX_PAGES,
+        pages_per_request: int = BROWSER_PAGES_PER_REQUEST,
+        context_max_renders: int = BROWSER_CONTEXT_MAX_RENDERS,
+    ):
+        self.max_pages = max_pages
+        self.pages_per_request = pages_per_request
+        self.context_max_renders = context_max_renders
+        self._playwright = None
+        self._browser = None
+        self._context: Optional[_PooledContext] = None
+        self._lock = asyncio.Lock()
+        self._page_slots = asyncio.Semaphore(max_pages)
+        self.open_pages = 0
+        self.stats_counters: Dict[str, int] = {
+            "launches": 0,
+            "crashes": 0,
+            "renders": 0,
+            "contexts_recycled": 0,
+        }
+
+    async def start(self) -> None:
+        """Launch the browser ahead of the first request. Failures are retried on first use."""
+        try:
+            async with self._lock:
+                await self._ensure_browser()
+        except Exception as e:
+            print(f"⚠️ Browser pool failed to start, will retry on first render: {e}")
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._close_browser()
+            if self._playwright:
+                try:
+                    await self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+    async def _close_browser(self) -> None:
+        browser, self._browser, self._context = self._browser, None, None
+        if browser:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def _on_disconnected(self, browser) -> None:
+        # Fired on crashes as well as on close(); only a crash leaves it as the current browser
+        if browser is self._browser:
+            print("⚠️ Browser disconnected, it will be relaunched on the next render")
+            self.stats_counters["crashes"] += 1
+            self._browser = None
+            self._context = None
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        await self._close_browser()
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        print("🌐 Launching pooled browser...")
+        browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        browser.on("disconnected", self._on_disconnected)
+        self._browser = browser
+        self.stats_counters["launches"] += 1
+        return browser
+
+    async def _acquire_context(self) -> _PooledContext:
+        async with self._lock:
+            browser = await self._ensure_browser()
+            pooled = self._context
+            if pooled is None or pooled.renders >= self.context_max_renders:
+                if pooled is not None:
+                    pooled.retired = True
+                    self.stats_counters["contexts_recycled"] += 1
+                    if pooled.open_pages == 0:
+                        await self._close_context(pooled)
+                pooled = _PooledContext(await browser.new_context(viewport=VIEWPORT))
+                self._context = pooled
+            pooled.renders += 1
+            pooled.open_pages += 1
+            return pooled
+
+    async def _release_context(self, pooled: _PooledContext) -> None:
+        pooled.open_pages -= 1
+        if pooled.retired and pooled.open_pages == 0:
+            await self._close_context(pooled)
+
+    @staticmethod
+    async def _close_context(pooled: _PooledContext) -> None:
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def page(self):
+        """Open a page in the pooled browser; it is closed on exit."""
+        async with self._page_slots:
+            pooled = await self._acquire_context()
+            page = None
+            try:
+                page = await pooled.context.new_page()
+                self.open_pages += 1
+                self.stats_counters["renders"] += 1
+                yield page
+            finally:
+                if page is not None:
+                    self.open_pages -= 1
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+                await self._release_context(pooled)
+
+    def request_limiter(self) -> asyncio.Semaphore:
+        """Semaphore bounding how many slides one conversion request renders at once."""
+        return asyncio.Semaphore(self.pages_per_request)
+
+    def stats(self) -> Dict:
+        return {
+            **self.stats_counters,
+            "connected": bool(self._browser and self._browser.is_connected()),
+            "open_pages": self.open_pages,
+            "max_pages": self.max_pages,
+            "pages_per_request": self.pages_per_request,
+        }
+
+
+browser_pool = BrowserPool()
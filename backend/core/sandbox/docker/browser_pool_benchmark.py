@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark the shared browser pool against a browser launched per export.
+
+Renders a generated deck to PDF through the same per-slide path as the PDF
+router, EXPORTS times back to back and then EXPORTS times at once. Each export
+gets its own copy of the deck and the export cache is not consulted, so every
+slide is really rendered.
+
+Run it inside the sandbox image, next to the server:
+
+    python browser_pool_benchmark.py                 # 10 slides, 20 exports
+    python browser_pool_benchmark.py --mode launch   # a browser per export, as before the pool
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from browser_pool import BrowserPool
+from html_to_pdf_router import PresentationToPDFAPI
+
+SLIDE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<style>
+  body {{ margin: 0; font-family: sans-serif; }}
+  .slide-container {{
+    width: 1920px; height: 1080px; box-sizing: border-box; padding: 120px;
+    background: linear-gradient(135deg, #1e3a8a, #7c3aed); color: white;
+  }}
+  h1 {{ font-size: 96px; margin: 0 0 48px; }}
+  li {{ font-size: 44px; margin-bottom: 24px; }}
+  .chart {{ display: flex; align-items: flex-end; gap: 24px; height: 280px; margin-top: 48px; }}
+  .bar {{ width: 80px; background: rgba(255, 255, 255, 0.8); border-radius: 8px 8px 0 0; }}
+</style>
+</head>
+<body>
+<!-- export {export} -->
+<div class="slide-container">
+  <h1>Slide {number}: Quarterly review</h1>
+  <ul>
+    <li>Revenue grew {number}0% quarter over quarter</li>
+    <li>Three new regions launched</li>
+    <li>Support backlog down to two days</li>
+  </ul>
+  <div class="chart">{bars}</div>
+</div>
+</body>
+</html>
+"""
+
+
+def write_deck(root: Path, export: int, slides: int) -> List[Dict]:
+    """Write one copy of the deck and return its slides the way load_metadata lists them."""
+    deck_dir = root / f"deck_{export:02d}"
+    deck_dir.mkdir(parents=True)
+    slides_info = []
+    for number in range(1, slides + 1):
+        bars = "".join(
+            f'<div class="bar" style="height: {40 + (number * 37 + i * 53) % 240}px"></div>'
+            for i in range(12)
+        )
+        path = deck_dir / f"slide_{number:02d}.html"
+        path.write_text(SLIDE_TEMPLATE.format(export=export, number=number, bars=bars), encoding="utf-8")
+        slides_info.append({'number': number, 'title': f"Slide {number}", 'filename': path.name, 'path': path})
+    (deck_dir / "metadata.json").write_text('{"presentation_name": "benchmark", "slides": {}}', encoding="utf-8")
+    return slides_info
+
+
+def chromium_rss_mb() -> float:
+    """Resident memory of all Chromium processes, from /proc."""
+    total_kb = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"chrom" not in f.read():
+                    continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class Sampler:
+    """Tracks peak open pages and peak Chromium memory while exports run."""
+
+    def __init__(self):
+        self.pools: List[BrowserPool] = []
+        self.peak_pages = 0
+        self.peak_rss_mb = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            open_pages = sum(pool.open_pages for pool in self.pools)
+            self.peak_pages = max(self.peak_pages, open_pages)
+            self.peak_rss_mb = max(self.peak_rss_mb, chromium_rss_mb())
+            await asyncio.sleep(0.2)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def export_deck(pool: BrowserPool, slides_info: List[Dict]) -> float:
+    """Render every slide on the pool and combine them, like convert_to_pdf without the cache."""
+    api = PresentationToPDFAPI.__new__(PresentationToPDFAPI)
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        limiter = pool.request_limiter()
+
+        async def render(slide_info):
+            async with limiter, pool.page() as page:
+                return await api._render_page_to_pdf(page, slide_info, temp_path)
+
+        pdf_paths = await asyncio.gather(*(render(slide_info) for slide_info in slides_info))
+        api.combine_pdfs(sorted(pdf_paths), temp_path / "benchmark.pdf")
+    return time.perf_counter() - started
+
+
+async def run_exports(mode: str, decks: List[List[Dict]], concurrent: bool) -> Dict:
+    shared = BrowserPool() if mode == "pool" else None
+    if shared:
+        await shared.start()
+    sampler = Sampler()
+    if shared:
+        sampler.pools.append(shared)
+
+    async def one_export(slides_info):
+        if shared:
+            return await export_deck(shared, slides_info)
+        # Before the pool every export launched its own browser and rendered all slides at once
+        pool = BrowserPool(max_pages=len(slides_info), pages_per_request=len(slides_info))
+        sampler.pools.append(pool)
+        started = time.perf_counter()
+        try:
+            await export_deck(pool, slides_info)
+        finally:
+            await pool.close()
+            sampler.pools.remove(pool)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with sampler:
+        if concurrent:
+            durations = await asyncio.gather(*(one_export(deck) for deck in decks))
+        else:
+            durations = [await one_export(deck) for deck in decks]
+    wall = time.perf_counter() - started
+
+    stats = shared.stats() if shared else {}
+    if shared:
+        await shared.close()
+    durations = sorted(durations)
+    return {
+        "wall_s": wall,
+        "export_p50_s": durations[len(durations) // 2],
+        "export_max_s": durations[-1],
+        "peak_pages": sampler.peak_pages,
+        "peak_chromium_rss_mb": sampler.peak_rss_mb,
+        "launches": stats.get("launches", len(decks)),
+        "contexts_recycled": stats.get("contexts_recycled", 0),
+        "renders": stats.get("renders", sum(len(deck) for deck in decks)),
+    }
+
+
+def print_result(label: str, result: Dict) -> None:
+    print(
+        f"{label:<12} wall {result['wall_s']:7.1f}s | export p50 {result['export_p50_s']:5.1f}s "
+        f"max {result['export_max_s']:5.1f}s | peak pages {result['peak_pages']:3d} | "
+        f"peak chromium RSS {result['peak_chromium_rss_mb']:7.0f} MB | launches {result['launches']:3d} | "
+        f"contexts recycled {result['contexts_recycled']:3d} | renders {result['renders']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--exports", type=int, default=20)
+    parser.add_argument("--mode", choices=["pool", "launch"], default="pool")
+    parser.add_argument("--verbose", action="store_true", help="Show the converter's per-slide output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        decks = [write_deck(Path(root), export, args.slides) for export in range(args.exports)]
+        print(f"🚀 {args.exports} exports of a {args.slides}-slide deck, mode={args.mode}")
+        for label, concurrent in (("sequential", False), ("concurrent", True)):
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = await run_exports(args.mode, decks, concurrent)
+            print_result(label, result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
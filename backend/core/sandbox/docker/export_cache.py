@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for conversion results.
+
+Exports are assembled from per-slide results (rendered PDF pages, PPTX slide
+analyses with their screenshots). Each result is stored under a key derived
+from the slide HTML, the local assets it references and the converter
+version, so re-exporting a deck only renders slides whose inputs changed.
+
+Entries are directories holding a manifest.json and the artifact files. The
+cache is bounded by EXPORT_CACHE_MAX_MB; the least recently used entries are
+removed when a new entry pushes it over.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+
+EXPORT_CACHE_DIR = Path(os.getenv("EXPORT_CACHE_DIR", "export_cache"))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+MANIFEST_NAME = "manifest.json"
+
+# src="...", href="...", url(...) references in HTML and inline CSS
+_ASSET_REF_PATTERN = re.compile(r"""(?:src|href)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+)["']?\s*\)""", re.IGNORECASE)
+
+
+class ExportCache:
+    def __init__(self, root: Path = EXPORT_CACHE_DIR, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        # entry dir -> (size in bytes, last used); built from disk on first use
+        self._index: Optional[Dict[Path, Tuple[int, float]]] = None
+        # (path, mtime_ns, size) -> content digest, so unchanged assets aren't re-read
+        self._file_digests: Dict[Tuple[str, int, int], str] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _file_digest(self, path: Path) -> str:
+        stat = path.stat()
+        memo_key = (str(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._file_digests.get(memo_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self._file_digests[memo_key] = digest
+        return digest
+
+    @staticmethod
+    def _local_assets(html: str, base_dir: Path):
+        """Local files referenced by the HTML; remote URLs and data URIs are skipped."""
+        seen = set()
+        for match in _ASSET_REF_PATTERN.finditer(html):
+            ref = (match.group(1) or match.group(2) or '').strip()
+            parsed = urlparse(ref)
+            if parsed.scheme not in ('', 'file') or not parsed.path or ref.startswith('#'):
+                continue
+            path = Path(unquote(parsed.path))
+            if not path.is_absolute():
+                path = base_dir / path
+            try:
+                path = path.resolve()
+            except OSError:
+                continue
+            if path in seen or not path.is_file():
+                continue
+            seen.add(path)
+            yield path
+
+    def content_key(self, kind: str, version: str, source_path: Path) -> str:
+        """Key for a converted file: its content, referenced local assets and the converter version."""
+        hasher = hashlib.sha256()
+        hasher.update(f"{kind}:{version}\n".encode())
+        hasher.update(self._file_digest(source_path).encode())
+        try:
+            html = source_path.read_text(encoding='utf-8', errors='ignore')
+        except OSError:
+            html = ''
+        for asset in sorted(self._local_assets(html, source_path.parent)):
+            hasher.update(f"\n{asset.name}:{self._file_digest(asset)}".encode())
+        return hasher.hexdigest()
+
+    def _entry_dir(self, kind: str, key: str) -> Path:
+        return self.root / kind / key
+
+    def _load_index(self) -> Dict[Path, Tuple[int, float]]:
+        if self._index is None:
+            self._index = {}
+            if self.root.exists():
+                for manifest in self.root.glob(f"*/*/{MANIFEST_NAME}"):
+                    entry = manifest.parent
+                    size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                    self._index[entry] = (size, manifest.stat().st_mtime)
+        return self._index
+
+    def _count(self, kind: str, outcome: str) -> None:
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "stores": 0})
+        counters[outcome] += 1
+
+    def get(self, kind: str, key: str) -> Optional[Tuple[Dict, Path]]:
+        """Return (manifest, entry dir) for a cached result, or None."""
+        entry = self._entry_dir(kind, key)
+        manifest_path = entry / MANIFEST_NAME
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            self._count(kind, "misses")
+            return None
+        now = time.time()
+        os.utime(manifest_path, (now, now))
+        index = self._load_index()
+        index[entry] = (index.get(entry, (0, now))[0], now)
+        self._count(kind, "hits")
+        return manifest, entry
+
+    def put(self, kind: str, key: str, manifest: Dict, files: Dict[str, Path]) -> None:
+        """Store a result. files maps names inside the entry to files to copy in."""
+        entry = self._entry_dir(kind, key)
+        staging = self.root / kind / f".{key}.{uuid.uuid4().hex}"
+        try:
+            staging.mkdir(parents=True, exist_ok=True)
+            size = 0
+            for name, source in files.items():
+                shutil.copyfile(source, staging / name)
+                size += (staging / name).stat().st_size
+            with open(staging / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            # Publish atomically; a concurrent store of the same key wins and this copy is dropped
+            try:
+                staging.rename(entry)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+                return
+            self._load_index()[entry] = (size, time.time())
+            self._count(kind, "stores")
+        except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            print(f"⚠️ Failed to cache {kind} result {key[:12]}: {e}")
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        index = self._load_index()
+        total = sum(size for size, _ in index.values())
+        if total <= self.max_bytes:
+            return
+        for entry, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            shutil.rmtree(entry, ignore_errors=True)
+            del index[entry]
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self, kind: str) -> Dict:
+        counters = self._counters.get(kind, {"hits": 0, "misses": 0, "stores": 0})
+        lookups = counters["hits"] + counters["misses"]
+        index = self._load_index()
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": sum(1 for entry in index if entry.parent.name == kind),
+            "total_bytes": sum(size for size, _ in index.values()),
+            "max_bytes": self.max_bytes,
+        }
+
+
+export_cache = ExportCache()
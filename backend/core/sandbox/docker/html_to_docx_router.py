@@ -21,12 +21,17 @@ except ImportError as e:
 
 from bs4 import BeautifulSoup
 
+from export_cache import export_cache
+
 
 router = APIRouter(prefix="/document", tags=["docx-conversion"])
 
 output_dir = Path("generated_docx")
 output_dir.mkdir(exist_ok=True)
 
+# Bump when the HTML to DOCX mapping changes so cached documents are rebuilt
+DOCX_CONVERTER_VERSION = "1"
+
 
 class ConvertRequest(BaseModel):
     doc_path: str = Field(..., description="Path to the document file (.doc for TipTap documents)")
@@ -223,10 +228,29 @@ class HTMLToDocxConverter:
                             for run in paragraph.runs:
                                 run.bold = True
     
+    def _build_docx_bytes(self) -> bytes:
+        """Build the DOCX, or reuse the cached build if the document and its assets are unchanged."""
+        cache_key = export_cache.content_key("docx", DOCX_CONVERTER_VERSION, self.doc_path)
+        cached = export_cache.get("docx", cache_key)
+        if cached:
+            _, entry = cached
+            return (entry / "document.docx").read_bytes()
+        
+        doc = self.create_docx()
+        buffer = BytesIO()
+        doc.save(buffer)
+        docx_bytes = buffer.getvalue()
+        
+        with tempfile.NamedTemporaryFile(suffix=".docx") as built:
+            built.write(docx_bytes)
+            built.flush()
+            export_cache.put("docx", cache_key, {}, {"document.docx": Path(built.name)})
+        return docx_bytes
+    
     async def convert_to_docx(self, store_locally: bool = True) -> tuple:
         self.load_document()
         
-        doc = self.create_docx()
+        docx_bytes = self._build_docx_bytes()
         
         doc_title = self.doc_data.get('title', 'document')
         safe_title = re.sub(r'[^\w\s-]', '', doc_title.lower())
@@ -234,13 +258,10 @@ class HTMLToDocxConverter:
         
         if store_locally:
             docx_path = output_dir / f"{safe_title}.docx"
-            doc.save(str(docx_path))
+            docx_path.write_bytes(docx_bytes)
             return docx_path, safe_title
         else:
-            buffer = BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-            return buffer.read(), safe_title
+            return docx_bytes, safe_title
 
 
 @router.post("/convert-to-docx")
@@ -295,4 +316,4 @@ async def convert_document_to_docx(request: ConvertRequest):
 @router.get("/health")
 async def docx_health_check():
     """DOCX service health check endpoint."""
-    return {"status": "healthy", "service": "docx-converter"}
+    return {"status": "healthy", "service": "docx-converter", "export_cache": export_cache.stats("docx")}
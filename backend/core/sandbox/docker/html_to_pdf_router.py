@@ -15,10 +15,10 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+import shutil
+
+from browser_pool import browser_pool
+from export_cache import export_cache
 
 try:
     from PyPDF2 import PdfWriter, PdfReader
@@ -33,6 +33,9 @@ router = APIRouter(prefix="/presentation", tags=["pdf-conversion"])
 output_dir = Path("generated_pdfs")
 output_dir.mkdir(exist_ok=True)
 
+# Bump when slide rendering changes so cached slides are re-rendered
+PDF_CONVERTER_VERSION = "1"
+
 
 class ConvertRequest(BaseModel):
     presentation_path: str = Field(..., description="Path to the presentation folder containing metadata.json")
@@ -106,16 +109,28 @@ class PresentationToPDFAPI:
         except Exception as e:
             raise ValueError(f"Error loading metadata: {e}")
     
-    async def render_slide_to_pdf(self, browser, slide_info: Dict, temp_dir: Path) -> Path:
-        """Render a single HTML slide to PDF using Playwright."""
+    async def render_slide_to_pdf(self, limiter: asyncio.Semaphore, slide_info: Dict, temp_dir: Path) -> Path:
+        """Render a single HTML slide to PDF, reusing the cached page if the slide is unchanged."""
+        temp_pdf_path = temp_dir / f"slide_{slide_info['number']:02d}.pdf"
+        cache_key = export_cache.content_key("pdf", PDF_CONVERTER_VERSION, slide_info['path'])
+        cached = export_cache.get("pdf", cache_key)
+        if cached:
+            _, entry = cached
+            shutil.copyfile(entry / "slide.pdf", temp_pdf_path)
+            print(f"  ✓ Slide {slide_info['number']} reused from cache")
+            return temp_pdf_path
+        
+        async with limiter, browser_pool.page() as page:
+            pdf_path = await self._render_page_to_pdf(page, slide_info, temp_dir)
+        export_cache.put("pdf", cache_key, {'slide_number': slide_info['number']}, {"slide.pdf": pdf_path})
+        return pdf_path
+
+    async def _render_page_to_pdf(self, page, slide_info: Dict, temp_dir: Path) -> Path:
         html_path = slide_info['path']
         slide_num = slide_info['number']
         
         print(f"Rendering slide {slide_num}: {slide_info['title']}")
         
-        # Create new page with exact presentation dimensions
-        page = await browser.new_page()
-        
         try:
             # Set exact viewport to 1920x1080
             await page.set_viewport_size({"width": 1920, "height": 1080})
@@ -176,8 +191,6 @@ class PresentationToPDFAPI:
             
         except Exception as e:
             raise RuntimeError(f"Error rendering slide {slide_num}: {e}")
-        finally:
-            await page.close()
     
     def combine_pdfs(self, pdf_paths: List[Path], output_path: Path) -> None:
         """Combine multiple PDF files into a single PDF."""
@@ -213,35 +226,17 @@ class PresentationToPDFAPI:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser
-            async with async_playwright() as p:
-                print("🌐 Launching browser...")
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling'
-                    ]
-                )
-                
-                try:
-                    # Process all slides concurrently using asyncio.gather
-                    print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
-                    
-                    tasks = [
-                        self.render_slide_to_pdf(browser, slide_info, temp_path)
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for all slides to be processed concurrently
-                    pdf_paths = await asyncio.gather(*tasks)
-                    
-                finally:
-                    await browser.close()
+            # Process slides concurrently on the shared browser, bounded per request
+            print(f"📄 Processing {len(self.slides_info)} slides concurrently...")
+            limiter = browser_pool.request_limiter()
+            
+            tasks = [
+                self.render_slide_to_pdf(limiter, slide_info, temp_path)
+                for slide_info in self.slides_info
+            ]
+            
+            # Wait for all slides to be processed concurrently
+            pdf_paths = await asyncio.gather(*tasks)
             
             # Create output path
             presentation_name = self.metadata.get('presentation_name', 'presentation')
@@ -256,7 +251,6 @@ class PresentationToPDFAPI:
                 timestamp = int(asyncio.get_event_loop().time())
                 filename = f"{presentation_name}_{timestamp}.pdf"
                 final_output = output_dir / filename
-                import shutil
                 shutil.copy2(temp_output_path, final_output)
                 return final_output, len(self.slides_info)
             else:
@@ -320,4 +314,4 @@ async def convert_presentation_to_pdf(request: ConvertRequest):
 @router.get("/health")
 async def pdf_health_check():
     """PDF service health check endpoint."""
-    return {"status": "healthy", "service": "HTML to PDF Converter"}
\ No newline at end of file
+    return {"status": "healthy", "service": "HTML to PDF Converter", "browser_pool": browser_pool.stats(), "export_cache": export_cache.stats("pdf")}
\ No newline at end of file
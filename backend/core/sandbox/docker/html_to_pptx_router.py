@@ -13,16 +13,14 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import tempfile
 import shutil
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 
-try:
-    from playwright.async_api import async_playwright
-except ImportError:
-    raise ImportError("Playwright is not installed. Please install it with: pip install playwright")
+from browser_pool import browser_pool
+from export_cache import export_cache
 
 try:
     from pptx import Presentation
@@ -40,6 +38,9 @@ router = APIRouter(prefix="/presentation", tags=["pptx-conversion"])
 output_dir = Path("generated_pptx")
 output_dir.mkdir(exist_ok=True)
 
+# Bump when slide analysis changes so cached slides are re-rendered
+PPTX_CONVERTER_VERSION = "1"
+
 
 class ConvertRequest(BaseModel):
     presentation_path: str = Field(..., description="Path to the presentation folder containing metadata.json")
@@ -1286,6 +1287,58 @@ class OptimizedHTMLToPPTXConverter:
                 except Exception:
                     pass
     
+    def _load_cached_analysis(self, cache_key: str, slide_info: Dict, temp_dir: Path) -> Optional[Dict]:
+        """Rebuild a slide analysis from the export cache, copying its images into temp_dir."""
+        cached = export_cache.get("pptx", cache_key)
+        if not cached:
+            return None
+        manifest, entry = cached
+        
+        def restore(name: str) -> Path:
+            # Copy out so cache eviction can't remove files while the deck is assembled
+            restored_path = temp_dir / f"cached_{slide_info['number']:03d}_{name}"
+            shutil.copyfile(entry / name, restored_path)
+            return restored_path
+        
+        visual_elements = [
+            {**element, 'image_path': restore(element['image_path'])}
+            for element in manifest['visual_elements']
+        ]
+        background_path = restore(manifest['background']) if manifest.get('background') else None
+        text_elements = [TextElement(**text_element) for text_element in manifest['text_elements']]
+        
+        return {
+            'slide_info': slide_info,
+            'visual_elements': visual_elements,
+            'background_path': background_path,
+            'text_elements': text_elements
+        }
+    
+    def _store_analysis(self, cache_key: str, slide_analysis: Dict) -> None:
+        """Store a slide analysis and its images in the export cache."""
+        files = {}
+        visual_elements = []
+        for i, element in enumerate(slide_analysis['visual_elements']):
+            image_path = Path(element['image_path'])
+            if not image_path.exists():
+                continue
+            name = f"visual_{i:03d}.png"
+            files[name] = image_path
+            visual_elements.append({**element, 'image_path': name})
+        
+        background_name = None
+        background_path = slide_analysis['background_path']
+        if background_path and Path(background_path).exists():
+            background_name = "background.png"
+            files[background_name] = Path(background_path)
+        
+        manifest = {
+            'visual_elements': visual_elements,
+            'background': background_name,
+            'text_elements': [asdict(text_element) for text_element in slide_analysis['text_elements']]
+        }
+        export_cache.put("pptx", cache_key, manifest, files)
+    
     async def convert_to_pptx(self, store_locally: bool = True) -> tuple:
         """Main conversion method - optimized and reliable."""
         # Load metadata
@@ -1295,131 +1348,99 @@ class OptimizedHTMLToPPTXConverter:
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
             
-            # Launch browser for processing
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--force-device-scale-factor=1',
-                        '--disable-background-timer-throttling',
-                        '--disable-backgrounding-occluded-windows',
-                        '--disable-renderer-backgrounding',
-                        '--disable-features=VizDisplayCompositor',
-                        '--disable-extensions',
-                        '--disable-plugins',
-                        '--disable-web-security',
-                        '--disable-features=TranslateUI',
-                        '--disable-ipc-flooding-protection'
-                    ]
-                )
+            # Render slides on the shared browser, bounded per request
+            semaphore = browser_pool.request_limiter()
+            
+            async def process_single_slide(slide_info: Dict) -> Dict:
+                """Process a single slide with controlled concurrency."""
+                # Slides whose HTML and assets are unchanged come from the export cache
+                cache_key = export_cache.content_key("pptx", PPTX_CONVERTER_VERSION, slide_info['path'])
+                cached_analysis = self._load_cached_analysis(cache_key, slide_info, temp_path)
+                if cached_analysis:
+                    return cached_analysis
                 
-                try:
-                    # Process all slides in parallel
-                    # Create semaphore to limit concurrent operations
-                    semaphore = asyncio.Semaphore(5)
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
+                async with semaphore:
+                    slide_num = slide_info['number']
                     
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080}
-                    )
-                    
-                    async def process_single_slide(slide_info: Dict) -> Dict:
-                        """Process a single slide with controlled concurrency."""
-                        async with semaphore:
-                            slide_num = slide_info['number']
+                    try:
+                        # Take a page from the shared browser; it is closed on exit
+                        async with browser_pool.page() as page:
+                            # Set exact viewport dimensions
+                            await page.set_viewport_size({"width": 1920, "height": 1080})
+                            await page.emulate_media(media='screen')
+                            
+                            # Force device pixel ratio to 1
+                            await page.evaluate(r"""
+                                () => {
+                                    Object.defineProperty(window, 'devicePixelRatio', {
+                                        get: () => 1
+                                    });
+                                }
+                            """)
                             
                             try:
-                                # Create a new page for this slide
-                                page = await context.new_page()
+                                # Extract visual elements
+                                visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
                                 
-                                # Set exact viewport dimensions
-                                await page.set_viewport_size({"width": 1920, "height": 1080})
-                                await page.emulate_media(media='screen')
+                                # Capture clean background
+                                background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
                                 
-                                # Force device pixel ratio to 1
-                                await page.evaluate(r"""
-                                    () => {
-                                        Object.defineProperty(window, 'devicePixelRatio', {
-                                            get: () => 1
-                                        });
-                                    }
-                                """)
+                                # Extract text elements
+                                text_elements = await self.extract_text_elements(page, slide_info['path'])
                                 
-                                try:
-                                    # Extract visual elements
-                                    visual_elements = await self.extract_visual_elements(page, slide_info['path'], temp_path)
-                                    
-                                    # Capture clean background
-                                    background_path = await self.capture_clean_background(page, slide_info['path'], temp_path, visual_elements)
-                                    
-                                    # Extract text elements
-                                    text_elements = await self.extract_text_elements(page, slide_info['path'])
-                                    
-                                    slide_analysis = {
-                                        'slide_info': slide_info,
-                                        'visual_elements': visual_elements,
-                                        'background_path': background_path,
-                                        'text_elements': text_elements
-                                    }
-                                    
-                                    return slide_analysis
-                                    
-                                except Exception as e:
-                                    return {
-                                        'slide_info': slide_info,
-                                        'visual_elements': [],
-                                        'background_path': None,
-                                        'text_elements': [],
-                                        'error': str(e)
-                                    }
-                                    
-                                finally:
-                                    # Always close the page to free memory
-                                    await page.close()
-                                    
+                                slide_analysis = {
+                                    'slide_info': slide_info,
+                                    'visual_elements': visual_elements,
+                                    'background_path': background_path,
+                                    'text_elements': text_elements
+                                }
+                                self._store_analysis(cache_key, slide_analysis)
+                                
+                                return slide_analysis
+                            
                             except Exception as e:
                                 return {
                                     'slide_info': slide_info,
                                     'visual_elements': [],
                                     'background_path': None,
                                     'text_elements': [],
-                                    'error': f"Page creation failed: {str(e)}"
+                                    'error': str(e)
                                 }
                     
-                    # Launch ALL slides in parallel
-                    parallel_tasks = [
-                        process_single_slide(slide_info) 
-                        for slide_info in self.slides_info
-                    ]
-                    
-                    # Wait for ALL slides to complete in parallel
-                    slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
-                    
-                    # Handle any top-level exceptions
-                    processed_analyses = []
-                    for i, result in enumerate(slide_analyses):
-                        if isinstance(result, Exception):
-                            error_analysis = {
-                                'slide_info': self.slides_info[i],
-                                'visual_elements': [],
-                                'background_path': None,
-                                'text_elements': [],
-                                'error': str(result)
-                            }
-                            processed_analyses.append(error_analysis)
-                        else:
-                            processed_analyses.append(result)
-                    
-                    all_slide_analyses = processed_analyses
-                    
-                finally:
-                    await browser.close()
+                    except Exception as e:
+                        return {
+                            'slide_info': slide_info,
+                            'visual_elements': [],
+                            'background_path': None,
+                            'text_elements': [],
+                            'error': f"Page creation failed: {str(e)}"
+                        }
+            
+            # Launch ALL slides in parallel
+            parallel_tasks = [
+                process_single_slide(slide_info) 
+                for slide_info in self.slides_info
+            ]
+            
+            # Wait for ALL slides to complete in parallel
+            slide_analyses = await asyncio.gather(*parallel_tasks, return_exceptions=True)
+            
+            # Handle any top-level exceptions
+            processed_analyses = []
+            for i, result in enumerate(slide_analyses):
+                if isinstance(result, Exception):
+                    error_analysis = {
+                        'slide_info': self.slides_info[i],
+                        'visual_elements': [],
+                        'background_path': None,
+                        'text_elements': [],
+                        'error': str(result)
+                    }
+                    processed_analyses.append(error_analysis)
+                else:
+                    processed_analyses.append(result)
+            
+            all_slide_analyses = processed_analyses
             
             # Build PPTX presentation
             # Create new PowerPoint presentation
@@ -1555,5 +1576,7 @@ async def pptx_health_check():
     """PPTX service health check endpoint."""
     return {
         "status": "healthy", 
-        "service": "HTML to PPTX Converter"
+        "service": "HTML to PPTX Converter",
+        "browser_pool": browser_pool.stats(),
+        "export_cache": export_cache.stats("pptx")
     }
\ No newline at end of file
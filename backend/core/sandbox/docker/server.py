@@ -3,6 +3,7 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 import uvicorn
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Import PDF router, PPTX router, DOCX router, and Visual HTML Editor router
@@ -10,6 +11,7 @@ from html_to_pdf_router import router as pdf_router
 from visual_html_editor_router import router as editor_router
 from html_to_pptx_router import router as pptx_router
 from html_to_docx_router import router as docx_router
+from browser_pool import browser_pool
 
 # Ensure we're serving from the /workspace directory
 workspace_dir = "/workspace"
@@ -22,7 +24,14 @@ class WorkspaceDirMiddleware(BaseHTTPMiddleware):
             os.makedirs(workspace_dir, exist_ok=True)
         return await call_next(request)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One long-lived browser serves every PDF/PPTX conversion
+    await browser_pool.start()
+    yield
+    await browser_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(WorkspaceDirMiddleware)
 
 # Include routers
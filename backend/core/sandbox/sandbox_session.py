@@ -0,0 +1,156 @@
+from typing import Optional, Dict, Any
+import uuid
+import asyncio
+import weakref
+
+from daytona_sdk import AsyncSandbox
+from core.sandbox.sandbox import get_or_start_sandbox, create_sandbox, delete_sandbox
+from core.services.supabase import DBConnection
+from core.utils.logger import logger
+
+
+class SandboxSession:
+    """The sandbox of one project, resolved once and shared by every sandbox tool of a run.
+
+    Resolution (project lookup, lazy creation and get_or_start_sandbox) runs
+    single-flight under a lock, so concurrent tools neither repeat the Daytona
+    calls nor create two sandboxes for a project that has none. Preview links
+    are cached per port.
+    """
+
+    PENDING = "pending"
+    RESOLVING = "resolving"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, project_id: str, db: DBConnection):
+        self.project_id = project_id
+        self.db = db
+        self.sandbox: Optional[AsyncSandbox] = None
+        self.sandbox_id: Optional[str] = None
+        self.sandbox_pass: Optional[str] = None
+        self.state = self.PENDING
+        self.error: Optional[Exception] = None
+        self.resolve_count = 0
+        self._lock = asyncio.Lock()
+        self._preview_links: Dict[int, Any] = {}
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == self.READY
+
+    async def ensure(self) -> AsyncSandbox:
+        """Return the project's sandbox, resolving or creating it on first use."""
+        if self.sandbox is not None:
+            return self.sandbox
+
+        async with self._lock:
+            if self.sandbox is not None:
+                return self.sandbox
+            self.state = self.RESOLVING
+            try:
+                await self._resolve()
+                self.state = self.READY
+                self.error = None
+            except Exception as e:
+                self.state = self.FAILED
+                self.error = e
+                logger.error(f"Error retrieving/creating sandbox for project {self.project_id}: {str(e)}")
+                raise
+        return self.sandbox
+
+    async def _resolve(self):
+        self.resolve_count += 1
+        client = await self.db.client
+
+        project = await client.table('projects').select('sandbox').eq('project_id', self.project_id).execute()
+        if not project.data or len(project.data) == 0:
+            raise ValueError(f"Project {self.project_id} not found")
+
+        sandbox_info = project.data[0].get('sandbox') or {}
+
+        if sandbox_info.get('id'):
+            # Use existing sandbox metadata
+            self.sandbox_id = sandbox_info['id']
+            self.sandbox_pass = sandbox_info.get('pass')
+            self.sandbox = await get_or_start_sandbox(self.sandbox_id)
+            return
+
+        # If there is no sandbox recorded for this project, create one lazily
+        logger.debug(f"No sandbox recorded for project {self.project_id}; creating lazily")
+        sandbox_pass = str(uuid.uuid4())
+        sandbox_obj = await create_sandbox(sandbox_pass, self.project_id)
+        sandbox_id = sandbox_obj.id
+
+        # Wait 5 seconds for services to start up
+        logger.info(f"Waiting 5 seconds for sandbox {sandbox_id} services to initialize...")
+        await asyncio.sleep(5)
+
+        # Gather preview links and token (best-effort parsing)
+        try:
+            vnc_link = await sandbox_obj.get_preview_link(6080)
+            website_link = await sandbox_obj.get_preview_link(8080)
+            self._preview_links[6080] = vnc_link
+            self._preview_links[8080] = website_link
+            vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
+            website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
+            token = vnc_link.token if hasattr(vnc_link, 'token') else (str(vnc_link).split("token='")[1].split("'")[0] if "token='" in str(vnc_link) else None)
+        except Exception:
+            # If preview link extraction fails, still proceed but leave fields None
+            logger.warning(f"Failed to extract preview links for sandbox {sandbox_id}", exc_info=True)
+            vnc_url = None
+            website_url = None
+            token = None
+
+        # Persist sandbox metadata to project record
+        update_result = await client.table('projects').update({
+            'sandbox': {
+                'id': sandbox_id,
+                'pass': sandbox_pass,
+                'vnc_preview': vnc_url,
+                'sandbox_url': website_url,
+                'token': token
+            }
+        }).eq('project_id', self.project_id).execute()
+
+        if not update_result.data:
+            # Cleanup created sandbox if DB update failed
+            try:
+                await delete_sandbox(sandbox_id)
+            except Exception:
+                logger.error(f"Failed to delete sandbox {sandbox_id} after DB update failure", exc_info=True)
+            raise Exception("Database update failed when storing sandbox metadata")
+
+        # Store local metadata and ensure sandbox is ready
+        self.sandbox_id = sandbox_id
+        self.sandbox_pass = sandbox_pass
+        self.sandbox = await get_or_start_sandbox(self.sandbox_id)
+
+    async def get_preview_link(self, port: int):
+        """Get the preview link for a port, cached for the lifetime of the session."""
+        link = self._preview_links.get(port)
+        if link is None:
+            sandbox = await self.ensure()
+            link = await sandbox.get_preview_link(port)
+            self._preview_links[port] = link
+        return link
+
+
+# Sessions are scoped to a run by keying them on the run's ThreadManager
+_run_sessions: "weakref.WeakKeyDictionary[Any, Dict[str, SandboxSession]]" = weakref.WeakKeyDictionary()
+
+
+def get_sandbox_session(project_id: str, thread_manager: Optional[Any] = None) -> SandboxSession:
+    """Get the sandbox session shared by all tools of the run that owns thread_manager.
+
+    Without a thread manager there is no run to share with, so a new session is returned.
+    """
+    if thread_manager is None:
+        return SandboxSession(project_id, DBConnection())
+
+    sessions = _run_sessions.setdefault(thread_manager, {})
+    session = sessions.get(project_id)
+    if session is None:
+        session = SandboxSession(project_id, thread_manager.db)
+        sessions[project_id] = session
+    return session
@@ -0,0 +1,240 @@
+"""
+Per-account index of running agent runs in Redis.
+
+The parallel-run limit used to be checked by loading every thread of the
+account and scanning agent_runs for running rows, which grows with account
+history. Instead, each account has a sorted set of its running runs
+(member "{agent_run_id}:{thread_id}", score = start time):
+
+- register_active_run() adds a run when its agent_runs row is created.
+- release_active_run() removes it when the run finishes or is stopped. It only
+  needs the run id: a per-run key remembers the owning account and member.
+- get_active_runs() prunes entries older than the limit window and returns the
+  rest in a single Redis call.
+
+Keys expire after the window, so entries whose release was missed heal on
+their own, and reconcile_active_runs() periodically rebuilds the sets from
+agent_runs. A release leaves a short-lived tombstone so a reconcile that read
+the run as running just before it finished does not add it back.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any
+
+from core.services import redis
+from core.utils.logger import logger
+
+# Runs count against the limit for this long after they start (matches the DB check)
+ACTIVE_RUN_WINDOW_SECONDS = 3600 * 24
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("ACTIVE_RUN_RECONCILE_INTERVAL", "300"))
+# Outlives a reconcile pass that started before the release
+RELEASED_RUN_TTL_SECONDS = 2 * RECONCILE_INTERVAL_SECONDS
+
+ACCOUNT_RUNS_KEY_PREFIX = "account_active_runs:"
+ACCOUNTS_INDEX_KEY = "account_active_runs_index"
+RUN_OWNER_KEY_PREFIX = "agent_run_owner:"
+RELEASED_RUN_KEY_PREFIX = "agent_run_released:"
+RECONCILE_LOCK_KEY = "account_active_runs_reconcile_lock"
+
+_RELEASE_SCRIPT = """
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[2])
+local owner = redis.call('GET', KEYS[1])
+if not owner then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local account_id, member = string.match(owner, '^(%S+) (%S+)$')
+if not account_id then
+    return 0
+end
+return redis.call('ZREM', ARGV[1] .. account_id, member)
+"""
+
+_RECONCILE_REGISTER_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+redis.call('SADD', KEYS[4], ARGV[5])
+return 1
+"""
+
+_GET_ACTIVE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+return redis.call('ZRANGE', KEYS[1], 0, -1)
+"""
+
+_scripts: Dict[int, Dict[str, Any]] = {}
+
+
+def _account_key(account_id: str) -> str:
+    return f"{ACCOUNT_RUNS_KEY_PREFIX}{account_id}"
+
+
+def _owner_key(agent_run_id: str) -> str:
+    return f"{RUN_OWNER_KEY_PREFIX}{agent_run_id}"
+
+
+def _released_key(agent_run_id: str) -> str:
+    return f"{RELEASED_RUN_KEY_PREFIX}{agent_run_id}"
+
+
+async def _get_scripts():
+    client = await redis.get_client()
+    # Scripts are bound to a client; re-register after a reconnect
+    scripts = _scripts.get(id(client))
+    if scripts is None:
+        _scripts.clear()
+        scripts = {
+            "release": client.register_script(_RELEASE_SCRIPT),
+            "reconcile_register": client.register_script(_RECONCILE_REGISTER_SCRIPT),
+            "get_active": client.register_script(_GET_ACTIVE_SCRIPT),
+        }
+        _scripts[id(client)] = scripts
+    return client, scripts
+
+
+def _queue_register(pipe, account_id: str, agent_run_id: str, thread_id: str, started_at: float):
+    member = f"{agent_run_id}:{thread_id}"
+    key = _account_key(account_id)
+    pipe.zadd(key, {member: started_at})
+    pipe.expire(key, ACTIVE_RUN_WINDOW_SECONDS)
+    pipe.set(_owner_key(agent_run_id), f"{account_id} {member}", ex=ACTIVE_RUN_WINDOW_SECONDS)
+    pipe.sadd(ACCOUNTS_INDEX_KEY, account_id)
+
+
+async def register_active_run(account_id: str, agent_run_id: str, thread_id: str, started_at: Optional[float] = None):
+    """Record a newly created running agent run for its account."""
+    try:
+        client = await redis.get_client()
+        async with client.pipeline(transaction=True) as pipe:
+            _queue_register(pipe, account_id, agent_run_id, thread_id, started_at or time.time())
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to register active run {agent_run_id} for account {account_id}: {e}")
+
+
+async def release_active_run(agent_run_id: str):
+    """Remove a finished or stopped run from its account's active runs. Safe to call more than once."""
+    try:
+        _, scripts = await _get_scripts()
+        await scripts["release"](
+            keys=[_owner_key(agent_run_id), _released_key(agent_run_id)],
+            args=[ACCOUNT_RUNS_KEY_PREFIX, RELEASED_RUN_TTL_SECONDS]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to release active run {agent_run_id}: {e}")
+
+
+async def get_active_runs(account_id: str) -> List[Dict[str, str]]:
+    """Return the account's running runs started within the window, as dicts with id and thread_id.
+
+    Raises on Redis errors so callers can fall back to the database.
+    """
+    _, scripts = await _get_scripts()
+    cutoff = time.time() - ACTIVE_RUN_WINDOW_SECONDS
+    members = await scripts["get_active"](keys=[_account_key(account_id)], args=[cutoff])
+    runs = []
+    for member in members:
+        agent_run_id, _, thread_id = member.partition(":")
+        runs.append({"id": agent_run_id, "thread_id": thread_id})
+    return runs
+
+
+async def _fetch_running_runs(client, since_iso: str) -> List[Dict[str, Any]]:
+    page_size = 1000
+    rows = []
+    offset = 0
+    while True:
+        result = await client.table('agent_runs')\
+            .select('id, thread_id, started_at, threads!inner(account_id)')\
+            .eq('status', 'running')\
+            .gte('started_at', since_iso)\
+            .order('started_at')\
+            .range(offset, offset + page_size - 1)\
+            .execute()
+        batch = result.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows
+        offset += page_size
+
+
+async def reconcile_active_runs(client) -> Dict[str, int]:
+    """Rebuild the per-account active run sets from agent_runs.
+
+    Entries registered after the database read started are left alone, so runs
+    created while reconciling are not dropped, and runs released since then are
+    not added back.
+    """
+    reconcile_started = time.time()
+    since_iso = datetime.fromtimestamp(reconcile_started - ACTIVE_RUN_WINDOW_SECONDS, timezone.utc).isoformat()
+    rows = await _fetch_running_runs(client, since_iso)
+
+    expected: Dict[str, Dict[str, tuple]] = {}
+    for row in rows:
+        account_id = (row.get('threads') or {}).get('account_id')
+        if not account_id:
+            continue
+        try:
+            started_at = datetime.fromisoformat(row['started_at']).timestamp()
+        except Exception:
+            started_at = reconcile_started
+        expected.setdefault(account_id, {})[f"{row['id']}:{row['thread_id']}"] = (row['id'], row['thread_id'], started_at)
+
+    redis_client, scripts = await _get_scripts()
+    indexed_accounts = await redis_client.smembers(ACCOUNTS_INDEX_KEY)
+    stats = {"accounts": 0, "added": 0, "removed": 0}
+
+    for account_id in set(indexed_accounts) | set(expected):
+        key = _account_key(account_id)
+        current = dict(await redis_client.zrange(key, 0, -1, withscores=True))
+        wanted = expected.get(account_id, {})
+        stale = [member for member, score in current.items() if member not in wanted and score < reconcile_started]
+        missing = [entry for member, entry in wanted.items() if member not in current]
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.zrem(key, *stale)
+                for member in stale:
+                    pipe.delete(_owner_key(member.partition(":")[0]))
+            if not wanted and len(stale) == len(current):
+                pipe.srem(ACCOUNTS_INDEX_KEY, account_id)
+            for agent_run_id, thread_id, started_at in missing:
+                # Skipped if the run was released after the database read
+                member = f"{agent_run_id}:{thread_id}"
+                await scripts["reconcile_register"](
+                    keys=[key, _owner_key(agent_run_id), _released_key(agent_run_id), ACCOUNTS_INDEX_KEY],
+                    args=[started_at, member, f"{account_id} {member}", ACTIVE_RUN_WINDOW_SECONDS, account_id],
+                    client=pipe
+                )
+            results = await pipe.execute()
+
+        stats["accounts"] += 1
+        stats["added"] += sum(results[len(results) - len(missing):])
+        stats["removed"] += len(stale)
+
+    return stats
+
+
+async def run_reconciler(db, instance_id: str):
+    """Periodically reconcile active run sets. Only one instance reconciles per interval."""
+    while True:
+        try:
+            acquired = await redis.set(RECONCILE_LOCK_KEY, instance_id, nx=True, ex=max(1, RECONCILE_INTERVAL_SECONDS - 1))
+            if acquired:
+                client = await db.client
+                stats = await reconcile_active_runs(client)
+                if stats["added"] or stats["removed"]:
+                    logger.info(f"Reconciled active agent runs: {stats}")
+                else:
+                    logger.debug(f"Reconciled active agent runs: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Active run reconciliation failed: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
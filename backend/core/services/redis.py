@@ -166,6 +166,12 @@ async def lrange(key: str, start: int, end: int) -> List[str]:
     return await redis_client.lrange(key, start, end)
 
 
+async def llen(key: str) -> int:
+    """Get the length of a list."""
+    redis_client = await get_client()
+    return await redis_client.llen(key)
+
+
 # Key management
 
 
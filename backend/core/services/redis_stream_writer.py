@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import List, Tuple, Dict, Any, Optional
+
+from core.services import redis
+from core.utils.logger import logger
+
+
+class ResponseStreamWriter:
+    """Batches agent run responses into pipelined Redis writes.
+
+    Instead of one RPUSH and one PUBLISH per chunk, responses are buffered and
+    written as a single pipelined RPUSH of the batch followed by one PUBLISH,
+    once per flush window (flush_interval seconds or max_batch items, whichever
+    comes first). At most one flush is in flight, and write() waits when
+    max_pending responses are buffered, so memory stays bounded even when
+    Redis is slow. close() flushes everything that is still buffered.
+    """
+
+    def __init__(
+        self,
+        list_key: str,
+        channel: str,
+        flush_interval: float = 0.02,
+        max_batch: int = 64,
+        max_pending: int = 4096
+    ):
+        self.list_key = list_key
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._buffer: List[Tuple[str, float]] = []
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        # Stats for benchmarking Redis usage per run
+        self.items_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    async def write(self, response_json: str):
+        """Queue a serialized response, waiting if the buffer is full."""
+        if self._closing:
+            raise RuntimeError("Response stream writer is closed")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        while len(self._buffer) >= self.max_pending:
+            self._drained.clear()
+            await self._drained.wait()
+
+        self._buffer.append((response_json, time.monotonic()))
+        if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+
+    async def close(self, timeout: float = 30.0):
+        """Flush remaining responses and stop the writer. Safe to call more than once."""
+        self._closing = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout flushing {len(self._buffer)} pending responses to {self.list_key}")
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Let the window fill up unless it is already full or we are closing
+            if not self._closing and len(self._buffer) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            # Responses that arrive during a flush wait for the next window
+            await self._flush_buffer()
+
+            if self._closing:
+                while self._buffer:
+                    await self._flush_buffer()
+                return
+
+    async def _flush_buffer(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._drained.set()
+        await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[str, float]]):
+        for attempt in range(2):
+            try:
+                client = await redis.get_client()
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.rpush(self.list_key, *[item for item, _ in batch])
+                    pipe.publish(self.channel, "new")
+                    await pipe.execute()
+                break
+            except Exception as e:
+                if attempt == 0:
+                    logger.warning(f"Retrying flush of {len(batch)} responses to {self.list_key}: {e}")
+                    continue
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush {len(batch)} responses to {self.list_key}: {e}")
+                return
+
+        now = time.monotonic()
+        self.flushes += 1
+        self.items_written += len(batch)
+        for _, queued_at in batch:
+            latency_ms = (now - queued_at) * 1000
+            self.total_latency_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "items_written": self.items_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "redis_round_trips": self.flushes,
+            "mean_latency_ms": round(self.total_latency_ms / self.items_written, 2) if self.items_written else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
@@ -0,0 +1,155 @@
+"""
+Index of which instances are handling which agent runs.
+
+Every running agent run has an `active_run:{instance_id}:{agent_run_id}` key.
+Finding the runs of an instance (shutdown cleanup) or the instances of a run
+(stop) used to mean KEYS over the whole shared keyspace. Alongside each key
+we now keep two sets, written in the same MULTI transaction as the key:
+
+    instance_active_runs:{instance_id}  -> agent run ids
+    agent_run_instances:{agent_run_id}  -> instance ids
+
+Set members can outlive their active_run key when it expires, so lookups
+check the keys still exist and drop stale members.
+
+Migration: keys written by processes that predate the index are added by
+backfill_run_index(), which walks the keyspace once with non-blocking SCAN.
+The API runs it at startup. A run that is missing from the index only misses
+the instance-specific STOP, because workers also listen on the run's global
+control channel.
+"""
+from typing import List, Iterable
+
+from core.services import redis
+from core.utils.logger import logger
+
+INSTANCE_RUNS_KEY_PREFIX = "instance_active_runs:"
+RUN_INSTANCES_KEY_PREFIX = "agent_run_instances:"
+BACKFILL_LOCK_KEY = "active_run_index_backfill_lock"
+BACKFILL_LOCK_TTL_SECONDS = 600
+
+
+def active_run_key(instance_id: str, agent_run_id: str) -> str:
+    return f"active_run:{instance_id}:{agent_run_id}"
+
+
+def _instance_runs_key(instance_id: str) -> str:
+    return f"{INSTANCE_RUNS_KEY_PREFIX}{instance_id}"
+
+
+def _run_instances_key(agent_run_id: str) -> str:
+    return f"{RUN_INSTANCES_KEY_PREFIX}{agent_run_id}"
+
+
+def _queue_mark(pipe, instance_id: str, agent_run_id: str, ttl: int):
+    pipe.set(active_run_key(instance_id, agent_run_id), "running", ex=ttl)
+    pipe.sadd(_instance_runs_key(instance_id), agent_run_id)
+    pipe.expire(_instance_runs_key(instance_id), ttl)
+    pipe.sadd(_run_instances_key(agent_run_id), instance_id)
+    pipe.expire(_run_instances_key(agent_run_id), ttl)
+
+
+async def mark_run_active(instance_id: str, agent_run_id: str, ttl: int = redis.REDIS_KEY_TTL):
+    """Set the active_run key for (instance, run) and index it."""
+    client = await redis.get_client()
+    async with client.pipeline(transaction=True) as pipe:
+        _queue_mark(pipe, instance_id, agent_run_id, ttl)
+        await pipe.execute()
+
+
+async def refresh_run_active(instance_id: str, agent_run_id: str, ttl: int = redis.REDIS_KEY_TTL):
+    """Extend the TTL of the active_run key and its index entries."""
+    client = await redis.get_client()
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.expire(active_run_key(instance_id, agent_run_id), ttl)
+        pipe.expire(_instance_runs_key(instance_id), ttl)
+        pipe.expire(_run_instances_key(agent_run_id), ttl)
+        await pipe.execute()
+
+
+async def clear_run_active(instance_id: str, agent_run_id: str):
+    """Delete the active_run key for (instance, run) and remove it from the index."""
+    client = await redis.get_client()
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.delete(active_run_key(instance_id, agent_run_id))
+        pipe.srem(_instance_runs_key(instance_id), agent_run_id)
+        pipe.srem(_run_instances_key(agent_run_id), instance_id)
+        await pipe.execute()
+
+
+async def _live_members(index_key: str, members: List[str], key_for) -> List[str]:
+    """Keep the members whose active_run key still exists; remove the others from the index."""
+    if not members:
+        return []
+    client = await redis.get_client()
+    async with client.pipeline(transaction=False) as pipe:
+        for member in members:
+            pipe.exists(key_for(member))
+        exists = await pipe.execute()
+    live = [member for member, found in zip(members, exists) if found]
+    stale = [member for member, found in zip(members, exists) if not found]
+    if stale:
+        await client.srem(index_key, *stale)
+    return live
+
+
+async def get_instance_runs(instance_id: str) -> List[str]:
+    """Agent run ids that instance_id is handling."""
+    client = await redis.get_client()
+    index_key = _instance_runs_key(instance_id)
+    members = sorted(await client.smembers(index_key))
+    return await _live_members(index_key, members, lambda agent_run_id: active_run_key(instance_id, agent_run_id))
+
+
+async def get_run_instances(agent_run_id: str) -> List[str]:
+    """Instance ids handling agent_run_id."""
+    client = await redis.get_client()
+    index_key = _run_instances_key(agent_run_id)
+    members = sorted(await client.smembers(index_key))
+    return await _live_members(index_key, members, lambda instance_id: active_run_key(instance_id, agent_run_id))
+
+
+async def backfill_run_index(batch_size: int = 1000) -> int:
+    """Index active_run keys written before the index existed. Idempotent; uses SCAN, not KEYS."""
+    client = await redis.get_client()
+    indexed = 0
+    batch: List[tuple] = []
+
+    async def flush(entries: Iterable[tuple]):
+        async with client.pipeline(transaction=False) as pipe:
+            for instance_id, agent_run_id, ttl in entries:
+                pipe.sadd(_instance_runs_key(instance_id), agent_run_id)
+                pipe.expire(_instance_runs_key(instance_id), ttl)
+                pipe.sadd(_run_instances_key(agent_run_id), instance_id)
+                pipe.expire(_run_instances_key(agent_run_id), ttl)
+            await pipe.execute()
+
+    async for key in client.scan_iter(match="active_run:*", count=batch_size):
+        parts = key.split(":")
+        if len(parts) != 3:
+            continue
+        ttl = await client.ttl(key)
+        if ttl is None or ttl < 0:
+            ttl = redis.REDIS_KEY_TTL
+        batch.append((parts[1], parts[2], ttl))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            indexed += len(batch)
+            batch = []
+
+    if batch:
+        await flush(batch)
+        indexed += len(batch)
+
+    logger.info(f"Backfilled active run index with {indexed} keys")
+    return indexed
+
+
+async def run_backfill(instance_id: str):
+    """Backfill the index at startup. Instances starting together share one backfill."""
+    try:
+        acquired = await redis.set(BACKFILL_LOCK_KEY, instance_id, nx=True, ex=BACKFILL_LOCK_TTL_SECONDS)
+        if acquired:
+            await backfill_run_index()
+    except Exception as e:
+        logger.warning(f"Active run index backfill failed: {e}")
@@ -0,0 +1,214 @@
+import asyncio
+from collections import deque
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from core.services import redis
+from core.utils.logger import logger
+
+# Entries read from the response list per LRANGE
+READ_WINDOW = 500
+# Broadcast slices a subscriber may have queued before it is marked as overflowed
+SUBSCRIBER_QUEUE_SIZE = 256
+
+RESPONSES = "responses"
+OVERFLOW = "overflow"
+CONTROL = "control"
+ERROR = "error"
+
+
+class RunSubscription:
+    """One local viewer of an agent run stream.
+
+    get() returns (RESPONSES, [(index, raw_json), ...]) slices in order, then the
+    terminal (CONTROL, signal) or (ERROR, message) event. A viewer that falls
+    more than SUBSCRIBER_QUEUE_SIZE slices behind stops receiving broadcasts and
+    gets (OVERFLOW, None); it should call resync() and catch up from Redis itself.
+    """
+
+    def __init__(self, hub: 'RunStreamHub', agent_run_id: str):
+        self._hub = hub
+        self.agent_run_id = agent_run_id
+        self._queue: deque = deque()
+        self._signal = asyncio.Event()
+        self.overflowed = False
+        self.final_event: Optional[Tuple[str, Any]] = None
+        self.dropped_slices = 0
+
+    def _push(self, items: List[Tuple[int, str]]):
+        if self.overflowed:
+            self.dropped_slices += 1
+            return
+        if len(self._queue) >= SUBSCRIBER_QUEUE_SIZE:
+            # Slow consumer: stop buffering for it rather than growing without bound
+            self.overflowed = True
+            self._queue.clear()
+            self.dropped_slices += 1
+        else:
+            self._queue.append(items)
+        self._signal.set()
+
+    def _finish(self, event: Tuple[str, Any]):
+        if self.final_event is None:
+            self.final_event = event
+        self._signal.set()
+
+    async def get(self) -> Tuple[str, Any]:
+        while True:
+            if self._queue:
+                return RESPONSES, self._queue.popleft()
+            if self.overflowed:
+                return OVERFLOW, None
+            if self.final_event:
+                return self.final_event
+            self._signal.clear()
+            await self._signal.wait()
+
+    def resync(self):
+        """Resume receiving broadcasts after an overflow. Catch up from Redis after calling this."""
+        self._queue.clear()
+        self.overflowed = False
+
+    async def close(self):
+        await self._hub._unsubscribe(self)
+
+
+class _RunChannel:
+    """The shared Redis subscription and list reader for one agent run."""
+
+    def __init__(self, agent_run_id: str):
+        self.agent_run_id = agent_run_id
+        self.response_list_key = f"agent_run:{agent_run_id}:responses"
+        self.response_channel = f"agent_run:{agent_run_id}:new_response"
+        self.control_channel = f"agent_run:{agent_run_id}:control"
+        self.subscribers: Set[RunSubscription] = set()
+        self.next_index = 0
+        self.pubsub = None
+        self.task: Optional[asyncio.Task] = None
+        self.finished = False
+        self.reads = 0
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.ready.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    async def start(self):
+        self.pubsub = await redis.create_pubsub()
+        await self.pubsub.subscribe(self.response_channel, self.control_channel)
+        # Subscribers catch up on anything older themselves; the channel only broadcasts what comes next
+        self.next_index = await redis.llen(self.response_list_key)
+        self.task = asyncio.create_task(self._listen())
+
+    async def _read_new(self):
+        while True:
+            window = await redis.lrange(self.response_list_key, self.next_index, self.next_index + READ_WINDOW - 1)
+            self.reads += 1
+            if not window:
+                return
+            items = [(self.next_index + offset, response_json) for offset, response_json in enumerate(window)]
+            self.next_index += len(window)
+            for subscriber in list(self.subscribers):
+                subscriber._push(items)
+            if len(window) < READ_WINDOW:
+                return
+
+    def _finish(self, event: Tuple[str, Any]):
+        self.finished = True
+        for subscriber in list(self.subscribers):
+            subscriber._finish(event)
+
+    async def _listen(self):
+        try:
+            async for message in self.pubsub.listen():
+                if not message or message.get("type") != "message":
+                    continue
+                channel = message.get("channel")
+                data = message.get("data")
+                if isinstance(channel, bytes):
+                    channel = channel.decode('utf-8')
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+
+                if channel == self.response_channel and data == "new":
+                    await self._read_new()
+                elif channel == self.control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
+                    logger.debug(f"Received control signal '{data}' for {self.agent_run_id}")
+                    self._finish((CONTROL, data))
+                    return
+            self._finish((ERROR, "Listener stopped unexpectedly"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in stream hub listener for {self.agent_run_id}: {e}")
+            self._finish((ERROR, "Listener failed"))
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self.pubsub:
+            try:
+                await self.pubsub.unsubscribe(self.response_channel, self.control_channel)
+                await self.pubsub.close()
+            except Exception as e:
+                logger.debug(f"Error during pubsub cleanup for {self.agent_run_id}: {e}")
+
+
+class RunStreamHub:
+    """Per-process fan-out of agent run streams.
+
+    All local viewers of a run share one Redis pub/sub subscription and one
+    LRANGE per notification; the decoded slices are broadcast to each viewer's
+    bounded queue. The subscription is dropped when the last viewer leaves.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, _RunChannel] = {}
+
+    async def subscribe(self, agent_run_id: str) -> RunSubscription:
+        channel = self._channels.get(agent_run_id)
+        subscription = RunSubscription(self, agent_run_id)
+
+        if channel is None or channel.finished:
+            # Registered before the first await so concurrent viewers share it
+            previous = channel
+            channel = _RunChannel(agent_run_id)
+            self._channels[agent_run_id] = channel
+            channel.subscribers.add(subscription)
+            if previous is not None:
+                await previous.stop()
+            try:
+                await channel.start()
+                channel.ready.set_result(True)
+            except Exception as e:
+                channel.ready.set_exception(e)
+                if self._channels.get(agent_run_id) is channel:
+                    del self._channels[agent_run_id]
+                await channel.stop()
+                raise
+        else:
+            channel.subscribers.add(subscription)
+            try:
+                await asyncio.shield(channel.ready)
+            except Exception:
+                channel.subscribers.discard(subscription)
+                raise
+        return subscription
+
+    async def _unsubscribe(self, subscription: RunSubscription):
+        channel = self._channels.get(subscription.agent_run_id)
+        if channel is None or subscription not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscription)
+        if not channel.subscribers:
+            del self._channels[subscription.agent_run_id]
+            await channel.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_runs": len(self._channels),
+            "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+        }
+
+
+run_stream_hub = RunStreamHub()
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from core.services import redis
+from core.services import run_stream_hub as hub_module
+from core.services.run_stream_hub import CONTROL, OVERFLOW, RESPONSES, RunStreamHub
+
+AGENT_RUN_ID = "run-1"
+RESPONSE_LIST_KEY = f"agent_run:{AGENT_RUN_ID}:responses"
+RESPONSE_CHANNEL = f"agent_run:{AGENT_RUN_ID}:new_response"
+CONTROL_CHANNEL = f"agent_run:{AGENT_RUN_ID}:control"
+VIEWERS = 500
+
+
+class CountingRedis:
+    """fakeredis client that records the calls the hub makes."""
+
+    def __init__(self):
+        self._client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.pubsubs = []
+        self.lrange_calls = 0
+
+    def pubsub(self):
+        pubsub = CountingPubSub(self._client.pubsub())
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def lrange(self, key, start, end):
+        self.lrange_calls += 1
+        return await self._client.lrange(key, start, end)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class CountingPubSub:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+        self.unsubscribed = False
+        self.closed = False
+
+    async def unsubscribe(self, *channels):
+        self.unsubscribed = True
+        return await self._pubsub.unsubscribe(*channels)
+
+    async def close(self):
+        self.closed = True
+        return await self._pubsub.close()
+
+    def __getattr__(self, name):
+        return getattr(self._pubsub, name)
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+async def collect(subscription):
+    """Read a subscription until its terminal event, like the SSE endpoint does."""
+    indexes = []
+    while True:
+        kind, payload = await subscription.get()
+        if kind == RESPONSES:
+            indexes.extend(index for index, _ in payload)
+        else:
+            return indexes, (kind, payload)
+
+
+class TestRunStreamHub:
+    """Many local viewers of one run against a fake Redis."""
+
+    @pytest.fixture
+    def fake_redis(self, monkeypatch):
+        client = CountingRedis()
+
+        async def get_client():
+            return client
+
+        monkeypatch.setattr(redis, "get_client", get_client)
+        return client
+
+    async def _produce(self, fake_redis: CountingRedis, count: int, start: int = 0):
+        """Append responses one at a time, notifying after each like the agent run worker."""
+        for index in range(start, start + count):
+            reads_before = fake_redis.lrange_calls
+            await fake_redis.rpush(RESPONSE_LIST_KEY, json.dumps({"index": index}))
+            await fake_redis.publish(RESPONSE_CHANNEL, "new")
+            # Let the listener read before the next response
+            await wait_until(lambda: fake_redis.lrange_calls > reads_before)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_viewers_share_one_subscription_and_one_read_per_notification(self, fake_redis):
+        hub = RunStreamHub()
+        subscriptions = await asyncio.gather(*(hub.subscribe(AGENT_RUN_ID) for _ in range(VIEWERS)))
+
+        assert len(fake_redis.pubsubs) == 1
+        assert hub.stats() == {"active_runs": 1, "subscribers": VIEWERS}
+
+        readers = [asyncio.create_task(collect(subscription)) for subscription in subscriptions]
+        await self._produce(fake_redis, 20)
+        await fake_redis.publish(CONTROL_CHANNEL, "END_STREAM")
+        results = await asyncio.gather(*readers)
+
+        assert fake_redis.lrange_calls == 20
+        for indexes, final_event in results:
+            assert indexes == list(range(20))
+            assert final_event == (CONTROL, "END_STREAM")
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_dropped_and_resyncs(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(hub_module, "SUBSCRIBER_QUEUE_SIZE", 4)
+        hub = RunStreamHub()
+        subscriptions = await asyncio.gather(*(hub.subscribe(AGENT_RUN_ID) for _ in range(VIEWERS)))
+        slow, fast = subscriptions[0], subscriptions[1:]
+
+        readers = [asyncio.create_task(collect(subscription)) for subscription in fast]
+        await self._produce(fake_redis, 10)
+
+        # The slow viewer's queue filled up after 4 slices; its buffer was dropped instead of growing
+        assert slow.overflowed
+        assert slow.dropped_slices == 6
+        assert await slow.get() == (OVERFLOW, None)
+
+        # Resync, catch up from Redis directly, then follow broadcasts again
+        slow.resync()
+        catch_up = await redis.lrange(RESPONSE_LIST_KEY, 0, -1)
+        received = [json.loads(item)["index"] for item in catch_up]
+        slow_reader = asyncio.create_task(collect(slow))
+
+        await self._produce(fake_redis, 3, start=10)
+        await fake_redis.publish(CONTROL_CHANNEL, "END_STREAM")
+
+        indexes, final_event = await slow_reader
+        assert received + indexes == list(range(13))
+        assert final_event == (CONTROL, "END_STREAM")
+        for indexes, _ in await asyncio.gather(*readers):
+            assert indexes == list(range(13))
+        assert all(not subscription.overflowed for subscription in fast)
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_unsubscribes_when_last_viewer_leaves(self, fake_redis):
+        hub = RunStreamHub()
+        subscriptions = await asyncio.gather(*(hub.subscribe(AGENT_RUN_ID) for _ in range(VIEWERS)))
+        pubsub = fake_redis.pubsubs[0]
+
+        await asyncio.gather(*(subscription.close() for subscription in subscriptions[:-1]))
+        assert hub.stats() == {"active_runs": 1, "subscribers": 1}
+        assert not pubsub.unsubscribed
+
+        await subscriptions[-1].close()
+        assert hub.stats() == {"active_runs": 0, "subscribers": 0}
+        assert pubsub.unsubscribed and pubsub.closed
+
+        # A new viewer starts a fresh subscription
+        subscription = await hub.subscribe(AGENT_RUN_ID)
+        assert len(fake_redis.pubsubs) == 2
+        await subscription.close()
@@ -370,6 +370,7 @@ class MarketplacePaginationInfo(BaseModel):
     total_pages: int
     has_next: bool
     has_previous: bool
+    next_cursor: Optional[str] = None
 
 class MarketplaceTemplatesResponse(BaseModel):
     templates: List[TemplateResponse]
@@ -435,6 +436,7 @@ async def get_marketplace_templates(
     mine: Optional[bool] = Query(None, description="Filter to show only user's own templates"),
     sort_by: Optional[str] = Query("download_count", description="Sort field: download_count, newest, name"),
     sort_order: Optional[str] = Query("desc", description="Sort order: asc, desc"),
+    cursor: Optional[str] = Query(None, description="Cursor from pagination.next_cursor; takes precedence over page"),
     request: Request = None
 ):
     try:
@@ -455,7 +457,8 @@ async def get_marketplace_templates(
 
         pagination_params = PaginationParams(
             page=page,
-            page_size=limit
+            page_size=limit,
+            cursor=cursor
         )
         
         filters = MarketplaceFilters(
@@ -487,10 +490,15 @@ async def get_marketplace_templates(
                 total_items=paginated_result.pagination.total_items,
                 total_pages=paginated_result.pagination.total_pages,
                 has_next=paginated_result.pagination.has_next,
-                has_previous=paginated_result.pagination.has_previous
+                has_previous=paginated_result.pagination.has_previous,
+                next_cursor=paginated_result.pagination.next_cursor
             )
         )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         try:
             error_str = str(e)
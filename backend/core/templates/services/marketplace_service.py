@@ -1,7 +1,26 @@
-from typing import List, Dict, Any, Optional
-from core.utils.pagination import PaginationService, PaginationParams, PaginatedResponse, PaginationMeta
+import asyncio
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from core.utils.cache import Cache
+from core.utils.pagination import PaginationParams, PaginatedResponse, PaginationMeta
 from core.utils.logger import logger
-from core.utils.query_utils import batch_query_in
+
+# Columns returned by template listings. creator_name is the creator_name(agent_templates)
+# computed column, so the creator comes back with the page instead of a basejump.accounts lookup.
+TEMPLATE_LIST_SELECT = (
+    "template_id, creator_id, name, config, tags, categories, is_public, is_kortix_team, "
+    "marketplace_published_at, download_count, created_at, updated_at, icon_name, icon_color, "
+    "icon_background, metadata, usage_examples, creator_name"
+)
+
+# The marketplace total is a planner estimate beyond PostgREST's max-rows, cached per filter set
+MARKETPLACE_TOTAL_CACHE_TTL = 60
+# First page of the unfiltered marketplace, as shown on the home page
+MARKETPLACE_HOME_CACHE_TTL = 30
 
 
 class MarketplaceFilters:
@@ -31,65 +50,22 @@ class MarketplaceService:
         pagination_params: PaginationParams,
         filters: MarketplaceFilters
     ) -> PaginatedResponse[Dict[str, Any]]:
+        """List public templates with all filters applied in the database.
+
+        The default ordering (most downloaded first) pages with a keyset cursor on
+        (download_count, created_at, template_id) when pagination_params.cursor is
+        set; other orderings page by offset.
+        """
         try:
-            # logger.debug(f"Fetching marketplace templates with filters: {filters.__dict__}")
-            
-            from ..template_service import get_template_service
-            from ..utils import format_template_for_response
-            from core.utils.db_helpers import get_initialized_db
-            
-            db_connection = get_initialized_db()
-            await db_connection.initialize()
-            template_service = get_template_service(db_connection)
-            
-            limit = pagination_params.page_size
-            offset = (pagination_params.page - 1) * pagination_params.page_size
-            
-            templates = await template_service.get_public_templates(
-                is_kortix_team=filters.is_kortix_team,
-                limit=limit,
-                offset=offset,
-                search=filters.search,
-                tags=filters.tags
-            )
-            
-            base_query = self._build_marketplace_base_query(filters)
-            count_query = self._build_marketplace_count_query(filters)
-            count_result = await count_query.execute()
-            total_items = count_result.count if count_result.count is not None else 0
-            
-            if filters.creator_id is not None:
-                templates = [t for t in templates if t.creator_id == filters.creator_id]
-                if filters.creator_id:
-                    all_templates = await template_service.get_public_templates(
-                        is_kortix_team=filters.is_kortix_team,
-                        search=filters.search,
-                        tags=filters.tags
-                    )
-                    filtered_templates = [t for t in all_templates if t.creator_id == filters.creator_id]
-                    total_items = len(filtered_templates)
-            
-            template_responses = []
-            for template in templates:
-                template_response = format_template_for_response(template)
-                template_responses.append(template_response)
-            
-            total_pages = (total_items + pagination_params.page_size - 1) // pagination_params.page_size
-            has_next = pagination_params.page < total_pages
-            has_previous = pagination_params.page > 1
-            
-            return PaginatedResponse(
-                data=template_responses,
-                pagination=PaginationMeta(
-                    current_page=pagination_params.page,
-                    page_size=pagination_params.page_size,
-                    total_items=total_items,
-                    total_pages=total_pages,
-                    has_next=has_next,
-                    has_previous=has_previous
-                )
-            )
-                
+            home_cache_key = self._home_cache_key(pagination_params, filters)
+            if home_cache_key:
+                async def load():
+                    page = await self._load_marketplace_page(pagination_params, filters)
+                    return page.model_dump()
+                return PaginatedResponse(**await Cache.get_or_load(home_cache_key, load, ttl=MARKETPLACE_HOME_CACHE_TTL))
+
+            return await self._load_marketplace_page(pagination_params, filters)
+
         except Exception as e:
             try:
                 error_str = str(e)
@@ -98,6 +74,114 @@ class MarketplaceService:
             logger.error(f"Error fetching marketplace templates: {error_str}")
             raise
 
+    async def _load_marketplace_page(
+        self,
+        pagination_params: PaginationParams,
+        filters: MarketplaceFilters
+    ) -> PaginatedResponse[Dict[str, Any]]:
+        page_size = pagination_params.page_size
+
+        keyset = pagination_params.cursor is not None and self._uses_keyset(filters)
+        if keyset:
+            download_count, created_at, template_id = self._parse_cursor(pagination_params.cursor)
+            # Rows after the cursor, via a function so the row comparison can seek the keyset index
+            source = self.db.rpc('marketplace_templates_after', {
+                'after_download_count': download_count,
+                'after_created_at': created_at,
+                'after_template_id': template_id
+            })
+            # One extra row tells us whether there is a next page
+            query = self._build_marketplace_base_query(filters, source).limit(page_size + 1)
+        else:
+            offset = (pagination_params.page - 1) * page_size
+            query = self._build_marketplace_base_query(filters).range(offset, offset + page_size)
+
+        result, total_items = await asyncio.gather(query.execute(), self._get_marketplace_total(filters))
+
+        rows = result.data or []
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_cursor = None
+        if has_next and self._uses_keyset(filters):
+            next_cursor = self._create_cursor(rows[-1])
+
+        total_pages = (total_items + page_size - 1) // page_size
+
+        return PaginatedResponse(
+            data=self._format_rows(rows),
+            pagination=PaginationMeta(
+                current_page=pagination_params.page,
+                page_size=page_size,
+                total_items=total_items,
+                total_pages=total_pages,
+                has_next=has_next,
+                has_previous=keyset or pagination_params.page > 1,
+                next_cursor=next_cursor
+            )
+        )
+
+    async def _get_marketplace_total(self, filters: MarketplaceFilters) -> int:
+        async def load():
+            count_result = await self._build_marketplace_count_query(filters).execute()
+            return count_result.count or 0
+
+        filter_key = json.dumps({
+            'search': filters.search,
+            'tags': sorted(filters.tags),
+            'is_kortix_team': filters.is_kortix_team,
+            'creator_id': filters.creator_id
+        }, sort_keys=True)
+        cache_key = f"marketplace_total:{hashlib.sha256(filter_key.encode()).hexdigest()[:32]}"
+        return await Cache.get_or_load(cache_key, load, ttl=MARKETPLACE_TOTAL_CACHE_TTL)
+
+    @staticmethod
+    def _home_cache_key(pagination_params: PaginationParams, filters: MarketplaceFilters) -> Optional[str]:
+        if (pagination_params.page != 1 or pagination_params.cursor
+                or filters.search or filters.tags or filters.creator_id is not None):
+            return None
+        return (
+            f"marketplace_home:{filters.is_kortix_team}:{filters.sort_by}:"
+            f"{filters.sort_order}:{pagination_params.page_size}"
+        )
+
+    @staticmethod
+    def _uses_keyset(filters: MarketplaceFilters) -> bool:
+        return filters.sort_by not in ("newest", "name") and not (
+            filters.sort_by == "download_count" and filters.sort_order != "desc"
+        )
+
+    @staticmethod
+    def _create_cursor(row: Dict[str, Any]) -> str:
+        cursor_data = {
+            "download_count": row['download_count'],
+            "created_at": row['created_at'],
+            "id": row['template_id']
+        }
+        return base64.b64encode(json.dumps(cursor_data, sort_keys=True).encode()).decode()
+
+    @staticmethod
+    def _parse_cursor(cursor: str) -> Tuple[int, str, str]:
+        """Decode a marketplace cursor, rejecting anything that isn't safe to put in a filter."""
+        try:
+            cursor_data = json.loads(base64.b64decode(cursor).decode())
+            download_count = int(cursor_data['download_count'])
+            created_at = cursor_data['created_at']
+            datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            template_id = str(uuid.UUID(cursor_data['id']))
+        except Exception:
+            raise ValueError("Invalid cursor")
+        return download_count, created_at, template_id
+
+    @staticmethod
+    def _format_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        from ..template_service import get_template_service
+        from ..utils import format_template_for_response
+        from core.utils.db_helpers import get_initialized_db
+
+        template_service = get_template_service(get_initialized_db())
+        return [format_template_for_response(template_service._map_to_template(row)) for row in rows]
+
     async def get_user_templates_paginated(
         self,
         pagination_params: PaginationParams,
@@ -105,71 +189,34 @@ class MarketplaceService:
     ) -> PaginatedResponse[Dict[str, Any]]:
         try:
             logger.debug(f"Fetching user templates with filters: {filters.__dict__}")
-            
-            from ..template_service import get_template_service
-            from ..utils import format_template_for_response
-            from core.utils.db_helpers import get_initialized_db
-            
+
             if not filters.creator_id:
                 raise ValueError("creator_id is required for user templates")
-            
-            db_connection = get_initialized_db()
-            await db_connection.initialize()
-            template_service = get_template_service(db_connection)
-            
-            all_templates = await template_service.get_user_templates(filters.creator_id)
-
-            filtered_templates = all_templates
-            if filters.search:
-                search_term = filters.search.lower()
-                filtered_templates = [
-                    t for t in filtered_templates 
-                    if (search_term in t.name.lower() if t.name else False)
-                ]
-            
-            if filters.tags:
-                tag_set = set(filters.tags)
-                filtered_templates = [
-                    t for t in filtered_templates 
-                    if tag_set.intersection(set(t.tags or []))
-                ]
-            
-            if filters.sort_by == "name":
-                filtered_templates.sort(key=lambda t: t.name.lower() if t.name else '', 
-                                      reverse=(filters.sort_order == "desc"))
-            elif filters.sort_by == "download_count":
-                filtered_templates.sort(key=lambda t: t.download_count, 
-                                      reverse=(filters.sort_order == "desc"))
-            else:
-                filtered_templates.sort(key=lambda t: t.created_at, 
-                                      reverse=(filters.sort_order == "desc"))
-            
-            total_items = len(filtered_templates)
-            offset = (pagination_params.page - 1) * pagination_params.page_size
-            limit = pagination_params.page_size
-            paginated_templates = filtered_templates[offset:offset + limit]
-            
-            template_responses = []
-            for template in paginated_templates:
-                template_response = format_template_for_response(template)
-                template_responses.append(template_response)
-            
-            total_pages = (total_items + pagination_params.page_size - 1) // pagination_params.page_size
+
+            page_size = pagination_params.page_size
+            offset = (pagination_params.page - 1) * page_size
+            query = self._build_user_templates_base_query(filters).range(offset, offset + page_size - 1)
+            count_query = self._build_user_templates_count_query(filters)
+
+            result, count_result = await asyncio.gather(query.execute(), count_query.execute())
+            total_items = count_result.count or 0
+
+            total_pages = (total_items + page_size - 1) // page_size
             has_next = pagination_params.page < total_pages
             has_previous = pagination_params.page > 1
-            
+
             return PaginatedResponse(
-                data=template_responses,
+                data=self._format_rows(result.data or []),
                 pagination=PaginationMeta(
                     current_page=pagination_params.page,
-                    page_size=pagination_params.page_size,
+                    page_size=page_size,
                     total_items=total_items,
                     total_pages=total_pages,
                     has_next=has_next,
                     has_previous=has_previous
                 )
             )
-                
+
         except Exception as e:
             try:
                 error_str = str(e)
@@ -178,99 +225,78 @@ class MarketplaceService:
             logger.error(f"Error fetching user templates: {error_str}")
             raise
 
-    def _build_marketplace_base_query(self, filters: MarketplaceFilters):
-        query = self.db.table('agent_templates').select('*').eq('is_public', True)
-        
+    def _apply_marketplace_filters(self, query, filters: MarketplaceFilters):
+        query = query.eq('is_public', True)
+
         if filters.search:
             search_term = f"%{filters.search}%"
             query = query.ilike("name", search_term)
-        
+
         if filters.is_kortix_team is not None:
             query = query.eq('is_kortix_team', filters.is_kortix_team)
-            
+
         if filters.creator_id is not None:
             query = query.eq('creator_id', filters.creator_id)
-        
+
         if filters.tags:
-            for tag in filters.tags:
-                query = query.contains('tags', [tag])
-        
-        if filters.sort_by == "download_count":
-            query = query.order('download_count', desc=(filters.sort_order == "desc"))
-            query = query.order('marketplace_published_at', desc=True)
-        elif filters.sort_by == "newest":
+            query = query.contains('tags', filters.tags)
+
+        return query
+
+    def _build_marketplace_base_query(self, filters: MarketplaceFilters, source=None):
+        if source is None:
+            source = self.db.table('agent_templates')
+        query = self._apply_marketplace_filters(source.select(TEMPLATE_LIST_SELECT), filters)
+
+        # template_id last keeps the order total, which offset and keyset paging both need
+        if filters.sort_by == "newest":
             query = query.order('marketplace_published_at', desc=True)
         elif filters.sort_by == "name":
             query = query.order('name', desc=(filters.sort_order == "desc"))
+        elif filters.sort_by == "download_count" and filters.sort_order != "desc":
+            query = query.order('download_count', desc=False)
+            query = query.order('created_at', desc=True)
         else:
             query = query.order('download_count', desc=True)
-            query = query.order('marketplace_published_at', desc=True)
-        
+            query = query.order('created_at', desc=True)
+        query = query.order('template_id', desc=True)
+
         return query
 
     def _build_marketplace_count_query(self, filters: MarketplaceFilters):
-        query = self.db.table('agent_templates').select('*', count='exact').eq('is_public', True)
-        
-        if filters.search:
-            search_term = f"%{filters.search}%"
-            query = query.ilike("name", search_term)
-        
-        if filters.is_kortix_team is not None:
-            query = query.eq('is_kortix_team', filters.is_kortix_team)
-            
-        if filters.creator_id is not None:
-            query = query.eq('creator_id', filters.creator_id)
-            
-        if filters.tags:
-            for tag in filters.tags:
-                query = query.contains('tags', [tag])
-                
-        return query
+        query = self.db.table('agent_templates').select('template_id', count='estimated')
+        return self._apply_marketplace_filters(query, filters).limit(1)
 
-    def _build_user_templates_base_query(self, filters: MarketplaceFilters):
-        query = self.db.table('agent_templates').select('*')
-        
+    def _apply_user_templates_filters(self, query, filters: MarketplaceFilters):
         if filters.creator_id is not None:
             query = query.eq('creator_id', filters.creator_id)
         else:
             raise ValueError("creator_id filter is required for user templates")
-        
+
         if filters.search:
             search_term = f"%{filters.search}%"
             query = query.ilike("name", search_term)
-        
+
         if filters.tags:
-            for tag in filters.tags:
-                query = query.contains('tags', [tag])
-        
+            # Any of the tags, unlike the marketplace which requires all of them
+            query = query.overlaps('tags', filters.tags)
+
+        return query
+
+    def _build_user_templates_base_query(self, filters: MarketplaceFilters):
+        query = self._apply_user_templates_filters(self.db.table('agent_templates').select(TEMPLATE_LIST_SELECT), filters)
+
         if filters.sort_by == "download_count":
             query = query.order('download_count', desc=(filters.sort_order == "desc"))
             query = query.order('created_at', desc=True)
         elif filters.sort_by == "name":
             query = query.order('name', desc=(filters.sort_order == "desc"))
-        elif filters.sort_by == "created_at":
-            query = query.order('created_at', desc=(filters.sort_order == "desc"))
         else:
-            query = query.order('created_at', desc=True)
-        
-        return query
+            query = query.order('created_at', desc=(filters.sort_order == "desc"))
+        query = query.order('template_id', desc=True)
 
-    def _build_user_templates_count_query(self, filters: MarketplaceFilters):
-        query = self.db.table('agent_templates').select('*', count='exact')
-        
-        if filters.creator_id is not None:
-            query = query.eq('creator_id', filters.creator_id)
-        else:
-            raise ValueError("creator_id filter is required for user templates")
-        
-        if filters.search:
-            search_term = f"%{filters.search}%"
-            query = query.ilike("name", search_term)
-            
-        if filters.tags:
-            for tag in filters.tags:
-                query = query.contains('tags', [tag])
-                
         return query
 
- 
\ No newline at end of file
+    def _build_user_templates_count_query(self, filters: MarketplaceFilters):
+        query = self.db.table('agent_templates').select('template_id', count='exact')
+        return self._apply_user_templates_filters(query, filters).limit(1)
@@ -270,7 +270,8 @@ class TemplateService:
     
     async def get_user_templates(self, creator_id: str) -> List[AgentTemplate]:
         client = await self._db.client
-        result = await client.table('agent_templates').select('*')\
+        # creator_name is a computed column over basejump.accounts
+        result = await client.table('agent_templates').select('*, creator_name')\
             .eq('creator_id', creator_id)\
             .order('created_at', desc=True)\
             .execute()
@@ -278,19 +279,7 @@ class TemplateService:
         if not result.data:
             return []
         
-        creator_result = await client.schema('basejump').from_('accounts').select('id, name, slug').eq('id', creator_id).execute()
-        
-        creator_name = None
-        if creator_result.data:
-            account = creator_result.data[0]
-            creator_name = account.get('name') or account.get('slug')
-        
-        templates = []
-        for template_data in result.data:
-            template_data['creator_name'] = creator_name
-            templates.append(self._map_to_template(template_data))
-        
-        return templates
+        return [self._map_to_template(template_data) for template_data in result.data]
     
     async def get_public_templates(
         self,
@@ -302,7 +291,7 @@ class TemplateService:
     ) -> List[AgentTemplate]:
         client = await self._db.client
         
-        query = client.table('agent_templates').select('*').eq('is_public', True)
+        query = client.table('agent_templates').select('*, creator_name').eq('is_public', True)
         
         if is_kortix_team is not None:
             query = query.eq('is_kortix_team', is_kortix_team)
@@ -311,8 +300,7 @@ class TemplateService:
             query = query.ilike("name", f"%{search}%")
         
         if tags:
-            for tag in tags:
-                query = query.contains('tags', [tag])
+            query = query.contains('tags', tags)
         
         query = query.order('download_count', desc=True)\
                     .order('marketplace_published_at', desc=True)
@@ -327,30 +315,7 @@ class TemplateService:
         if not result.data:
             return []
         
-        creator_ids = list(set(template['creator_id'] for template in result.data))
-        
-        from core.utils.query_utils import batch_query_in
-        
-        accounts_data = await batch_query_in(
-            client=client,
-            table_name='accounts',
-            select_fields='id, name, slug',
-            in_field='id',
-            in_values=creator_ids,
-            schema='basejump'
-        )
-        
-        creator_names = {}
-        for account in accounts_data:
-            creator_names[account['id']] = account.get('name') or account.get('slug')
-        
-        templates = []
-        for template_data in result.data:
-            creator_name = creator_names.get(template_data['creator_id'])
-            template_data['creator_name'] = creator_name
-            templates.append(self._map_to_template(template_data))
-        
-        return templates
+        return [self._map_to_template(template_data) for template_data in result.data]
     
     async def publish_template(
         self, 
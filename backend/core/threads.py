@@ -1,4 +1,5 @@
 import json
+import asyncio
 import traceback
 import uuid
 from datetime import datetime, timezone
@@ -7,6 +8,7 @@ from fastapi import APIRouter, HTTPException, Depends, Form, Query, Body
 
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, verify_and_authorize_thread_access, require_thread_access, AuthorizedThreadAccess
 from core.utils.logger import logger
+from core.utils.pagination import PaginationService
 from core.sandbox.sandbox import create_sandbox, delete_sandbox
 
 from .api_models import CreateThreadResponse, MessageCreateRequest
@@ -14,81 +16,77 @@ from . import core_utils as utils
 
 router = APIRouter(tags=["threads"])
 
+# Columns returned by the thread list. metadata is projected through the
+# list_metadata(threads) computed column, which drops the prompt-caching state,
+# and the project comes from the same request as an embedded resource.
+THREAD_LIST_SELECT = (
+    "thread_id, project_id, is_public, created_at, updated_at, metadata:list_metadata, "
+    "project:projects(project_id, name, icon_name, description, sandbox, is_public, created_at, updated_at)"
+)
+
+
+def _parse_thread_cursor(cursor: str) -> tuple:
+    """Decode a thread list cursor into (created_at, thread_id), rejecting anything malformed."""
+    cursor_data = PaginationService.parse_cursor(cursor)
+    try:
+        created_at = cursor_data['sort_value']
+        datetime.fromisoformat(created_at)
+        thread_id = str(uuid.UUID(cursor_data['id']))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, thread_id
+
+
 @router.get("/threads", summary="List User Threads", operation_id="list_user_threads")
 async def get_user_threads(
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
     page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
-    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)")
+    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)"),
+    cursor: Optional[str] = Query(None, description="Cursor from pagination.next_cursor; takes precedence over page")
 ):
-    """Get all threads for the current user with associated project data."""
-    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit})")
+    """Get the current user's threads, newest first, with associated project data.
+
+    Pages are read with keyset pagination on (created_at, thread_id) when a
+    cursor is given, so the cost stays proportional to the page size. The total
+    is a cheap estimate and is only returned for the first request of a listing.
+    """
+    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit}, cursor={bool(cursor)})")
     client = await utils.db.client
     try:
-        offset = (page - 1) * limit
-        
-        # First, get threads for the user
-        threads_result = await client.table('threads').select('*').eq('account_id', user_id).order('created_at', desc=True).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for user: {user_id}")
-            return {
-                "threads": [],
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": 0,
-                    "pages": 0
-                }
-            }
-        
-        total_count = len(threads_result.data)
-        
-        # Apply pagination to threads
-        paginated_threads = threads_result.data[offset:offset + limit]
-        
-        # Extract unique project IDs from threads that have them
-        project_ids = [
-            thread['project_id'] for thread in paginated_threads 
-            if thread.get('project_id')
-        ]
-        unique_project_ids = list(set(project_ids)) if project_ids else []
-        
-        # Fetch projects if we have project IDs
-        projects_by_id = {}
-        if unique_project_ids:
-            from core.utils.query_utils import batch_query_in
-            
-            projects_data = await batch_query_in(
-                client=client,
-                table_name='projects',
-                select_fields='*',
-                in_field='project_id',
-                in_values=unique_project_ids
+        query = client.table('threads').select(THREAD_LIST_SELECT).eq('account_id', user_id)
+
+        if cursor:
+            cursor_created_at, cursor_thread_id = _parse_thread_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{cursor_created_at}",'
+                f'and(created_at.eq."{cursor_created_at}",thread_id.lt.{cursor_thread_id})'
             )
-            
-            logger.debug(f"[API] Retrieved {len(projects_data)} projects")
-            
-            # DEBUG: Log first project to see if icon_name exists
-            if projects_data and len(projects_data) > 0:
-                logger.debug(f"[API] FIRST PROJECT RAW FROM DB: {projects_data[0]}")
-                logger.debug(f"[API] FIRST PROJECT ICON_NAME: {projects_data[0].get('icon_name', 'NOT FOUND')}")
-            
-            # Create a lookup map of projects by ID
-            projects_by_id = {
-                project['project_id']: project 
-                for project in projects_data
-            }
-        
-        # Map threads with their associated projects
+
+        # One extra row tells us whether there is a next page
+        query = query.order('created_at', desc=True).order('thread_id', desc=True)
+        if cursor:
+            query = query.limit(limit + 1)
+        else:
+            offset = (page - 1) * limit
+            query = query.range(offset, offset + limit)
+
+        if cursor:
+            threads_result = await query.execute()
+            total_count = None
+        else:
+            count_query = client.table('threads').select('thread_id', count='estimated').eq('account_id', user_id).limit(1)
+            threads_result, count_result = await asyncio.gather(query.execute(), count_query.execute())
+            total_count = count_result.count or 0
+
+        rows = threads_result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
         mapped_threads = []
-        for thread in paginated_threads:
+        for thread in rows:
+            project = thread.get('project')
             project_data = None
-            if thread.get('project_id') and thread['project_id'] in projects_by_id:
-                project = projects_by_id[thread['project_id']]
-                
-                # DEBUG: Log what we're getting from the project
-                logger.debug(f"[API] Mapping project {project['project_id']}: icon_name = {project.get('icon_name', 'MISSING')}")
-                
+            if project:
                 project_data = {
                     "project_id": project['project_id'],
                     "name": project.get('name', ''),
@@ -99,24 +97,26 @@ async def get_user_threads(
                     "created_at": project['created_at'],
                     "updated_at": project['updated_at']
                 }
-                
-                # DEBUG: Log the mapped project_data
-                logger.debug(f"[API] Mapped project_data: {project_data}")
             
             mapped_thread = {
                 "thread_id": thread['thread_id'],
                 "project_id": thread.get('project_id'),
-                "metadata": thread.get('metadata', {}),
+                "metadata": thread.get('metadata') or {},
                 "is_public": thread.get('is_public', False),
                 "created_at": thread['created_at'],
                 "updated_at": thread['updated_at'],
                 "project": project_data
             }
             mapped_threads.append(mapped_thread)
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = PaginationService.create_cursor(last['thread_id'], 'created_at', last['created_at'])
+
+        total_pages = (total_count + limit - 1) // limit if total_count is not None else None
         
-        total_pages = (total_count + limit - 1) // limit if total_count else 0
-        
-        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads, {len(projects_by_id)} unique projects")
+        logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads (has_more={has_more})")
         
         return {
             "threads": mapped_threads,
@@ -124,10 +124,14 @@ async def get_user_threads(
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "pages": total_pages
+                "pages": total_pages,
+                "has_more": has_more,
+                "next_cursor": next_cursor
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching threads for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch threads: {str(e)}")
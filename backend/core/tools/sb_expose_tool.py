@@ -60,7 +60,7 @@ class SandboxExposeTool(SandboxToolsBase):
                     pass
 
             # Get the preview link for the specified port
-            preview_link = await self.sandbox.get_preview_link(port)
+            preview_link = await self.get_preview_link(port)
             
             # Extract the actual URL from the preview link object
             url = preview_link.url if hasattr(preview_link, 'url') else str(preview_link)
@@ -1,11 +1,11 @@
-import asyncio
 from typing import Optional, Dict, Any
 import time
-import asyncio
+from collections import deque
 from uuid import uuid4
 from core.agentpress.tool import ToolResult, openapi_schema, tool_metadata
 from core.sandbox.tool_base import SandboxToolsBase
 from core.agentpress.thread_manager import ThreadManager
+from core.utils.logger import logger
 
 @tool_metadata(
     display_name="Terminal & Commands",
@@ -20,9 +20,16 @@ class SandboxShellTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities. 
     Uses sessions for maintaining state between commands and provides comprehensive process management."""
 
+    COMMAND_STATE_DIR = "/tmp/.command_state"
+    POLL_INITIAL_WAIT = 0.5  # Seconds the first completion poll waits inside the sandbox
+    POLL_MAX_WAIT = 5.0
+    MAX_OUTPUT_LINES = 2000  # Matches tmux's default scrollback
+    POLL_MAX_BYTES = 256 * 1024  # Most output a single poll downloads; older bytes are skipped
+
     def __init__(self, project_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self._sessions: Dict[str, str] = {}  # Maps session names to session IDs
+        self.remote_calls = 0  # Sandbox API calls made by this tool
 
     async def _ensure_session(self, session_name: str = "default") -> str:
         """Ensure a session exists and return its ID."""
@@ -115,47 +122,58 @@ class SandboxShellTool(SandboxToolsBase):
             wrapped_command = command.replace('"', '\\"')
             
             if blocking:
-                # For blocking execution, use a more reliable approach
-                # Add a unique marker to detect command completion
+                # The command redirects its output to a log file and writes its exit
+                # code and final log size to a marker file when it finishes, so we only
+                # wait on the marker and fetch output we have not seen yet
                 marker = f"COMMAND_DONE_{str(uuid4())[:8]}"
+                log_path = f"{self.COMMAND_STATE_DIR}/{marker}.log"
+                done_path = f"{self.COMMAND_STATE_DIR}/{marker}.done"
                 completion_command = self._format_completion_command(command, marker)
                 wrapped_completion_command = completion_command.replace('"', '\\"')
                 
+                remote_calls_before = self.remote_calls
+                
                 # Send the command with completion marker
                 await self._execute_raw_command(f'tmux send-keys -t {session_name} "{wrapped_completion_command}" Enter')
                 
                 start_time = time.time()
-                final_output = ""
+                output_lines = deque(maxlen=self.MAX_OUTPUT_LINES)
+                partial_line = ""
+                offset = 0
+                exit_code = None
+                wait_seconds = self.POLL_INITIAL_WAIT
                 
-                while (time.time() - start_time) < timeout:
-                    # Wait a shorter interval for more responsive checking
-                    await asyncio.sleep(0.5)
-                    
-                    # Check if session still exists (command might have exited)
-                    check_result = await self._execute_raw_command(f"tmux has-session -t {session_name} 2>/dev/null || echo 'ended'")
-                    if "ended" in check_result.get("output", ""):
+                while True:
+                    remaining = timeout - (time.time() - start_time)
+                    if remaining <= 0:
                         break
-                        
-                    # Get current output and check for our completion marker
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    current_output = output_result.get("output", "")
-
-                    if self._is_command_completed(current_output, marker):
-                        final_output = current_output
+                    status, exit_code, offset, chunk, skipped = await self._poll_command(
+                        session_name, log_path, done_path, offset, min(wait_seconds, remaining)
+                    )
+                    partial_line = self._append_output(output_lines, partial_line, chunk, skipped)
+                    if status != "RUNNING":
                         break
+                    # Adaptive backoff: short commands finish within the first window,
+                    # long ones are checked less often
+                    wait_seconds = min(wait_seconds * 2, self.POLL_MAX_WAIT)
                 
-                # If we didn't get the marker, capture whatever output we have
-                if not final_output:
-                    output_result = await self._execute_raw_command(f"tmux capture-pane -t {session_name} -p -S - -E -")
-                    final_output = output_result.get("output", "")
+                if partial_line:
+                    output_lines.append(partial_line)
+                final_output = "\n".join(output_lines)
                 
-                # Kill the session after capture
-                await self._execute_raw_command(f"tmux kill-session -t {session_name}")
+                # Kill the session after capture and remove the log and marker files
+                await self._execute_raw_command(f"tmux kill-session -t {session_name}; rm -f {log_path} {done_path}")
+                
+                logger.debug(
+                    f"Blocking command in {session_name} finished (exit code {exit_code}) after "
+                    f"{time.time() - start_time:.1f}s with {self.remote_calls - remote_calls_before} remote calls"
+                )
                 
                 return self.success_response({
                     "output": final_output,
                     "session_name": session_name,
                     "cwd": cwd,
+                    "exit_code": exit_code,
                     "completed": True
                 })
             else:
@@ -183,6 +201,8 @@ class SandboxShellTool(SandboxToolsBase):
         """Execute a raw command directly in the sandbox."""
         # Ensure session exists for raw commands
         session_id = await self._ensure_session("raw_commands")
+        # One call to execute the command and one to fetch its logs
+        self.remote_calls += 2
         
         # Execute command in session
         from daytona_sdk import SessionExecuteRequest
@@ -348,96 +368,80 @@ class SandboxShellTool(SandboxToolsBase):
             return self.fail_response(f"Error listing commands: {str(e)}")
 
     def _format_completion_command(self, command: str, marker: str) -> str:
-        """Format command with completion marker, handling heredocs properly."""
+        """Wrap command so its output goes to a log file and completion is recorded in a marker file.
+
+        The marker file contains the exit code and the final size of the log, and is
+        written atomically via a rename so a poll never sees it half written.
+        """
         import re
         
+        log_path = f"{self.COMMAND_STATE_DIR}/{marker}.log"
+        done_path = f"{self.COMMAND_STATE_DIR}/{marker}.done"
+        # $ is escaped because the line passes through one shell before reaching tmux
+        completion = (
+            f"echo \\$? \\$(stat -c %s {log_path} 2>/dev/null || echo 0) > {done_path}.tmp; "
+            f"mv {done_path}.tmp {done_path}"
+        )
+        
         # Check if command contains heredoc syntax
         # Look for patterns like: << EOF, << 'EOF', << "EOF", <<EOF
         heredoc_pattern = r'<<\s*[\'"]?\w+[\'"]?'
         
         if re.search(heredoc_pattern, command):
-            # For heredoc commands, add the completion marker on a new line
+            # For heredoc commands, close the group on a new line
             # This ensures it executes after the heredoc completes
-            return f"{command}\necho {marker}"
+            grouped = f"{{ {command}\n}}"
         else:
-            # For regular commands, use semicolon separator
-            return f"{command} ; echo {marker}"
+            grouped = f"{{ {command} ; }}"
+        return f"mkdir -p {self.COMMAND_STATE_DIR}; {grouped} > {log_path} 2>&1; {completion}"
+
+    async def _poll_command(self, session_name: str, log_path: str, done_path: str, offset: int, wait_seconds: float):
+        """Wait up to wait_seconds inside the sandbox for a command to finish, in one remote call.
 
-    def _is_command_completed(self, current_output: str, marker: str) -> bool:
-        """
-        Check if command execution is completed by comparing marker from end to start.
-        
-        Args:
-            current_output: Current output content
-            marker: Completion marker
-            
         Returns:
-            bool: True if command completed, False otherwise
+            Tuple of (status, exit_code, new_offset, new_output, skipped_bytes) where
+            status is DONE, ENDED (the tmux session exited without finishing) or
+            RUNNING. At most POLL_MAX_BYTES are read; when more was appended since
+            the last poll, only the newest bytes are returned and skipped_bytes
+            counts the rest.
         """
-        if not current_output or not marker:
-            return False
+        ticks = max(1, int(wait_seconds / 0.1))
+        # Print "<status> <exit code> <log size> <read start>", then the bytes from the read start,
+        # which is the last offset unless more than POLL_MAX_BYTES were appended since
+        command = (
+            f"i=0; while [ ! -f {done_path} ] && [ $i -lt {ticks} ]; do sleep 0.1; i=$((i+1)); done; "
+            f"size=$(stat -c %s {log_path} 2>/dev/null || echo 0); "
+            f"start={offset}; if [ $((size - start)) -gt {self.POLL_MAX_BYTES} ]; then start=$((size - {self.POLL_MAX_BYTES})); fi; "
+            f"if [ -f {done_path} ]; then echo DONE $(cut -d \\  -f1 {done_path}) $size $start; "
+            f"elif ! tmux has-session -t {session_name} 2>/dev/null; then echo ENDED - $size $start; "
+            f"else echo RUNNING - $size $start; fi; "
+            f"tail -c +$((start + 1)) {log_path} 2>/dev/null | head -c $((size - start))"
+        )
+        self.remote_calls += 1
+        response = await self.sandbox.process.exec(f"bash -c '{command}'", timeout=int(wait_seconds) + 30)
+        header, _, chunk = (response.result or "").partition("\n")
+        parts = header.split()
+        if len(parts) != 4 or not parts[2].isdigit() or not parts[3].isdigit():
+            return "RUNNING", None, offset, "", 0
+        status, exit_code, size, start = parts
+        exit_code = int(exit_code) if exit_code.lstrip('-').isdigit() else None
+        return status, exit_code, max(offset, int(size)), chunk, max(0, int(start) - offset)
 
-        # Find the last complete marker match position to start comparison
-        # Avoid terminal prompt output at the end
-        marker_end_pos = -1
-        for i in range(len(current_output) - len(marker), -1, -1):
-            if current_output[i:i+len(marker)] == marker:
-                marker_end_pos = i + len(marker) - 1
-                break
-        
-        # Start comparison from found marker position or end of output
-        if marker_end_pos != -1:
-            output_idx = marker_end_pos
-            marker_idx = len(marker) - 1
-        else:
-            output_idx = len(current_output) - 1
-            marker_idx = len(marker) - 1
-        
-        # Compare characters from end to start
-        while marker_idx >= 0 and output_idx >= 0:
-            # Skip newlines in current_output
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            # Compare characters
-            if current_output[output_idx] != marker[marker_idx]:
-                return False
-                
-            # Continue comparison
-            output_idx -= 1
-            marker_idx -= 1
-        
-        # If marker not fully matched
-        if marker_idx >= 0:
-            return False
-            
-        # Check if preceded by "echo " (command just started)
-        check_count = 0
-        echo_chars = "echo "
-        echo_idx = len(echo_chars) - 1
-        
-        while output_idx >= 0 and check_count < 5:
-            # Skip newlines
-            if current_output[output_idx] == '\n':
-                output_idx -= 1
-                continue
-                
-            check_count += 1
-            
-            # Check for "echo " pattern
-            if echo_idx >= 0 and current_output[output_idx] == echo_chars[echo_idx]:
-                echo_idx -= 1
-            else:
-                echo_idx = len(echo_chars) - 1
-                
-            output_idx -= 1
-            
-        # If "echo " found, command just started
-        if echo_idx < 0:
-            return False
-            
-        return True
+    def _append_output(self, lines: deque, partial_line: str, chunk: str, skipped_bytes: int) -> str:
+        """Add a polled chunk to the bounded scrollback and return the unfinished last line."""
+        if skipped_bytes:
+            # The chunk starts somewhere inside a line; drop that fragment
+            if partial_line:
+                lines.append(partial_line)
+            lines.append(f"... [{skipped_bytes} bytes of output skipped] ...")
+            partial_line = ""
+            chunk = chunk.partition("\n")[2]
+        if not chunk:
+            return partial_line
+        new_lines = (partial_line + chunk).split("\n")
+        partial_line = new_lines.pop()
+        lines.extend(new_lines)
+        return partial_line
 
     async def cleanup(self):
         """Clean up all sessions."""
@@ -1,12 +1,20 @@
 from core.agentpress.tool import ToolResult, openapi_schema, tool_metadata
 from core.sandbox.tool_base import SandboxToolsBase
 from core.utils.logger import logger
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from pydantic import BaseModel, Field
+from postgrest.exceptions import APIError
+from dataclasses import dataclass
 from enum import Enum
+import asyncio
 import json
 import uuid
 
+# Delay before persisting, so task list calls made together in one turn share a write
+TASK_LIST_FLUSH_DELAY_SECONDS = 0.05
+TASK_LIST_MAX_WRITE_ATTEMPTS = 3
+UNIQUE_VIOLATION = "23505"
+
 class TaskStatus(str, Enum):
     PENDING = "pending"
     COMPLETED = "completed"
@@ -22,6 +30,27 @@ class Task(BaseModel):
     status: TaskStatus = TaskStatus.PENDING
     section_id: str  # Reference to section ID instead of section name
 
+
+class TaskListError(Exception):
+    """Invalid task list operation; the message is returned to the agent."""
+
+
+class TaskListConflictError(Exception):
+    """The stored task list kept changing underneath us."""
+
+
+@dataclass
+class TaskListState:
+    """A thread's task list as held by the tool, plus where and at which version it is stored."""
+    sections: List[Section]
+    tasks: List[Task]
+    message_id: Optional[str] = None
+    # Version of the stored row; None for rows written before versioning (or no row yet)
+    version: Optional[int] = None
+
+
+Mutation = Callable[[List[Section], List[Task]], Tuple[List[Section], List[Task]]]
+
 @tool_metadata(
     display_name="Task Management",
     description="Create and track your action plan with organized to-do lists",
@@ -44,80 +73,175 @@ class TaskListTool(SandboxToolsBase):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
         self.task_list_message_type = "task_list"
+        # Loaded once per run; every operation after that works on this copy
+        self._state: Optional[TaskListState] = None
+        self._lock = asyncio.Lock()
+        self._pending: List[Mutation] = []
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def _parse_content(content) -> tuple[List[Section], List[Task]]:
+        if isinstance(content, str):
+            content = json.loads(content)
+        
+        sections = [Section(**s) for s in content.get('sections', [])]
+        tasks = [Task(**t) for t in content.get('tasks', [])]
+        
+        # Handle migration from old format
+        if not sections and 'sections' in content:
+            # Create sections from old nested format
+            for old_section in content['sections']:
+                section = Section(title=old_section['title'])
+                sections.append(section)
+                
+                # Update tasks to reference section ID
+                for old_task in old_section.get('tasks', []):
+                    task = Task(
+                        content=old_task['content'],
+                        status=TaskStatus(old_task.get('status', 'pending')),
+                        section_id=section.id
+                    )
+                    if 'id' in old_task:
+                        task.id = old_task['id']
+                    tasks.append(task)
+        
+        return sections, tasks
+    
+    async def _fetch_state(self) -> TaskListState:
+        """Read the latest task list message for the thread"""
+        client = await self.thread_manager.db.client
+        result = await client.table('messages').select('message_id, content, metadata')\
+            .eq('thread_id', self.thread_id)\
+            .eq('type', self.task_list_message_type)\
+            .order('created_at', desc=True).limit(1).execute()
+        
+        if not result.data:
+            return TaskListState(sections=[], tasks=[])
+        
+        row = result.data[0]
+        sections, tasks = self._parse_content(row['content']) if row.get('content') else ([], [])
+        version = (row.get('metadata') or {}).get('version')
+        return TaskListState(
+            sections=sections,
+            tasks=tasks,
+            message_id=row['message_id'],
+            version=int(version) if version is not None else None
+        )
+    
+    async def _get_state(self) -> TaskListState:
+        if self._state is None:
+            self._state = await self._fetch_state()
+        return self._state
     
     async def _load_data(self) -> tuple[List[Section], List[Task]]:
-        """Load sections and tasks from storage"""
+        """Load sections and tasks, from memory after the first read"""
         try:
-            client = await self.thread_manager.db.client
-            result = await client.table('messages').select('*')\
-                .eq('thread_id', self.thread_id)\
-                .eq('type', self.task_list_message_type)\
-                .order('created_at', desc=True).limit(1).execute()
-            
-            if result.data and result.data[0].get('content'):
-                content = result.data[0]['content']
-                if isinstance(content, str):
-                    content = json.loads(content)
-                
-                sections = [Section(**s) for s in content.get('sections', [])]
-                tasks = [Task(**t) for t in content.get('tasks', [])]
-                
-                # Handle migration from old format
-                if not sections and 'sections' in content:
-                    # Create sections from old nested format
-                    for old_section in content['sections']:
-                        section = Section(title=old_section['title'])
-                        sections.append(section)
-                        
-                        # Update tasks to reference section ID
-                        for old_task in old_section.get('tasks', []):
-                            task = Task(
-                                content=old_task['content'],
-                                status=TaskStatus(old_task.get('status', 'pending')),
-                                section_id=section.id
-                            )
-                            if 'id' in old_task:
-                                task.id = old_task['id']
-                            tasks.append(task)
-                
-                return sections, tasks
-            
-            # Return empty lists - no default section
-            return [], []
-            
+            async with self._lock:
+                state = await self._get_state()
+                return self._copy(state.sections, state.tasks)
         except Exception as e:
             logger.error(f"Error loading data: {e}")
             return [], []
     
-    async def _save_data(self, sections: List[Section], tasks: List[Task]):
-        """Save sections and tasks to storage"""
+    @staticmethod
+    def _copy(sections: List[Section], tasks: List[Task]) -> tuple[List[Section], List[Task]]:
+        return [s.model_copy() for s in sections], [t.model_copy() for t in tasks]
+    
+    async def _apply(self, mutate: Mutation) -> tuple[List[Section], List[Task]]:
+        """Apply an operation to the in-memory task list and wait until it is stored.
+        
+        Operations arriving within TASK_LIST_FLUSH_DELAY_SECONDS of each other are
+        stored with one write. Raises TaskListError if the operation is invalid.
+        """
+        async with self._lock:
+            state = await self._get_state()
+            sections, tasks = mutate(*self._copy(state.sections, state.tasks))
+            state.sections, state.tasks = sections, tasks
+            self._pending.append(mutate)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+            flush_task = self._flush_task
+            result = self._copy(sections, tasks)
+        
+        await asyncio.shield(flush_task)
+        return result
+    
+    async def _flush(self):
+        await asyncio.sleep(TASK_LIST_FLUSH_DELAY_SECONDS)
+        async with self._lock:
+            # Operations applied from here on belong to the next write
+            self._flush_task = None
+            pending, self._pending = self._pending, []
+            state = self._state
+            
+            for attempt in range(TASK_LIST_MAX_WRITE_ATTEMPTS):
+                try:
+                    stored = await self._write_state(state)
+                except Exception:
+                    # The in-memory list is ahead of storage; reload on the next operation
+                    self._state = None
+                    raise
+                if stored:
+                    return
+                # Someone else (another run on this thread) stored a newer version:
+                # start from theirs and re-apply this batch of operations
+                logger.info(f"Task list for thread {self.thread_id} changed concurrently, re-applying {len(pending)} operations")
+                state = await self._fetch_state()
+                for mutate in pending:
+                    try:
+                        state.sections, state.tasks = mutate(*self._copy(state.sections, state.tasks))
+                    except TaskListError as e:
+                        logger.warning(f"Dropping task list operation that no longer applies: {e}")
+                self._state = state
+            
+            # Drop the local copy so the next operation starts from the stored list
+            self._state = None
+            raise TaskListConflictError("Task list was modified concurrently, please retry")
+    
+    async def _write_state(self, state: TaskListState) -> bool:
+        """Store state if the row is still at state.version.
+        
+        Returns False on a version conflict, or when another run inserted the
+        thread's task list after we found none.
+        """
+        client = await self.thread_manager.db.client
+        
+        content = {
+            'sections': [section.model_dump() for section in state.sections],
+            'tasks': [task.model_dump() for task in state.tasks]
+        }
+        new_version = (state.version or 0) + 1
+        metadata = {'version': new_version}
+        
         try:
-            client = await self.thread_manager.db.client
-            
-            content = {
-                'sections': [section.model_dump() for section in sections],
-                'tasks': [task.model_dump() for task in tasks]
-            }
-            
-            # Find existing message
-            result = await client.table('messages').select('message_id')\
-                .eq('thread_id', self.thread_id)\
-                .eq('type', self.task_list_message_type)\
-                .order('created_at', desc=True).limit(1).execute()
-            
-            if result.data:
-                # Update existing
-                await client.table('messages').update({'content': content})\
-                    .eq('message_id', result.data[0]['message_id']).execute()
+            if state.message_id:
+                query = client.table('messages').update({'content': content, 'metadata': metadata})\
+                    .eq('message_id', state.message_id)
+                if state.version is None:
+                    query = query.is_('metadata->>version', 'null')
+                else:
+                    query = query.eq('metadata->>version', str(state.version))
+                result = await query.execute()
+                if not result.data:
+                    return False
             else:
-                # Create new
-                await client.table('messages').insert({
-                    'thread_id': self.thread_id,
-                    'type': self.task_list_message_type,
-                    'content': content,
-                    'is_llm_message': False,
-                    'metadata': {}
-                }).execute()
+                try:
+                    result = await client.table('messages').insert({
+                        'thread_id': self.thread_id,
+                        'type': self.task_list_message_type,
+                        'content': content,
+                        'is_llm_message': False,
+                        'metadata': metadata
+                    }).execute()
+                except APIError as e:
+                    # idx_messages_thread_task_list: another run created the thread's task list first
+                    if e.code == UNIQUE_VIOLATION:
+                        return False
+                    raise
+                state.message_id = result.data[0]['message_id']
+            
+            state.version = new_version
+            return True
             
         except Exception as e:
             logger.error(f"Error saving data: {e}")
@@ -238,8 +362,13 @@ class TaskListTool(SandboxToolsBase):
                           section_title: Optional[str] = None, section_id: Optional[str] = None,
                           task_contents: Optional[List[str]] = None) -> ToolResult:
         """Create tasks - supports both batch multi-section and single section creation"""
-        try:
-            existing_sections, existing_tasks = await self._load_data()
+        # New ids are generated once so re-applying after a write conflict keeps them stable
+        new_ids: Dict[tuple, str] = {}
+        
+        def new_id(*key) -> str:
+            return new_ids.setdefault(key, str(uuid.uuid4()))
+        
+        def mutate(existing_sections: List[Section], existing_tasks: List[Task]):
             section_map = {s.id: s for s in existing_sections}
             title_map = {s.title.lower(): s for s in existing_sections}
             
@@ -248,7 +377,7 @@ class TaskListTool(SandboxToolsBase):
             
             if sections:
                 # Batch creation across multiple sections
-                for section_data in sections:
+                for section_index, section_data in enumerate(sections):
                     section_title_input = section_data["title"]
                     task_list = section_data["tasks"]
                     
@@ -257,55 +386,60 @@ class TaskListTool(SandboxToolsBase):
                     if title_lower in title_map:
                         target_section = title_map[title_lower]
                     else:
-                        target_section = Section(title=section_title_input)
+                        target_section = Section(id=new_id('section', title_lower), title=section_title_input)
                         existing_sections.append(target_section)
                         title_map[title_lower] = target_section
                         created_sections += 1
                     
                     # Create tasks in this section
-                    for task_content in task_list:
-                        new_task = Task(content=task_content, section_id=target_section.id)
+                    for task_index, task_content in enumerate(task_list):
+                        new_task = Task(id=new_id('task', section_index, task_index), content=task_content, section_id=target_section.id)
                         existing_tasks.append(new_task)
                         created_tasks += 1
-                        
+            
             else:
                 # Single section creation - require explicit section specification
                 if not task_contents:
-                    return ToolResult(success=False, output="❌ Must provide either 'sections' array or 'task_contents' with section info")
+                    raise TaskListError("❌ Must provide either 'sections' array or 'task_contents' with section info")
                 
                 if not section_id and not section_title:
-                    return ToolResult(success=False, output="❌ Must specify either 'section_id' or 'section_title' when using 'task_contents'")
+                    raise TaskListError("❌ Must specify either 'section_id' or 'section_title' when using 'task_contents'")
                 
                 target_section = None
                 
                 if section_id:
                     # Use existing section ID
                     if section_id not in section_map:
-                        return ToolResult(success=False, output=f"❌ Section ID '{section_id}' not found")
+                        raise TaskListError(f"❌ Section ID '{section_id}' not found")
                     target_section = section_map[section_id]
-                    
+                
                 elif section_title:
                     # Find or create section by title
                     title_lower = section_title.lower()
                     if title_lower in title_map:
                         target_section = title_map[title_lower]
                     else:
-                        target_section = Section(title=section_title)
+                        target_section = Section(id=new_id('section', title_lower), title=section_title)
                         existing_sections.append(target_section)
                         created_sections += 1
                 
                 # Create tasks
-                for content in task_contents:
-                    new_task = Task(content=content, section_id=target_section.id)
+                for task_index, content in enumerate(task_contents):
+                    new_task = Task(id=new_id('task', task_index), content=content, section_id=target_section.id)
                     existing_tasks.append(new_task)
                     created_tasks += 1
             
-            await self._save_data(existing_sections, existing_tasks)
+            return existing_sections, existing_tasks
+        
+        try:
+            existing_sections, existing_tasks = await self._apply(mutate)
             
             response_data = self._format_response(existing_sections, existing_tasks)
             
             return ToolResult(success=True, output=json.dumps(response_data, indent=2))
             
+        except TaskListError as e:
+            return ToolResult(success=False, output=str(e))
         except Exception as e:
             logger.error(f"Error creating tasks: {e}")
             return ToolResult(success=False, output=f"❌ Error creating tasks: {str(e)}")
@@ -353,39 +487,40 @@ class TaskListTool(SandboxToolsBase):
             else:
                 target_task_ids = task_ids
             
-            sections, tasks = await self._load_data()
-            section_map = {s.id: s for s in sections}
-            task_map = {t.id: t for t in tasks}
-            
-            # Validate all task IDs exist
-            missing_tasks = [tid for tid in target_task_ids if tid not in task_map]
-            if missing_tasks:
-                return ToolResult(success=False, output=f"❌ Task IDs not found: {missing_tasks}")
-            
-            # Validate section ID if provided
-            if section_id and section_id not in section_map:
-                return ToolResult(success=False, output=f"❌ Section ID '{section_id}' not found")
-            
-            # Apply updates
-            updated_count = 0
-            for tid in target_task_ids:
-                task = task_map[tid]
+            def mutate(sections: List[Section], tasks: List[Task]):
+                section_map = {s.id: s for s in sections}
+                task_map = {t.id: t for t in tasks}
                 
-                if content is not None:
-                    task.content = content
-                if status is not None:
-                    task.status = TaskStatus(status)
-                if section_id is not None:
-                    task.section_id = section_id
+                # Validate all task IDs exist
+                missing_tasks = [tid for tid in target_task_ids if tid not in task_map]
+                if missing_tasks:
+                    raise TaskListError(f"❌ Task IDs not found: {missing_tasks}")
                 
-                updated_count += 1
+                # Validate section ID if provided
+                if section_id and section_id not in section_map:
+                    raise TaskListError(f"❌ Section ID '{section_id}' not found")
+                
+                # Apply updates
+                for tid in target_task_ids:
+                    task = task_map[tid]
+                    
+                    if content is not None:
+                        task.content = content
+                    if status is not None:
+                        task.status = TaskStatus(status)
+                    if section_id is not None:
+                        task.section_id = section_id
+                
+                return sections, tasks
             
-            await self._save_data(sections, tasks)
+            sections, tasks = await self._apply(mutate)
             
             response_data = self._format_response(sections, tasks)
             
             return ToolResult(success=True, output=json.dumps(response_data, indent=2))
             
+        except TaskListError as e:
+            return ToolResult(success=False, output=str(e))
         except Exception as e:
             logger.error(f"Error updating tasks: {e}")
             return ToolResult(success=False, output=f"❌ Error updating tasks: {str(e)}")
@@ -435,57 +570,61 @@ class TaskListTool(SandboxToolsBase):
             if section_ids and not confirm:
                 return ToolResult(success=False, output="❌ Must set confirm=true to delete sections")
             
-            sections, tasks = await self._load_data()
-            section_map = {s.id: s for s in sections}
-            task_map = {t.id: t for t in tasks}
-            
-            # Process task deletions
-            deleted_tasks = 0
-            remaining_tasks = tasks.copy()
-            if task_ids:
-                # Normalize task_ids to always be a list
-                if isinstance(task_ids, str):
-                    target_task_ids = [task_ids]
-                else:
-                    target_task_ids = task_ids
-                
-                # Validate all task IDs exist
-                missing_tasks = [tid for tid in target_task_ids if tid not in task_map]
-                if missing_tasks:
-                    return ToolResult(success=False, output=f"❌ Task IDs not found: {missing_tasks}")
+            def mutate(sections: List[Section], tasks: List[Task]):
+                section_map = {s.id: s for s in sections}
+                task_map = {t.id: t for t in tasks}
                 
-                # Remove tasks
-                task_id_set = set(target_task_ids)
-                remaining_tasks = [task for task in tasks if task.id not in task_id_set]
-                deleted_tasks = len(tasks) - len(remaining_tasks)
-            
-            # Process section deletions
-            deleted_sections = 0
-            remaining_sections = sections.copy()
-            if section_ids:
-                # Normalize section_ids to always be a list
-                if isinstance(section_ids, str):
-                    target_section_ids = [section_ids]
-                else:
-                    target_section_ids = section_ids
+                # Process task deletions
+                deleted_tasks = 0
+                remaining_tasks = tasks.copy()
+                if task_ids:
+                    # Normalize task_ids to always be a list
+                    if isinstance(task_ids, str):
+                        target_task_ids = [task_ids]
+                    else:
+                        target_task_ids = task_ids
+                    
+                    # Validate all task IDs exist
+                    missing_tasks = [tid for tid in target_task_ids if tid not in task_map]
+                    if missing_tasks:
+                        raise TaskListError(f"❌ Task IDs not found: {missing_tasks}")
+                    
+                    # Remove tasks
+                    task_id_set = set(target_task_ids)
+                    remaining_tasks = [task for task in tasks if task.id not in task_id_set]
+                    deleted_tasks = len(tasks) - len(remaining_tasks)
                 
-                # Validate all section IDs exist
-                missing_sections = [sid for sid in target_section_ids if sid not in section_map]
-                if missing_sections:
-                    return ToolResult(success=False, output=f"❌ Section IDs not found: {missing_sections}")
+                # Process section deletions
+                deleted_sections = 0
+                remaining_sections = sections.copy()
+                if section_ids:
+                    # Normalize section_ids to always be a list
+                    if isinstance(section_ids, str):
+                        target_section_ids = [section_ids]
+                    else:
+                        target_section_ids = section_ids
+                    
+                    # Validate all section IDs exist
+                    missing_sections = [sid for sid in target_section_ids if sid not in section_map]
+                    if missing_sections:
+                        raise TaskListError(f"❌ Section IDs not found: {missing_sections}")
+                    
+                    # Remove sections and their tasks
+                    section_id_set = set(target_section_ids)
+                    remaining_sections = [s for s in sections if s.id not in section_id_set]
+                    remaining_tasks = [t for t in remaining_tasks if t.section_id not in section_id_set]
+                    deleted_sections = len(sections) - len(remaining_sections)
                 
-                # Remove sections and their tasks
-                section_id_set = set(target_section_ids)
-                remaining_sections = [s for s in sections if s.id not in section_id_set]
-                remaining_tasks = [t for t in remaining_tasks if t.section_id not in section_id_set]
-                deleted_sections = len(sections) - len(remaining_sections)
+                return remaining_sections, remaining_tasks
             
-            await self._save_data(remaining_sections, remaining_tasks)
+            remaining_sections, remaining_tasks = await self._apply(mutate)
             
             response_data = self._format_response(remaining_sections, remaining_tasks)
             
             return ToolResult(success=True, output=json.dumps(response_data, indent=2))
             
+        except TaskListError as e:
+            return ToolResult(success=False, output=str(e))
         except Exception as e:
             logger.error(f"Error deleting tasks/sections: {e}")
             return ToolResult(success=False, output=f"❌ Error deleting tasks/sections: {str(e)}")
@@ -514,10 +653,7 @@ class TaskListTool(SandboxToolsBase):
                 return ToolResult(success=False, output="❌ Must set confirm=true to clear all data")
             
             # Create completely empty state - no default section
-            sections = []
-            tasks = []
-            
-            await self._save_data(sections, tasks)
+            sections, tasks = await self._apply(lambda sections, tasks: ([], []))
             
             response_data = self._format_response(sections, tasks)
             
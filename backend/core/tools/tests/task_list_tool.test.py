@@ -0,0 +1,207 @@
+import asyncio
+import copy
+import itertools
+import json
+import uuid
+
+import pytest
+from postgrest.exceptions import APIError
+
+from core.tools.task_list_tool import TaskListTool, TaskStatus
+
+THREAD_ID = "thread-1"
+
+
+class FakeQuery:
+    """The slice of the PostgREST query builder TaskListTool uses, against in-memory rows."""
+
+    def __init__(self, table: "FakeMessagesTable", action: str, payload=None):
+        self.table = table
+        self.action = action
+        self.payload = payload
+        self.filters = []
+        self.ordering = []
+        self.row_limit = None
+
+    def select(self, columns: str):
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append((column, lambda actual: actual is not None and str(actual) == str(value)))
+        return self
+
+    def is_(self, column: str, value: str):
+        assert value == "null"
+        self.filters.append((column, lambda actual: actual is None))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def _matches(self, row) -> bool:
+        return all(check(self.table.column(row, column)) for column, check in self.filters)
+
+    async def execute(self):
+        # Yield like a network round trip so concurrent runs interleave
+        await asyncio.sleep(0)
+        self.table.calls.append(self.action)
+        if self.action == "insert":
+            return type("Response", (), {"data": [self.table.insert(self.payload)]})
+        rows = [row for row in self.table.rows if self._matches(row)]
+        if self.action == "update":
+            for row in rows:
+                row.update(copy.deepcopy(self.payload))
+        for column, desc in reversed(self.ordering):
+            rows.sort(key=lambda row: row[column], reverse=desc)
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        return type("Response", (), {"data": copy.deepcopy(rows)})
+
+
+class FakeMessagesTable:
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self._clock = itertools.count()
+
+    @staticmethod
+    def column(row, column: str):
+        if column == "metadata->>version":
+            version = (row.get("metadata") or {}).get("version")
+            return None if version is None else str(version)
+        return row.get(column)
+
+    def insert(self, payload):
+        # idx_messages_thread_task_list
+        if payload["type"] == "task_list" and any(
+            row["thread_id"] == payload["thread_id"] and row["type"] == "task_list" for row in self.rows
+        ):
+            raise APIError({
+                "code": "23505",
+                "message": 'duplicate key value violates unique constraint "idx_messages_thread_task_list"',
+                "details": None,
+                "hint": None,
+            })
+        row = copy.deepcopy(payload)
+        row["message_id"] = str(uuid.uuid4())
+        row["created_at"] = next(self._clock)
+        self.rows.append(row)
+        return copy.deepcopy(row)
+
+
+class FakeClient:
+    def __init__(self):
+        self.messages = FakeMessagesTable()
+
+    def table(self, name: str):
+        assert name == "messages"
+        return FakeTable(self.messages)
+
+
+class FakeTable:
+    def __init__(self, messages: FakeMessagesTable):
+        self.messages = messages
+
+    def select(self, columns: str):
+        return FakeQuery(self.messages, "select")
+
+    def update(self, payload):
+        return FakeQuery(self.messages, "update", payload)
+
+    def insert(self, payload):
+        return FakeQuery(self.messages, "insert", payload)
+
+
+class FakeDBConnection:
+    def __init__(self, client: FakeClient):
+        self._client = client
+
+    @property
+    async def client(self):
+        return self._client
+
+
+class FakeThreadManager:
+    def __init__(self, db: FakeDBConnection):
+        self.db = db
+
+
+class TestTaskListConcurrentRuns:
+    """Two agent runs on the same thread, each with its own TaskListTool."""
+
+    @pytest.fixture
+    def client(self):
+        return FakeClient()
+
+    def _run_tool(self, client: FakeClient) -> TaskListTool:
+        return TaskListTool("project-1", FakeThreadManager(FakeDBConnection(client)), THREAD_ID)
+
+    def _task_list_rows(self, client: FakeClient):
+        return [row for row in client.messages.rows if row["type"] == "task_list"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_first_insert_race_keeps_one_task_list(self, client):
+        first, second = self._run_tool(client), self._run_tool(client)
+
+        results = await asyncio.gather(
+            first.create_tasks(section_title="Research", task_contents=["Find sources", "Summarize"]),
+            second.create_tasks(section_title="Build", task_contents=["Write code"]),
+        )
+
+        assert all(result.success for result in results)
+        rows = self._task_list_rows(client)
+        assert len(rows) == 1
+        assert rows[0]["metadata"]["version"] == 2
+        stored = json.loads(json.dumps(rows[0]["content"]))
+        assert sorted(section["title"] for section in stored["sections"]) == ["Build", "Research"]
+        assert sorted(task["content"] for task in stored["tasks"]) == ["Find sources", "Summarize", "Write code"]
+
+        # The losing run re-applied its operation on the stored list and kept its task ids
+        sections, tasks = await second._load_data()
+        assert {task.content for task in tasks} == {"Find sources", "Summarize", "Write code"}
+        assert {task["id"] for task in stored["tasks"]} == {task.id for task in tasks}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_updates_are_both_stored(self, client):
+        setup = self._run_tool(client)
+        await setup.create_tasks(section_title="Plan", task_contents=["One", "Two"])
+        _, tasks = await setup._load_data()
+        first_id, second_id = (task.id for task in tasks)
+
+        first, second = self._run_tool(client), self._run_tool(client)
+        # Both runs load version 1 before either writes
+        await asyncio.gather(first._load_data(), second._load_data())
+        results = await asyncio.gather(
+            first.update_tasks(first_id, status="completed"),
+            second.update_tasks(second_id, status="cancelled"),
+        )
+
+        assert all(result.success for result in results)
+        rows = self._task_list_rows(client)
+        assert len(rows) == 1
+        assert rows[0]["metadata"]["version"] == 3
+        statuses = {task["id"]: task["status"] for task in rows[0]["content"]["tasks"]}
+        assert statuses == {first_id: TaskStatus.COMPLETED.value, second_id: TaskStatus.CANCELLED.value}
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_operations_in_one_turn_share_a_write(self, client):
+        tool = self._run_tool(client)
+
+        await asyncio.gather(
+            tool.create_tasks(section_title="Plan", task_contents=["One"]),
+            tool.create_tasks(section_title="Plan", task_contents=["Two"]),
+            tool.view_tasks(),
+        )
+
+        assert client.messages.calls.count("insert") == 1
+        assert client.messages.calls.count("update") == 0
+        rows = self._task_list_rows(client)
+        assert [task["content"] for task in rows[0]["content"]["tasks"]] == ["One", "Two"]
@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import anyio
+import httpx
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from core.utils.logger import logger
+
+
+MCP_SESSION_IDLE_TIMEOUT = float(os.getenv("MCP_SESSION_IDLE_TIMEOUT", "300"))
+MCP_SESSION_HEALTH_INTERVAL = float(os.getenv("MCP_SESSION_HEALTH_INTERVAL", "60"))
+MCP_SESSION_MAX_CONCURRENCY = int(os.getenv("MCP_SESSION_MAX_CONCURRENCY", "4"))
+MCP_SESSION_CONNECT_TIMEOUT = float(os.getenv("MCP_SESSION_CONNECT_TIMEOUT", "15"))
+
+# Errors that mean the underlying stream is gone rather than the call itself failing
+CONNECTION_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+    ConnectionError,
+)
+
+SessionKey = Tuple[str, str, str]
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    return isinstance(error, McpError) and "connection closed" in str(error).lower()
+
+
+def session_key(transport: str, url: str, headers: Optional[Dict[str, str]] = None) -> SessionKey:
+    headers_hash = hashlib.sha256(json.dumps(headers or {}, sort_keys=True).encode('utf-8')).hexdigest()
+    return (transport, url, headers_hash)
+
+
+class PooledMCPSession:
+    """An initialized MCP ClientSession kept open by a dedicated owner task.
+
+    The MCP transports are anyio context managers that must be exited by the task
+    that entered them, so each session lives inside its own task and callers only
+    use the ClientSession, which is safe to share between tasks on the same loop.
+    """
+
+    def __init__(self, transport: str, url: str, headers: Optional[Dict[str, str]], max_concurrency: int):
+        self.transport = transport
+        self.url = url
+        self.headers = headers or {}
+        self.session: Optional[ClientSession] = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self._ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Nobody awaits the future once start() has given up, so always retrieve its exception
+        self._ready.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self, timeout: float = MCP_SESSION_CONNECT_TIMEOUT):
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout=timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    def _open_transport(self):
+        if self.transport == 'sse':
+            try:
+                return sse_client(self.url, headers=self.headers)
+            except TypeError as e:
+                if "unexpected keyword argument" in str(e):
+                    return sse_client(self.url)
+                raise
+        if self.headers:
+            return streamablehttp_client(self.url, headers=self.headers)
+        return streamablehttp_client(self.url)
+
+    async def _run(self):
+        try:
+            async with self._open_transport() as streams:
+                read, write = streams[0], streams[1]
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set_result(True)
+                    await self._stop.wait()
+        except asyncio.CancelledError:
+            if not self._ready.done():
+                self._ready.set_exception(ConnectionError(f"MCP session to {self.url} was cancelled"))
+            raise
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                logger.debug(f"MCP {self.transport} session to {self.url} closed: {e}")
+        finally:
+            self.session = None
+
+    async def ping(self, timeout: float = 5.0) -> bool:
+        if not self.is_alive:
+            return False
+        try:
+            async with asyncio.timeout(timeout):
+                await self.session.send_ping()
+            return True
+        except Exception as e:
+            logger.debug(f"MCP health ping to {self.url} failed: {e}")
+            return False
+
+    async def close(self):
+        self._stop.set()
+        if self._task and not self._task.done():
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+        self.session = None
+
+
+class MCPSessionPool:
+    """Per-process pool of initialized MCP client sessions keyed by (transport, url, headers hash).
+
+    Sessions are created single-flight, reused across tool calls and tool listings,
+    capped at max_concurrency in-flight requests per server, pinged periodically,
+    evicted after idle_timeout and reconnected when their stream breaks. A tool call
+    is only retried on a new session if it never reached the broken one.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = MCP_SESSION_IDLE_TIMEOUT,
+        health_interval: float = MCP_SESSION_HEALTH_INTERVAL,
+        max_concurrency: int = MCP_SESSION_MAX_CONCURRENCY
+    ):
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.max_concurrency = max_concurrency
+        self._sessions: Dict[SessionKey, PooledMCPSession] = {}
+        self._locks: Dict[SessionKey, asyncio.Lock] = {}
+        self._janitor: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sessions_created = 0
+        self.sessions_reused = 0
+        self.reconnects = 0
+
+    def _bind_loop(self):
+        # Sessions belong to the loop that opened them; start over if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sessions = {}
+            self._locks = {}
+            self._janitor = None
+        if self._janitor is None or self._janitor.done():
+            self._janitor = asyncio.create_task(self._maintain())
+
+    async def _get_session(self, transport: str, url: str, headers: Optional[Dict[str, str]]) -> Tuple[PooledMCPSession, bool]:
+        self._bind_loop()
+        key = session_key(transport, url, headers)
+
+        pooled = self._sessions.get(key)
+        if pooled and pooled.is_alive:
+            self.sessions_reused += 1
+            return pooled, True
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pooled = self._sessions.get(key)
+            if pooled and pooled.is_alive:
+                self.sessions_reused += 1
+                return pooled, True
+            if pooled:
+                self._sessions.pop(key, None)
+                await pooled.close()
+
+            pooled = PooledMCPSession(transport, url, headers, self.max_concurrency)
+            await pooled.start()
+            self._sessions[key] = pooled
+            self.sessions_created += 1
+            logger.debug(f"Opened pooled MCP {transport} session to {url} ({len(self._sessions)} open)")
+            return pooled, False
+
+    async def _discard(self, key: SessionKey, pooled: PooledMCPSession):
+        # Only drop the entry if another caller has not already replaced it
+        if self._sessions.get(key) is pooled:
+            self._sessions.pop(key, None)
+        await pooled.close()
+
+    async def _with_session(self, transport: str, url: str, headers: Optional[Dict[str, str]], operation, retry_after_send: bool):
+        key = session_key(transport, url, headers)
+        pooled, reused = await self._get_session(transport, url, headers)
+        for attempt in range(2):
+            sent = False
+            try:
+                async with pooled.semaphore:
+                    pooled.in_flight += 1
+                    try:
+                        if not pooled.is_alive:
+                            raise anyio.ClosedResourceError()
+                        sent = True
+                        return await operation(pooled.session)
+                    finally:
+                        pooled.in_flight -= 1
+                        pooled.last_used = time.monotonic()
+            except Exception as e:
+                if not is_connection_error(e) and pooled.is_alive:
+                    raise
+                # A reused session whose stream broke: reconnect once, a fresh one failing is a real error.
+                # Once the request was written the server may have run it, so only safe operations go again.
+                if attempt > 0 or not reused or (sent and not retry_after_send):
+                    await self._discard(key, pooled)
+                    raise
+                logger.debug(f"Pooled MCP session to {url} broke ({type(e).__name__}), reconnecting")
+                self.reconnects += 1
+                await self._discard(key, pooled)
+                pooled, reused = await self._get_session(transport, url, headers)
+
+    async def call_tool(self, transport: str, url: str, tool_name: str, arguments: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        # Tools may have side effects (send an email, create an issue), so a call is never repeated
+        return await self._with_session(
+            transport, url, headers, lambda session: session.call_tool(tool_name, arguments), retry_after_send=False
+        )
+
+    async def list_tools(self, transport: str, url: str, headers: Optional[Dict[str, str]] = None):
+        return await self._with_session(transport, url, headers, lambda session: session.list_tools(), retry_after_send=True)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                now = time.monotonic()
+                for key, pooled in list(self._sessions.items()):
+                    if pooled.in_flight:
+                        continue
+                    if now - pooled.last_used > self.idle_timeout:
+                        reason = "idle"
+                    elif not await pooled.ping():
+                        reason = "failed health ping"
+                    else:
+                        continue
+                    await self._discard(key, pooled)
+                    logger.debug(f"Closed pooled MCP session to {pooled.url} ({reason})")
+            except Exception as e:
+                logger.warning(f"MCP session pool maintenance failed: {e}")
+
+    async def close_all(self):
+        sessions = list(self._sessions.values())
+        self._sessions = {}
+        for pooled in sessions:
+            await pooled.close()
+        if self._janitor and not self._janitor.done():
+            self._janitor.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_sessions": len(self._sessions),
+            "sessions_created": self.sessions_created,
+            "sessions_reused": self.sessions_reused,
+            "reconnects": self.reconnects,
+        }
+
+
+mcp_session_pool = MCPSessionPool()
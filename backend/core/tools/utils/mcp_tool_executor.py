@@ -3,10 +3,9 @@ import asyncio
 from typing import Dict, Any
 from core.agentpress.tool import ToolResult
 from mcp import ClientSession, StdioServerParameters
-from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
-from mcp.client.streamable_http import streamablehttp_client
 from core.mcp_module import mcp_service
+from core.tools.utils.mcp_session_pool import mcp_session_pool
 from core.utils.logger import logger
 
 
@@ -84,22 +83,8 @@ class MCPToolExecutor:
         headers = custom_config.get('headers', {})
         
         async with asyncio.timeout(30):
-            try:
-                async with sse_client(url, headers=headers) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
-                        
-            except TypeError as e:
-                if "unexpected keyword argument" in str(e):
-                    async with sse_client(url) as (read, write):
-                        async with ClientSession(read, write) as session:
-                            await session.initialize()
-                            result = await session.call_tool(original_tool_name, arguments)
-                            return self._create_success_result(self._extract_content(result))
-                else:
-                    raise
+            result = await mcp_session_pool.call_tool('sse', url, original_tool_name, arguments, headers=headers)
+            return self._create_success_result(self._extract_content(result))
     
     async def _execute_http_tool(self, tool_name: str, arguments: Dict[str, Any], tool_info: Dict[str, Any]) -> ToolResult:
         custom_config = tool_info['custom_config']
@@ -109,11 +94,8 @@ class MCPToolExecutor:
         
         try:
             async with asyncio.timeout(30):
-                async with streamablehttp_client(url) as (read, write, _):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        result = await session.call_tool(original_tool_name, arguments)
-                        return self._create_success_result(self._extract_content(result))
+                result = await mcp_session_pool.call_tool('http', url, original_tool_name, arguments)
+                return self._create_success_result(self._extract_content(result))
                         
         except Exception as e:
             logger.error(f"Error executing HTTP MCP tool: {str(e)}")
@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 from typing import Dict, Any, Tuple, Optional
 
 from core.services.supabase import DBConnection
-from core.services import redis
+from core.services.active_runs import register_active_run
+from core.services.run_index import mark_run_active
 from core.utils.logger import logger, structlog
 from core.utils.config import config, EnvMode
 from run_agent_background import run_agent_background
@@ -358,6 +359,7 @@ class AgentExecutor:
         agent_run_id = agent_run.data[0]['id']
         
         await self._register_agent_run(agent_run_id)
+        await register_active_run(account_id, agent_run_id, thread_id)
         
         run_agent_background.send(
             agent_run_id=agent_run_id,
@@ -374,8 +376,7 @@ class AgentExecutor:
     
     async def _register_agent_run(self, agent_run_id: str) -> None:
         try:
-            instance_key = f"active_run:trigger_executor:{agent_run_id}"
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await mark_run_active("trigger_executor", agent_run_id)
         except Exception as e:
             logger.warning(f"Failed to register agent run in Redis: {e}")
 
@@ -1,26 +1,266 @@
+"""
+Two-tier cache: a per-process LRU (L1) in front of Redis (L2).
+
+- L1 holds the serialized value for at most CACHE_L1_TTL_SECONDS (never longer
+  than the entry's own TTL), so hot keys skip the Redis round trip.
+- get_or_load() coalesces concurrent misses on a key into one loader call
+  and caches None results for a short negative TTL.
+- set() and invalidate() publish the key on CACHE_INVALIDATION_CHANNEL; every
+  process evicts it from its L1. If a message is missed, the short L1 TTL
+  bounds how stale a value can be.
+"""
+import asyncio
 import json
-from typing import Any
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
 from core.services.redis import get_client
+from core.utils.logger import logger
+
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "5"))
+NEGATIVE_TTL_SECONDS = 30
+
+# Stored in place of a value when a loader found nothing
+_NEGATIVE = "__cache_none__"
+
+
+class _LocalCache:
+    """Bounded LRU of key -> (serialized value, expiry on the monotonic clock)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        raw, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return raw
+
+    def put(self, key: str, raw: str, ttl: float):
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (raw, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
 
 
 class _cache:
+    def __init__(self, l1_max_entries: int = L1_MAX_ENTRIES, l1_ttl: float = L1_TTL_SECONDS):
+        self.l1_ttl = l1_ttl
+        self._local = _LocalCache(l1_max_entries)
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        # Per-key eviction counts, kept while a fetch for the key is in flight. A fetch
+        # only fills the cache if the key was not evicted while it ran.
+        self._versions: Dict[str, int] = {}
+        self._origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self._counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "coalesced": 0,
+            "invalidations_received": 0,
+            "l2_ms": 0.0,
+            "load_ms": 0.0,
+        }
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"cache:{key}"
+
+    @staticmethod
+    def _decode(raw: str):
+        if raw == _NEGATIVE:
+            return None
+        return json.loads(raw)
+
+    def _fill_l1(self, key: str, raw: str, ttl: float, version: int):
+        if self._versions.get(key, 0) == version:
+            self._local.put(key, raw, min(self.l1_ttl, ttl))
+
+    def _evict_l1(self, key: str):
+        if key in self._inflight or ("load", key) in self._inflight:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self._local.evict(key)
+
+    def _finish_fetch(self, inflight_key: Any, key: str):
+        self._inflight.pop(inflight_key, None)
+        if key not in self._inflight and ("load", key) not in self._inflight:
+            self._versions.pop(key, None)
+
+    def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        # Workers may run several event loops over their lifetime; listen on the current one
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self._listener = loop.create_task(self._listen())
+
+    async def _listen(self):
+        pubsub = None
+        try:
+            redis = await get_client()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                origin, _, key = message["data"].partition("|")
+                if origin != self._origin:
+                    self._evict_l1(key)
+                    self._counters["invalidations_received"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener stopped: {e}")
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def _broadcast(self, redis, key: str):
+        try:
+            await redis.publish(CACHE_INVALIDATION_CHANNEL, f"{self._origin}|{key}")
+        except Exception as e:
+            logger.warning(f"Failed to broadcast cache invalidation for {key}: {e}")
+
+    async def _get_raw(self, key: str) -> Optional[str]:
+        """L1 then Redis. Concurrent Redis reads of the same key share one request."""
+        self._ensure_listener()
+        raw = self._local.get(key)
+        if raw is not None:
+            self._counters["l1_hits"] += 1
+            return raw
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._counters["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        version = self._versions.get(key, 0)
+        started = time.monotonic()
+        try:
+            redis = await get_client()
+            redis_key = self._redis_key(key)
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.get(redis_key)
+                pipe.ttl(redis_key)
+                raw, ttl = await pipe.execute()
+            self._counters["l2_ms"] += (time.monotonic() - started) * 1000
+            if raw is not None:
+                self._counters["l2_hits"] += 1
+                self._fill_l1(key, raw, ttl if ttl and ttl > 0 else self.l1_ttl, version)
+            else:
+                self._counters["misses"] += 1
+            future.set_result(raw)
+            return raw
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._finish_fetch(key, key)
+
     async def get(self, key: str):
-        redis = await get_client()
-        key = f"cache:{key}"
-        result = await redis.get(key)
-        if result:
-            return json.loads(result)
-        return None
+        raw = await self._get_raw(key)
+        if raw is None:
+            return None
+        return self._decode(raw)
 
     async def set(self, key: str, value: Any, ttl: int = 15 * 60):
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.set(key, json.dumps(value), ex=ttl)
+        raw = json.dumps(value)
+        await redis.set(self._redis_key(key), raw, ex=ttl)
+        self._evict_l1(key)
+        self._local.put(key, raw, min(self.l1_ttl, ttl))
+        await self._broadcast(redis, key)
 
     async def invalidate(self, key: str):
         redis = await get_client()
-        key = f"cache:{key}"
-        await redis.delete(key)
+        self._evict_l1(key)
+        await redis.delete(self._redis_key(key))
+        await self._broadcast(redis, key)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int = 15 * 60,
+        negative_ttl: int = NEGATIVE_TTL_SECONDS,
+    ):
+        """Return the cached value for key, calling loader once on a miss.
+
+        Concurrent callers missing the same key wait for the same loader call.
+        A None result is cached for negative_ttl seconds.
+        """
+        raw = await self._get_raw(key)
+        if raw is not None:
+            return self._decode(raw)
+
+        loader_key = ("load", key)
+        pending = self._inflight.get(loader_key)
+        if pending is not None:
+            self._counters["coalesced"] += 1
+            # Waiters decode their own copy so they never share a mutable value
+            return self._decode(await asyncio.shield(pending))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[loader_key] = future
+        version = self._versions.get(key, 0)
+        started = time.monotonic()
+        try:
+            value = await loader()
+            self._counters["loads"] += 1
+            self._counters["load_ms"] += (time.monotonic() - started) * 1000
+            raw = json.dumps(value) if value is not None else _NEGATIVE
+            entry_ttl = ttl if value is not None else negative_ttl
+            # Skip caching if the key was invalidated while loading; the value may predate the change
+            if self._versions.get(key, 0) == version:
+                redis = await get_client()
+                await redis.set(self._redis_key(key), raw, ex=entry_ttl)
+                self._fill_l1(key, raw, entry_ttl, version)
+            future.set_result(raw)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._finish_fetch(loader_key, key)
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self._counters
+        lookups = counters["l1_hits"] + counters["l2_hits"] + counters["misses"]
+        redis_reads = counters["l2_hits"] + counters["misses"]
+        return {
+            **{name: value for name, value in counters.items() if not name.endswith("_ms")},
+            "l1_entries": len(self._local),
+            "l1_hit_rate": round(counters["l1_hits"] / lookups, 4) if lookups else 0.0,
+            "avg_l2_ms": round(counters["l2_ms"] / redis_reads, 3) if redis_reads else 0.0,
+            "avg_load_ms": round(counters["load_ms"] / counters["loads"], 3) if counters["loads"] else 0.0,
+        }
 
 
 Cache = _cache()
@@ -11,12 +11,17 @@ from datetime import datetime, timezone, timedelta
 from core.utils.logger import logger
 from core.utils.config import config
 from core.utils.cache import Cache
+from core.services.active_runs import get_active_runs
 
 
 async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
     """
     Check if the account has reached the limit of parallel agent runs within the past 24 hours.
     
+    The running runs are read from the account's active run set in Redis
+    (core.services.active_runs), which costs one Redis call regardless of the
+    account's history. If Redis is unavailable, the database is queried instead.
+    
     Args:
         client: Database client
         account_id: Account ID to check
@@ -26,6 +31,23 @@ async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
         
     Note: This function does not use caching to ensure real-time limit checks.
     """
+    try:
+        running_runs = await get_active_runs(account_id)
+    except Exception as e:
+        logger.warning(f"Active run lookup in Redis failed for account {account_id}, checking the database: {e}")
+        return await _check_agent_run_limit_from_db(client, account_id)
+
+    running_count = len(running_runs)
+    logger.debug(f"Account {account_id} has {running_count} running agent runs in the past 24 hours")
+    return {
+        'can_start': running_count < config.MAX_PARALLEL_AGENT_RUNS,
+        'running_count': running_count,
+        'running_thread_ids': [run['thread_id'] for run in running_runs]
+    }
+
+
+async def _check_agent_run_limit_from_db(client, account_id: str) -> Dict[str, Any]:
+    """Check the parallel agent run limit by scanning the account's threads and runs in the database."""
     try:
         # Calculate 24 hours ago
         twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
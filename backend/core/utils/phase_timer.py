@@ -0,0 +1,32 @@
+import time
+from typing import Dict, Optional
+
+
+class PhaseTimer:
+    """Breaks the latency of a multi-step operation down into named phases.
+
+    mark(phase) attributes the time since the previous mark to phase, so
+    consecutive marks split the critical path. Work that runs in the
+    background can be reported with record(phase, ms) without moving the mark.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._last_mark = self.started_at
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        now = time.monotonic()
+        elapsed_ms = (now - self._last_mark) * 1000
+        self._last_mark = now
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed_ms
+        return elapsed_ms
+
+    def record(self, phase: str, elapsed_ms: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed_ms
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return (time.monotonic() - (since or self.started_at)) * 1000
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase}={elapsed_ms:.0f}ms" for phase, elapsed_ms in self.phases.items())
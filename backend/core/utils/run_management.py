@@ -3,6 +3,8 @@ import json
 from typing import Optional, List
 from fastapi import HTTPException
 from core.services import redis
+from core.services.active_runs import release_active_run
+from core.services.run_index import get_instance_runs, get_run_instances
 from ..utils.logger import logger
 from run_agent_background import update_agent_run_status, _cleanup_redis_response_list
 
@@ -16,17 +18,11 @@ async def cleanup_instance_runs(instance_id: str):
             logger.warning("Instance ID not set, cannot clean up instance-specific agent runs.")
             return
 
-        running_keys = await redis.keys(f"active_run:{instance_id}:*")
-        logger.debug(f"Found {len(running_keys)} running agent runs for instance {instance_id} to clean up")
+        running_run_ids = await get_instance_runs(instance_id)
+        logger.debug(f"Found {len(running_run_ids)} running agent runs for instance {instance_id} to clean up")
 
-        for key in running_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                agent_run_id = parts[2]
-                await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
-            else:
-                logger.warning(f"Unexpected key format found: {key}")
+        for agent_run_id in running_run_ids:
+            await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
 
     except Exception as e:
         logger.error(f"Failed to clean up running agent runs for instance {instance_id}: {str(e)}")
@@ -73,6 +69,8 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
         logger.error(f"Failed to update database status for stopped/failed run {agent_run_id}")
         raise HTTPException(status_code=500, detail="Failed to update agent run status in database")
 
+    await release_active_run(agent_run_id)
+
     # Send STOP signal to the global control channel
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
@@ -83,22 +81,16 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
 
     # Find all instances handling this agent run and send STOP to instance-specific channels
     try:
-        instance_keys = await redis.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await redis.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                 logger.warning(f"Unexpected key format found: {key}")
+        instance_ids = await get_run_instances(agent_run_id)
+        logger.debug(f"Found {len(instance_ids)} active instances for agent run {agent_run_id}")
+
+        for instance_id_from_index in instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_index}"
+            try:
+                await redis.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
         # Clean up the response list immediately on stop/fail
         await _cleanup_redis_response_list(agent_run_id)
@@ -8,6 +8,9 @@ import traceback
 from datetime import datetime, timezone
 from typing import Optional
 from core.services import redis
+from core.services.redis_stream_writer import ResponseStreamWriter
+from core.services.active_runs import release_active_run
+from core.services.run_index import mark_run_active, refresh_run_active, clear_run_active
 from core.run import run_agent
 from core.utils.logger import logger, structlog
 import dramatiq
@@ -117,13 +120,13 @@ async def run_agent_background(
     pubsub = None
     stop_checker = None
     stop_signal_received = False
+    stream_writer = None
 
     # Define Redis keys and channels
     response_list_key = f"agent_run:{agent_run_id}:responses"
     response_channel = f"agent_run:{agent_run_id}:new_response"
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
-    instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
     async def check_for_stop_signal():
         nonlocal stop_signal_received
@@ -140,8 +143,8 @@ async def run_agent_background(
                         break
                 # Periodically refresh the active run key TTL
                 if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
+                    try: await refresh_run_active(instance_id, agent_run_id)
+                    except Exception as ttl_err: logger.warning(f"Failed to refresh active run TTL for {agent_run_id}: {ttl_err}")
                 await asyncio.sleep(0.1) # Short sleep to prevent tight loop
         except asyncio.CancelledError:
             logger.debug(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
@@ -164,7 +167,7 @@ async def run_agent_background(
         stop_checker = asyncio.create_task(check_for_stop_signal())
 
         # Ensure active run key exists and has TTL
-        await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
+        await mark_run_active(instance_id, agent_run_id)
 
         # Initialize agent generator
         agent_gen = run_agent(
@@ -177,7 +180,8 @@ async def run_agent_background(
         final_status = "running"
         error_message = None
 
-        pending_redis_operations = []
+        # Responses are batched into pipelined RPUSH + PUBLISH writes
+        stream_writer = ResponseStreamWriter(response_list_key, response_channel)
 
         async for response in agent_gen:
             if stop_signal_received:
@@ -187,9 +191,7 @@ async def run_agent_background(
                 break
 
             # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            await stream_writer.write(json.dumps(response))
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -212,8 +214,10 @@ async def run_agent_background(
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await stream_writer.write(json.dumps(completion_message))
+
+        # Flush buffered responses before reading them back
+        await stream_writer.close()
 
         # Fetch final responses from Redis for DB update
         all_responses_json = await redis.lrange(response_list_key, 0, -1)
@@ -239,9 +243,11 @@ async def run_agent_background(
         final_status = "failed"
         trace.span(name="agent_run_failed").end(status_message=error_message, level="ERROR")
 
-        # Push error message to Redis list
+        # Push error message to Redis list, after any responses still buffered
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
+            if stream_writer:
+                await stream_writer.close()
             await redis.rpush(response_list_key, json.dumps(error_response))
             await redis.publish(response_channel, "new")
         except Exception as redis_err:
@@ -258,6 +264,11 @@ async def run_agent_background(
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
 
     finally:
+        # Flush any responses still buffered (e.g. after a stop signal)
+        if stream_writer:
+            await stream_writer.close()
+            logger.debug(f"Response stream writes for {agent_run_id}: {stream_writer.stats()}")
+
         # Cleanup stop checker task
         if stop_checker and not stop_checker.done():
             stop_checker.cancel()
@@ -278,31 +289,26 @@ async def run_agent_background(
         await _cleanup_redis_response_list(agent_run_id)
 
         # Remove the instance-specific active run key
-        await _cleanup_redis_instance_key(agent_run_id)
+        await _cleanup_redis_instance_key(instance_id, agent_run_id)
 
         # Clean up the run lock
         await _cleanup_redis_run_lock(agent_run_id)
 
-        # Wait for all pending redis operations to complete, with timeout
-        try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
+        # The run no longer counts against the account's parallel run limit
+        await release_active_run(agent_run_id)
+
 
         logger.debug(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
-async def _cleanup_redis_instance_key(agent_run_id: str):
-    """Clean up the instance-specific Redis key for an agent run."""
-    if not instance_id:
+async def _cleanup_redis_instance_key(run_instance_id: str, agent_run_id: str):
+    """Clean up the instance-specific Redis key for an agent run and its index entries."""
+    if not run_instance_id:
         logger.warning("Instance ID not set, cannot clean up instance key.")
         return
-    key = f"active_run:{instance_id}:{agent_run_id}"
-    # logger.debug(f"Cleaning up Redis instance key: {key}")
     try:
-        await redis.delete(key)
-        # logger.debug(f"Successfully cleaned up Redis key: {key}")
+        await clear_run_active(run_instance_id, agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
+        logger.warning(f"Failed to clean up active run key for {agent_run_id} on {run_instance_id}: {str(e)}")
 
 async def _cleanup_redis_run_lock(agent_run_id: str):
     """Clean up the run lock Redis key for an agent run."""
@@ -0,0 +1,13 @@
+CREATE OR REPLACE FUNCTION patch_thread_metadata(
+    p_thread_id UUID,
+    p_set JSONB DEFAULT '{}'::jsonb,
+    p_remove TEXT[] DEFAULT ARRAY[]::TEXT[]
+) RETURNS VOID AS $$
+BEGIN
+    UPDATE public.threads
+    SET metadata = (COALESCE(metadata, '{}'::jsonb) || COALESCE(p_set, '{}'::jsonb)) - COALESCE(p_remove, ARRAY[]::TEXT[])
+    WHERE thread_id = p_thread_id;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION patch_thread_metadata TO service_role;
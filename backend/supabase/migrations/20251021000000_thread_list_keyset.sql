@@ -0,0 +1,15 @@
+-- Keyset pagination for the thread list: (account_id, created_at, thread_id)
+-- serves both the account filter and the (created_at, thread_id) ordering and cursor.
+CREATE INDEX IF NOT EXISTS idx_threads_account_created_thread
+    ON threads(account_id, created_at DESC, thread_id DESC);
+
+-- Computed column used by the thread list instead of the raw metadata column.
+-- It drops the prompt-caching state (cached message blocks and their
+-- bookkeeping), which is by far the heaviest part of threads.metadata.
+CREATE OR REPLACE FUNCTION list_metadata(t threads)
+RETURNS JSONB AS $$
+    SELECT COALESCE(t.metadata, '{}'::jsonb)
+        - ARRAY['cached_blocks', 'cache_metadata', 'cache_config', 'cache_needs_rebuild']::TEXT[];
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION list_metadata(threads) TO authenticated, service_role;
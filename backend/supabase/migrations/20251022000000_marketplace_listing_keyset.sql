@@ -0,0 +1,37 @@
+-- Keyset pagination for the marketplace: public templates, most downloaded first.
+-- (download_count, created_at, template_id) is both the ordering and the cursor.
+CREATE INDEX IF NOT EXISTS idx_agent_templates_public_downloads_keyset
+    ON agent_templates(download_count DESC, created_at DESC, template_id DESC)
+    WHERE is_public = TRUE;
+
+-- Templates after a keyset cursor. PostgREST filters can't express the row
+-- comparison, and the equivalent OR of column filters scans every row tied on
+-- download_count. The function is a single STABLE SELECT, so Postgres inlines
+-- it and the filters, ordering and limit added by PostgREST use the index above.
+CREATE OR REPLACE FUNCTION marketplace_templates_after(
+    after_download_count INT,
+    after_created_at TIMESTAMPTZ,
+    after_template_id UUID
+)
+RETURNS SETOF agent_templates AS $$
+    SELECT * FROM agent_templates
+    WHERE (download_count, created_at, template_id) < (after_download_count, after_created_at, after_template_id);
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION marketplace_templates_after(INT, TIMESTAMPTZ, UUID) TO authenticated, service_role;
+
+-- Search filters on name ILIKE '%term%'
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_agent_templates_name_trgm
+    ON agent_templates USING gin (name gin_trgm_ops);
+
+-- Computed column with the creator's display name, so template listings get it
+-- in the same request instead of a separate basejump.accounts lookup.
+CREATE OR REPLACE FUNCTION creator_name(t agent_templates)
+RETURNS TEXT AS $$
+    SELECT COALESCE(NULLIF(a.name, ''), a.slug)
+    FROM basejump.accounts a
+    WHERE a.id = t.creator_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = '';
+
+GRANT EXECUTE ON FUNCTION creator_name(agent_templates) TO authenticated, service_role;
@@ -0,0 +1,15 @@
+-- One task list message per thread. Two runs on the same thread could both find
+-- no task list and insert one each; with this index the second insert fails and
+-- that run re-applies its operations to the first run's task list.
+
+-- Only the newest task list of a thread was ever read, so older duplicates are dropped.
+DELETE FROM messages m
+USING messages newer
+WHERE m.type = 'task_list'
+  AND newer.type = 'task_list'
+  AND newer.thread_id = m.thread_id
+  AND (newer.created_at, newer.message_id) > (m.created_at, m.message_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_thread_task_list
+    ON messages(thread_id)
+    WHERE type = 'task_list';